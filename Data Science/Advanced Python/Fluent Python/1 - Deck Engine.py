@@ -0,0 +1,206 @@
+# FrenchDeck from "1 - The Python Data Model" is a great example of the Data Model, but a slow simulator:
+# * 52 Card namedtuples per deck - every card is a Python object with two str attributes
+# * random.shuffle(deck._cards) moves Python references around one by one
+# * sorted(deck, key=spades_high) calls a Python function with a list.index() inside for every single card
+
+# For millions of shuffles and deals, the cards can be plain small ints instead:
+# code = rank_index * 4 + suit_index    -> exactly the position of the card in FrenchDeck._cards
+# A deck is 52 bytes, N decks are one (N, 52) block of memory, and everything else becomes array arithmetic
+
+import collections
+import random
+from array import array
+
+try:
+    import numpy as np  # Optional: everything below also works (slower) without it
+except ImportError:
+    np = None
+
+Card = collections.namedtuple('Card', ['rank', 'suit'])
+
+RANKS = [str(n) for n in range(2, 11)] + list('JQKA')
+SUITS = 'spades diamonds clubs hearts'.split()
+DECK_SIZE = len(RANKS) * len(SUITS)
+
+suit_values = dict(spades=3, hearts=2, diamonds=1, clubs=0)
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+# Encoding and the precomputed lookup tables
+
+CARDS = [Card(rank, suit) for rank in RANKS for suit in SUITS]  # code -> Card, built once
+CODES = {card: code for code, card in enumerate(CARDS)}  # Card -> code
+
+
+def spades_high(card):
+    rank_value = RANKS.index(card.rank)
+    return rank_value * len(suit_values) + suit_values[card.suit]
+
+
+# spades_high only depends on the card, and there are 52 cards - so it is computed 52 times, here, and never again
+SPADES_HIGH = array('B', (spades_high(card) for card in CARDS))  # code -> rank in the spades_high ordering
+RANK_OF = array('B', (code // len(SUITS) for code in range(DECK_SIZE)))
+SUIT_OF = array('B', (code % len(SUITS) for code in range(DECK_SIZE)))
+
+
+def encode(card):
+    return CODES[card]
+
+
+def decode(code):
+    return CARDS[code]
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+# A single deck, compatible with FrenchDeck
+
+
+class CompactDeck:
+    """FrenchDeck's interface (len, [], iteration, in) over 52 bytes instead of 52 Card objects"""
+
+    def __init__(self, codes=None):
+        self._codes = array('B', range(DECK_SIZE)) if codes is None else codes
+
+    def __len__(self):
+        return len(self._codes)
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return [CARDS[c] for c in self._codes[position]]
+        return CARDS[self._codes[position]]
+
+    def __contains__(self, card):
+        code = CODES.get(card)
+        return code is not None and code in self._codes
+
+    def shuffle(self, rng=random):
+        rng.shuffle(self._codes)  # random.shuffle works on any mutable sequence - an array of bytes is one
+
+    def sorted_codes(self):
+        # Sorting by a lookup table: the key is a C-level __getitem__, not a Python function
+        return sorted(self._codes, key=SPADES_HIGH.__getitem__)
+
+    def __repr__(self):
+        return f'CompactDeck({len(self)} cards)'
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+# N decks at once
+
+
+class DeckBatch:
+    """N decks stored as one (N, 52) block of uint8 card codes"""
+
+    def __init__(self, n_decks, seed=None, use_numpy=True):
+        self.n_decks = n_decks
+        self.use_numpy = use_numpy and np is not None
+        if self.use_numpy:
+            self.rng = np.random.default_rng(seed)
+            self.codes = np.tile(np.arange(DECK_SIZE, dtype=np.uint8), (n_decks, 1))
+        else:
+            self.rng = random.Random(seed)
+            self.codes = array('B', range(DECK_SIZE)) * n_decks  # Row-major: deck i is codes[52 * i: 52 * (i + 1)]
+
+    def __len__(self):
+        return self.n_decks
+
+    def __getitem__(self, i):
+        if not -self.n_decks <= i < self.n_decks:
+            raise IndexError('deck index out of range')
+        i %= self.n_decks
+        if self.use_numpy:
+            return CompactDeck(self.codes[i])  # A view of row i, not a copy
+        return CompactDeck(memoryview(self.codes)[DECK_SIZE * i:DECK_SIZE * (i + 1)])
+
+    def shuffle(self):
+        '''
+        Vectorized Fisher-Yates. The classic algorithm, for one deck:
+            for i from 51 down to 1:
+                j = random integer in [0, i]
+                swap deck[i], deck[j]
+        The loop over i has only 51 steps. Everything inside it - drawing j and swapping - is done for ALL N decks at
+        once: one vector of N random j's, one fancy-indexed swap. So the Python overhead is 51 iterations, whatever N is
+        '''
+        if not self.use_numpy:
+            return self._shuffle_fallback()
+        codes, rows = self.codes, np.arange(self.n_decks)
+        for i in range(DECK_SIZE - 1, 0, -1):
+            j = self.rng.integers(0, i + 1, size=self.n_decks)
+            tmp = codes[rows, j]
+            codes[rows, j] = codes[:, i]
+            codes[:, i] = tmp
+
+    def _shuffle_fallback(self):
+        # No NumPy: shuffle every row in place. random.shuffle on a memoryview slice works without copying
+        view, shuffle = memoryview(self.codes), self.rng.shuffle
+        for start in range(0, len(self.codes), DECK_SIZE):
+            shuffle(view[start:start + DECK_SIZE])
+
+    def deal(self, players, hand_size):
+        """Hands of every deck, shape (N, players, hand_size) - slices of the shuffled decks, no copies"""
+        # After a fair shuffle, dealing consecutive cards is as random as dealing round-robin
+        cards = players * hand_size
+        if cards > DECK_SIZE:
+            raise ValueError(f'{players} players x {hand_size} cards need more than {DECK_SIZE} cards')
+        if self.use_numpy:
+            return self.codes[:, :cards].reshape(self.n_decks, players, hand_size)
+        view = memoryview(self.codes)
+        return [[view[d * DECK_SIZE + p * hand_size: d * DECK_SIZE + (p + 1) * hand_size] for p in range(players)]
+                for d in range(self.n_decks)]
+
+    def ranked(self, hands):
+        """Replace every card code by its spades_high rank - one table lookup per card"""
+        if self.use_numpy:
+            return np.asarray(SPADES_HIGH, dtype=np.uint8)[hands]
+        return [[array('B', (SPADES_HIGH[c] for c in hand)) for hand in deck] for deck in hands]
+
+    def sort_hands(self, hands):
+        """Sort every hand by spades_high"""
+        if self.use_numpy:
+            order = np.argsort(self.ranked(hands), axis=-1, kind='stable')
+            return np.take_along_axis(hands, order, axis=-1)
+        key = SPADES_HIGH.__getitem__
+        return [[array('B', sorted(hand, key=key)) for hand in deck] for deck in hands]
+
+    def highest_card(self, hands):
+        """For each deck and player: the spades_high rank of the best card in hand"""
+        if self.use_numpy:
+            return self.ranked(hands).max(axis=-1)
+        return [[max(hand) for hand in deck] for deck in self.ranked(hands)]
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+if __name__ == '__main__':
+    deck = CompactDeck()
+    print(len(deck), deck[0], deck[51], deck[:3], Card('Q', 'hearts') in deck)
+    print([decode(c) for c in deck.sorted_codes()[:4]])  # Same order as sorted(FrenchDeck(), key=spades_high)
+
+    for use_numpy in (True, False):
+        batch = DeckBatch(4, seed=7, use_numpy=use_numpy)
+        batch.shuffle()
+        hands = batch.deal(players=4, hand_size=5)
+        best = batch.highest_card(hands)
+        print('NumPy' if batch.use_numpy else 'array', [decode(c) for c in batch.sort_hands(hands)[0][0]],
+              [int(x) for x in best[0]])
+
+    import time
+
+    n = 100_000
+    t0 = time.perf_counter()
+    cards = list(CARDS)
+    for _ in range(n // 100):  # FrenchDeck way, 1% of the work - otherwise it takes too long
+        random.shuffle(cards)
+        sorted(cards[:20], key=spades_high)
+    t1 = time.perf_counter()
+    print(f'FrenchDeck-style: {(t1 - t0) * 100:.2f} s for {n} shuffles + sorts (extrapolated)')
+
+    for use_numpy in (True, False):
+        batch = DeckBatch(n, seed=1, use_numpy=use_numpy)
+        t0 = time.perf_counter()
+        batch.shuffle()
+        batch.sort_hands(batch.deal(4, 5))
+        t1 = time.perf_counter()
+        print(f'DeckBatch ({"NumPy" if batch.use_numpy else "array"}): {t1 - t0:.2f} s for {n} shuffles + sorts')
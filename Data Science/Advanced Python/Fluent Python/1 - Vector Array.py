@@ -0,0 +1,185 @@
+# The Vector(x, y) class from "1 - The Python Data Model" creates a new Python object for every +, * and abs().
+# For one vector that's perfect. For a million vectors it's a million __add__ calls and a million new instances
+
+# VectorArray keeps N 2-D vectors as two contiguous float columns - all the x's and all the y's (the "structure of
+# arrays" layout). Then +, *, abs and bool are ONE call over the whole batch:
+# * With NumPy - the columns are float64 ndarrays and every operation runs in C
+# * Without NumPy - the columns are array('d') and the loops run in Python, but with no per-vector object
+
+import math
+import numbers
+from array import array
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+class Vector:  # The chapter 1 class, unchanged
+    def __init__(self, x=0, y=0):
+        self.x = x
+        self.y = y
+
+    def __repr__(self):
+        return f'Vector({self.x!r}, {self.y!r})'
+
+    def __abs__(self):
+        return math.hypot(self.x, self.y)
+
+    def __bool__(self):
+        return bool(abs(self))
+
+    def __add__(self, other):
+        x = self.x + other.x
+        y = self.y + other.y
+        return Vector(x, y)
+
+    def __mul__(self, scalar):
+        return Vector(self.x * scalar, self.y * scalar)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+class VectorArray:
+    """N 2-D vectors stored as two contiguous float64 columns"""
+
+    def __init__(self, xs=(), ys=(), use_numpy=True):
+        self.use_numpy = use_numpy and np is not None
+        if self.use_numpy:
+            self.xs = np.asarray(xs, dtype=np.float64)
+            self.ys = np.asarray(ys, dtype=np.float64)
+        else:
+            self.xs = xs if isinstance(xs, array) and xs.typecode == 'd' else array('d', xs)
+            self.ys = ys if isinstance(ys, array) and ys.typecode == 'd' else array('d', ys)
+        if len(self.xs) != len(self.ys):
+            raise ValueError(f'xs and ys must have the same length, got {len(self.xs)} and {len(self.ys)}')
+
+    def _new(self, xs, ys):
+        return VectorArray(xs, ys, self.use_numpy)
+
+    # Conversions
+
+    @classmethod
+    def from_vectors(cls, vectors, use_numpy=True):
+        vectors = vectors if isinstance(vectors, list) else list(vectors)
+        # Two attribute reads per vector, straight into the columns. No intermediate list of tuples
+        xs = array('d', [v.x for v in vectors])
+        ys = array('d', [v.y for v in vectors])
+        return cls(xs, ys, use_numpy)
+
+    def to_vectors(self):
+        xs, ys = (self.xs.tolist(), self.ys.tolist())  # tolist() converts a whole column to Python floats in C
+        return list(map(Vector, xs, ys))
+
+    def __len__(self):
+        return len(self.xs)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self._new(self.xs[index], self.ys[index])
+        if self.use_numpy and not isinstance(index, (int, np.integer)):  # A bool mask or an array of indices
+            return self._new(self.xs[index], self.ys[index])
+        return Vector(float(self.xs[index]), float(self.ys[index]))
+
+    def __iter__(self):
+        return iter(self.to_vectors())
+
+    def __repr__(self):
+        head = ', '.join(repr(v) for v in self[:3].to_vectors())
+        more = ', ...' if len(self) > 3 else ''
+        return f'VectorArray([{head}{more}], n={len(self)})'
+
+    # Arithmetic over the whole batch
+
+    def _coerce(self, other):
+        if isinstance(other, VectorArray):
+            if len(other) != len(self):
+                raise ValueError(f'Cannot add VectorArrays of lengths {len(self)} and {len(other)}')
+            return other.xs, other.ys
+        if isinstance(other, Vector):  # Broadcast one vector over the batch
+            return other.x, other.y
+        return None
+
+    def __add__(self, other):
+        operand = self._coerce(other)
+        if operand is None:
+            return NotImplemented
+        ox, oy = operand
+        if self.use_numpy:
+            return self._new(self.xs + ox, self.ys + oy)
+        if isinstance(ox, array):
+            return self._new(array('d', map(float.__add__, self.xs, ox)), array('d', map(float.__add__, self.ys, oy)))
+        return self._new(array('d', [x + ox for x in self.xs]), array('d', [y + oy for y in self.ys]))
+
+    __radd__ = __add__
+
+    def __mul__(self, scalar):
+        if not isinstance(scalar, numbers.Real):  # float('2') would take a str
+            return NotImplemented
+        scalar = float(scalar)
+        if self.use_numpy:
+            return self._new(self.xs * scalar, self.ys * scalar)
+        return self._new(array('d', [x * scalar for x in self.xs]), array('d', [y * scalar for y in self.ys]))
+
+    __rmul__ = __mul__
+
+    def __abs__(self):
+        """The magnitude of every vector - a column of floats, not a single number"""
+        if self.use_numpy:
+            return np.hypot(self.xs, self.ys)
+        return array('d', map(math.hypot, self.xs, self.ys))
+
+    def __bool__(self):
+        # Like list: a VectorArray is truthy when it isn't empty. The per-vector truth values are .mask()
+        return len(self) > 0
+
+    def mask(self):
+        """bool(v) for every vector (v is falsy only when it's the zero vector)"""
+        if self.use_numpy:
+            return (self.xs != 0) | (self.ys != 0)
+        return [bool(x or y) for x, y in zip(self.xs, self.ys)]
+
+    def __eq__(self, other):
+        if not isinstance(other, VectorArray):
+            return NotImplemented
+        return len(self) == len(other) and list(self.xs) == list(other.xs) and list(self.ys) == list(other.ys)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+if __name__ == '__main__':
+    v1, v2 = Vector(1, 5), Vector(3, 4)
+    batch = VectorArray.from_vectors([v1, v2, Vector(0, 0)])
+    print(batch)
+    print(batch + batch, batch + Vector(10, 10))
+    print(batch * 10, abs(batch), batch.mask())
+    for operand in ('2', 'x', None):
+        try:
+            print('Scaled, should not be:', batch * operand)
+        except TypeError as error:
+            print('TypeError:', error)
+    print(batch.to_vectors(), batch[0], v1 + v2)
+
+    import random
+    import time
+
+    n = 1_000_000
+    vectors = [Vector(random.random(), random.random()) for _ in range(n)]
+
+    t0 = time.perf_counter()
+    total = [abs(v + v * 2) for v in vectors]
+    t1 = time.perf_counter()
+    print(f'Vector objects:           {t1 - t0:.3f} s')
+
+    for use_numpy in (True, False):
+        va = VectorArray.from_vectors(vectors, use_numpy)
+        t0 = time.perf_counter()
+        total = abs(va + va * 2)
+        t1 = time.perf_counter()
+        print(f'VectorArray ({"NumPy" if va.use_numpy else "array"}):      {t1 - t0:.3f} s')
+
+    t0 = time.perf_counter()
+    back = VectorArray.from_vectors(vectors).to_vectors()
+    print(f'Round trip list -> VectorArray -> list: {time.perf_counter() - t0:.3f} s')
@@ -43,7 +43,7 @@ class VectorMD:
     @classmethod
     def from_bytes(cls, octets):
         typecode = chr(octets[0])
-        memv = memoryview(octets[1:]).cast(typecode)
+        memv = memoryview(octets)[1:].cast(typecode)  # Slice the memoryview, not octets: octets[1:] would copy it all
         return cls(memv)
 
 
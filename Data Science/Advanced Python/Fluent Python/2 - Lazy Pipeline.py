@@ -0,0 +1,221 @@
+# "2 - An Array of Sequences" builds everything as lists:
+#     beyond_ascii = [ord(c) for c in symbols if ord(c) > 127]     # ord(c) runs twice for every kept symbol
+#     [(color, size) for color in colors for size in sizes]        # the whole product, in memory at once
+# That's fine for 7 symbols and 9 T-shirts. For a 100 MB string it's a 100 MB list of ints before the first one is used
+
+# The chapter's answer is the genexp. Pipeline makes a chain of them readable, and adds the stages genexps don't have:
+#     Pipeline(symbols).map(ord).filter(lambda code: code > 127)          # ord once per symbol, filter on the result
+#     Pipeline(colors).product(sizes).map(format_tshirt)                  # one T-shirt at a time
+#     Pipeline(lines).map(parse).chunk(10_000).map(save_batch)            # batches of 10,000, never the whole file
+# * Every stage is a generator (or map/filter, which are C iterators), so memory stays O(chunk) end to end
+# * Nothing runs until the pipeline is iterated. The stages are kept as a recipe: a pipeline over a re-iterable source
+#   (a list, a str, a range) can be run again, and every method returns a new Pipeline, leaving the original alone
+# * map/filter with workers=N run the function over chunks in a process pool - for CPU-heavy functions, where the
+#   pickling of each chunk is cheap next to the work. At most `prefetch` chunks are in flight, and the order is kept
+
+import functools
+import itertools
+import os
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'Libraries and Modules'))
+from batching import bounded_map, chunked  # noqa: E402
+
+CHUNK_SIZE = 10_000
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+# Stages: iterable -> iterator
+
+
+def windowed(iterable, size):
+    """Sliding windows: windowed('ABCD', 3) -> ('A', 'B', 'C'), ('B', 'C', 'D')"""
+    it = iter(iterable)
+    window = deque(itertools.islice(it, size), maxlen=size)
+    if len(window) < size:
+        return
+    yield tuple(window)
+    for item in it:
+        window.append(item)  # maxlen drops the oldest item
+        yield tuple(window)
+
+
+def head(iterable, n):
+    return itertools.islice(iterable, n)
+
+
+def product_with(iterable, others):
+    """(item, *combination) for every item and every combination of the other iterables, item by item"""
+    # itertools.product(iterable, *others) would read `iterable` to the end first - it tuples up all its inputs. Only
+    # the others are tupled here (they are iterated once per item anyway), and the first input streams
+    others = [tuple(other) for other in others]
+    for item in iterable:
+        for combination in itertools.product(*others):
+            yield (item, *combination)
+
+
+def _map_chunk(fn, chunk):
+    return list(map(fn, chunk))
+
+
+def _filter_chunk(fn, chunk):
+    return list(filter(fn, chunk))
+
+
+def in_processes(chunk_fn, fn, iterable, workers, chunk_size=CHUNK_SIZE, prefetch=None):
+    """chunk_fn(fn, chunk) for every chunk of iterable, in a pool of processes. fn must be picklable (module level)"""
+    with ProcessPoolExecutor(workers) as executor:
+        results = bounded_map(executor, functools.partial(chunk_fn, fn), chunked(iterable, chunk_size),
+                              prefetch=prefetch or 2 * workers)
+        for result in results:
+            yield from result
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+class Pipeline:
+    """A lazy chain of stages over an iterable. Iterate it, or end it with list() / reduce() / count() / first()"""
+
+    def __init__(self, source, stages=()):
+        self.source = source
+        self.stages = tuple(stages)
+
+    def _then(self, stage):
+        return Pipeline(self.source, self.stages + (stage,))
+
+    def __iter__(self):
+        it = iter(self.source)
+        for stage in self.stages:
+            it = stage(it)
+        return iter(it)
+
+    def __repr__(self):
+        names = [getattr(stage, 'func', stage).__name__ for stage in self.stages]  # A stage is a partial or a function
+        return f'Pipeline({type(self.source).__name__}{"".join(" | " + name for name in names)})'
+
+    # Stages
+
+    def map(self, fn, workers=0, chunk_size=CHUNK_SIZE):
+        if workers:
+            return self._then(functools.partial(in_processes, _map_chunk, fn, workers=workers, chunk_size=chunk_size))
+        return self._then(functools.partial(map, fn))
+
+    def filter(self, predicate, workers=0, chunk_size=CHUNK_SIZE):
+        if workers:
+            return self._then(functools.partial(in_processes, _filter_chunk, predicate, workers=workers,
+                                                chunk_size=chunk_size))
+        return self._then(functools.partial(filter, predicate))
+
+    def product(self, *others):
+        return self._then(functools.partial(product_with, others=others))
+
+    def chunk(self, size=CHUNK_SIZE):
+        return self._then(functools.partial(chunked, size=size))
+
+    def window(self, size):
+        return self._then(functools.partial(windowed, size=size))
+
+    def take(self, n):
+        return self._then(functools.partial(head, n=n))
+
+    def flatten(self):
+        return self._then(itertools.chain.from_iterable)
+
+    # Ends
+
+    def list(self):
+        return list(self)
+
+    def reduce(self, fn, initial):
+        return functools.reduce(fn, self, initial)
+
+    def count(self):
+        return sum(1 for _ in self)
+
+    def first(self, default=None):
+        return next(iter(self), default)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+# Benchmark
+
+
+def is_beyond_ascii(code):
+    return code > 127
+
+
+def char_weight(c):
+    """Something CPU-bound per character, and picklable, for the process pool"""
+    code = ord(c)
+    for _ in range(50):
+        code = (code * 1103515245 + 12345) & 0x7FFFFFFF
+    return code & 0xFF
+
+
+def benchmark(n=10_000_000):
+    import random
+    import time
+    import tracemalloc
+
+    rng = random.Random(0)
+    alphabet = 'abcdefghijklmnopqrstuvwxyz ¥€£©®°±µ¶·ñéüß'
+    symbols = ''.join(rng.choices(alphabet, k=n))
+
+    def measure(label, fn, memory=True):
+        # Timed on its own, then run again under tracemalloc for the peak: tracemalloc slows every allocation down
+        t0 = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - t0
+        peak = ''
+        if memory:
+            tracemalloc.start()
+            fn()
+            peak = f'{tracemalloc.get_traced_memory()[1] / 2 ** 20:.1f} MB'
+            tracemalloc.stop()
+        print(f'{label:<52}{elapsed:>7.2f} s{peak:>11}   -> {result}')
+        return result
+
+    print(f'{n:,} symbols, sum of the codes beyond ASCII{"time":>19}{"peak":>11}')
+    expected = measure('listcomp, ord() twice: sum([...])', lambda: sum([ord(c) for c in symbols if ord(c) > 127]))
+    assert measure('listcomp + walrus, ord() once',
+                   lambda: sum([code for c in symbols if (code := ord(c)) > 127])) == expected
+    assert measure('genexp, ord() twice: sum(...)', lambda: sum(ord(c) for c in symbols if ord(c) > 127)) == expected
+    assert measure('Pipeline(symbols).map(ord).filter(...)',
+                   lambda: sum(Pipeline(symbols).map(ord).filter(is_beyond_ascii))) == expected
+    assert measure('Pipeline(...).chunk(10_000) -> per-chunk sums',
+                   lambda: sum(map(sum, Pipeline(symbols).map(ord).filter(is_beyond_ascii).chunk()))) == expected
+    # map(ord) is C all the way, but filter() calls a Python predicate per code: the genexp's inline comparison is
+    # cheaper than that call. What the lazy versions win is the memory - and ord() running once
+
+    m = n // 50
+    print(f'\n{m:,} symbols through a CPU-heavy function')
+    expected = measure('serial: Pipeline(...).map(char_weight)',
+                       lambda: sum(Pipeline(symbols[:m]).map(char_weight)), memory=False)
+    for workers in (1, 2, 4):
+        assert measure(f'processes: .map(char_weight, workers={workers})',
+                       lambda: sum(Pipeline(symbols[:m]).map(char_weight, workers=workers, chunk_size=20_000)),
+                       memory=False) == expected
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+if __name__ == '__main__':
+    symbols = ')@~#¥*!'
+    beyond_ascii = Pipeline(symbols).map(ord).filter(lambda code: code > 127)
+    print(beyond_ascii, beyond_ascii.list(), beyond_ascii.list())  # The source is a str: it can run again
+
+    colors = ['red', 'green', 'blue']
+    sizes = ['small', 'medium', 'large']
+    tshirts = Pipeline(colors).product(sizes).map(lambda pair: f'{pair[0]}, {pair[1]}')
+    print(tshirts.take(4).list(), tshirts.count())
+    print(Pipeline(range(10)).chunk(4).list(), Pipeline('ABCDE').window(3).map(''.join).list())
+    print(Pipeline(range(10 ** 12)).map(lambda x: x * x).filter(lambda x: x % 7 == 1).first())  # Never builds the range
+
+    benchmark()
+    if os.cpu_count() == 1:
+        print('(One CPU: the process pool can only add overhead here. The gain needs os.cpu_count() > 1)')
@@ -0,0 +1,268 @@
+# unpacker(metro) in "2 - An Array of Sequences" prints one row at a time:
+#     for name, _, _, (lat, lon) in metro:
+#         print(f'{name:15} | {lat:9.4f} | {lon:9.4f} |')
+# Per row: one tuple unpacked in Python, one f-string, one print() - a call into the text layer, and a flush check.
+# Fine for three cities. For 5 million rows it's all overhead: the bytes that reach the file are the cheap part
+
+# Report does the same job in batches:
+# * The columns are declared once, with a path into the nested record: Column('latitude', (3, 0), '.4f') is lat in
+#   ('Tokyo', 'JP', 36.933, (35.1242, 139.182459)) - the same position the chapter's nested unpacking takes
+# * Each format generates one function per report, from the paths and specs: for the fixed-width format,
+#       lambda r: f'{r[0]:<15} | {r[3][0]:>9.4f} | {r[3][1]:>9.4f}\n'
+#   - no unpacking, no loop over the columns, no call per field: one BUILD_STRING per row. A batch of 10,000 rows is
+#   then ''.join(map(render, batch)), with map and join in C
+#   - CSV:         the lambda builds the tuple of formatted values, and csv.writer.writerows quotes them, in C
+#   - JSON lines:  strings escaped by the json module's C encoder, numbers with repr() - never the column's spec: ',d'
+#                  writes 1,000, which isn't JSON. NaN and infinities go through json.dumps, as it writes them. A
+#                  batch that doesn't fit the types of the first record (a None, a str or a bool in a number column)
+#                  is redone with json.dumps
+# * Every batch goes to ONE buffered text stream with one write() call
+
+import csv
+import io
+import json
+from collections import namedtuple
+from itertools import chain, islice
+from json.encoder import encode_basestring_ascii
+
+BATCH_SIZE = 10_000
+BUFFER_SIZE = 1 << 20
+
+Column = namedtuple('Column', 'name path spec width', defaults=('', None))
+Column.__doc__ = "path: an index, or a tuple of indexes / keys into a nested record. spec: '.4f', ',d'... width: fixed"
+
+STR, NUMBER, OTHER = 'str', 'number', 'other'
+
+
+def _kind(value):
+    if isinstance(value, str):
+        return STR
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return NUMBER
+    return OTHER
+
+
+# repr of a number, by its exact type: a KeyError for anything else - True, which int.__repr__ would write as 1, too
+_NUMBERS = {int: int.__repr__, float: float.__repr__}
+
+
+def _lookup(record, path):
+    for key in path:
+        record = record[key]
+    return record
+
+
+def _braces(literal):
+    """Literal text for an f-string"""
+    return literal.replace('{', '{{').replace('}', '}}')
+
+
+def open_report(path, buffer_size=BUFFER_SIZE):
+    """The one text stream a report goes through: UTF-8, a large buffer, and no newline translation (csv needs it)"""
+    return open(path, 'w', encoding='utf-8', newline='', buffering=buffer_size)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+class Report:
+    """Write an iterable of nested records as fixed-width text, CSV or JSON lines, a batch at a time"""
+
+    formats = ('fixed', 'csv', 'jsonl')
+
+    def __init__(self, columns, batch_size=BATCH_SIZE, separator=' | '):
+        self.columns = list(map(self._column, columns))
+        self.names = [column.name for column in self.columns]
+        self.batch_size = batch_size
+        self.separator = separator
+
+    def write(self, records, stream, format='fixed', header=True):
+        """Write all the records to the text stream. Returns the number of rows"""
+        if format not in self.formats:
+            raise ValueError(f'format must be one of {self.formats}, got {format!r}')
+        records = iter(records)
+        first = next(records, None)
+        if first is None:
+            return 0
+        kinds = [_kind(_lookup(first, column.path)) for column in self.columns]  # The code is typed by row one
+        write_batch = getattr(self, f'_{format}')(first, kinds, stream, header)
+        rows = 0
+        for batch in self._batches(chain([first], records)):
+            write_batch(batch)
+            rows += len(batch)
+        return rows
+
+    @staticmethod
+    def _column(column):
+        """A Column, a plain tuple, or just a name (the record is a dict) -> a Column whose path is a tuple"""
+        column = Column(*column) if isinstance(column, tuple) else Column(column, column)
+        return column if isinstance(column.path, tuple) else column._replace(path=(column.path,))
+
+    def _batches(self, records):
+        while batch := list(islice(records, self.batch_size)):
+            yield batch
+
+    def _compile(self, expression):
+        """
+        eval('lambda r: ...') with each column's value written as a plain subscript: 'r[3][0]' for the latitude.
+        A str key is passed in as a global, k0, k1...: a quote inside the braces of an f-string is awkward
+        """
+        namespace = {'quote': encode_basestring_ascii, 'dumps': json.dumps, 'number': _NUMBERS}
+        refs = []
+        for column in self.columns:
+            ref = 'r'
+            for key in column.path:
+                if not isinstance(key, int):
+                    namespace[name := f'k{len(namespace)}'] = key
+                    key = name
+                ref += f'[{key}]'
+            refs.append(ref)
+        return eval(f'lambda r: {expression(refs)}', namespace)
+
+    # One method per format: (first record, kinds, stream, header) -> function that writes a batch. Each one generates
+    # a lambda with f-strings, like namedtuple generates its __new__: compiled once, and then it's all bytecode
+
+    def _fixed(self, first, kinds, stream, header):
+        layouts, titles = [], []
+        for column, kind in zip(self.columns, kinds):
+            align = '<' if kind == STR else '>'
+            width = column.width or max(len(column.name), len(format(_lookup(first, column.path), column.spec)))
+            layouts.append(f'{align}{width}{column.spec}')
+            titles.append(f'{column.name:{align}{width}}')
+        if header:
+            stream.write(self.separator.join(titles) + '\n')
+        separator = _braces(self.separator)
+        render = self._compile(lambda refs: 'f' + repr(separator.join(
+            f'{{{ref}:{layout}}}' for ref, layout in zip(refs, layouts)) + '\n'))
+        return lambda batch: stream.write(''.join(map(render, batch)))
+
+    def _csv(self, first, kinds, stream, header):
+        writer = csv.writer(stream)
+        if header:
+            writer.writerow(self.names)
+        specs = [column.spec for column in self.columns]
+        # A tuple of the values, formatted by their spec - csv.writer does the quoting
+        extract = self._compile(lambda refs: '(' + ''.join(
+            ('f' + repr(f'{{{ref}:{spec}}}') if spec else ref) + ', ' for ref, spec in zip(refs, specs)) + ')')
+        return lambda batch: writer.writerows(map(extract, batch))
+
+    def _jsonl(self, first, kinds, stream, header):
+        def value(ref, kind):
+            if kind == STR:
+                return f'{{quote({ref})}}'  # TypeError for a non-str: the batch falls back to json.dumps
+            if kind == NUMBER:  # TypeError for None or a str, KeyError for a bool: the same fallback. NaN - NaN is NaN
+                return f'{{number[type({ref})]({ref}) if {ref} - {ref} == 0 else dumps({ref})}}'
+            return f'{{dumps({ref})}}'
+
+        keys = [_braces(encode_basestring_ascii(name)) for name in self.names]
+        render = self._compile(lambda refs: 'f' + repr('{{' + ', '.join(
+            f'{key}: {value(ref, kind)}' for key, ref, kind in zip(keys, refs, kinds))
+            + '}}\n'))
+        names, paths = self.names, [column.path for column in self.columns]
+
+        def write_batch(batch):
+            try:
+                text = ''.join(map(render, batch))
+            except (TypeError, KeyError):  # Not the types of row one: the slow and general way, for this batch
+                text = ''.join(json.dumps(dict(zip(names, (_lookup(record, path) for path in paths)))) + '\n'
+                               for record in batch)
+            stream.write(text)
+
+        return write_batch
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+# Benchmark
+
+
+def unpacker(metro, file=None):
+    """The chapter's version, printing to a file"""
+    print(f'{"-"*16}| {"latitude":>9} | {"longitude":>9} |', file=file)
+    for name, _, _, (lat, lon) in metro:
+        print(f'{name:15} | {lat:9.4f} | {lon:9.4f} |', file=file)
+
+
+def metro_records(n, distinct=1000):
+    import random
+    from itertools import cycle
+    rng = random.Random(0)
+    pool = [(f'City {i}', rng.choice(['JP', 'IN', 'MX', 'BR', 'US']), round(rng.uniform(0.5, 40), 3),
+             (rng.uniform(-90, 90), rng.uniform(-180, 180))) for i in range(distinct)]
+    return islice(cycle(pool), n)  # Streamed: 5M records are never in memory at once
+
+
+def benchmark(n=5_000_000):
+    import os
+    import tempfile
+    import time
+
+    columns = [Column('name', 0, '', 15), ('country', 1), ('population', 2, '.3f'),
+               Column('latitude', (3, 0), '.4f', 9), Column('longitude', (3, 1), '.4f', 9)]
+    report = Report(columns)
+    names = report.names
+
+    def naive_fixed(records, fp):
+        for name, cc, pop, (lat, lon) in records:
+            print(f'{name:15} | {cc:<7} | {pop:>10.3f} | {lat:9.4f} | {lon:9.4f}', file=fp)
+
+    def naive_csv(records, fp):
+        writer = csv.writer(fp)
+        for name, cc, pop, (lat, lon) in records:
+            writer.writerow((name, cc, f'{pop:.3f}', f'{lat:.4f}', f'{lon:.4f}'))
+
+    def naive_jsonl(records, fp):
+        for name, cc, pop, (lat, lon) in records:
+            fp.write(json.dumps(dict(zip(names, (name, cc, pop, lat, lon)))) + '\n')
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'report')
+
+        def rate(fn):
+            t0 = time.perf_counter()
+            with open_report(path) as fp:
+                fn(fp)
+            elapsed = time.perf_counter() - t0
+            return n / elapsed / 1e6, os.path.getsize(path) / elapsed / 2 ** 20
+
+        t0 = time.perf_counter()
+        for _ in metro_records(n):
+            pass
+        print(f'{n:,} records generated in {time.perf_counter() - t0:.2f} s (included in every rate below)')
+        print(f'{"M rows/s, MB/s":<16}{"per row":>16}{"Report":>16}')
+        for style, naive in (('fixed', naive_fixed), ('csv', naive_csv), ('jsonl', naive_jsonl)):
+            before = rate(lambda fp: naive(metro_records(n), fp))
+            after = rate(lambda fp: report.write(metro_records(n), fp, style, header=False))
+            print(f'{style:<16}' + ''.join(f'{rows:>9.2f}{mb:>7.0f}' for rows, mb in (before, after)))
+        # Formatting floats is most of the cost left, and csv.writer's own per-row work is the same one row at a time or
+        # in writerows: CSV gains nothing. JSON lines gains the most - json.dumps per row builds a dict and walks it
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+if __name__ == '__main__':
+    import sys
+
+    metro_areas = [
+        ('Tokyo', 'JP', 36.933, (35.1242, 139.182459)),
+        ('Delhi NCR', 'IN', 21.395, (28.681392, 77.289354)),
+        ('Mexico City', 'MX', 20.142, (19.293757, -99.139282))
+    ]
+    unpacker(metro_areas)
+    report = Report([Column('name', 0, '', 15), Column('latitude', (3, 0), '.4f', 9),
+                     Column('longitude', (3, 1), '.4f', 9)])
+    for style in Report.formats:
+        report.write(metro_areas, sys.stdout, style)
+
+    mixed = [('Tokyo', 'JP', 36.933, (35.1242, 139.182459)), ('Nowhere', None, None, (0.0, 0.0))]
+    buffer = io.StringIO()
+    Report([('name', 0), ('country', 1), ('population', 2)]).write(mixed, buffer, 'jsonl')  # Row 2: the fallback
+    print(buffer.getvalue(), end='')
+    buffer = io.StringIO()
+    odd = [(1000, 0.5), (2000, float('nan')), (True, float('-inf'))]  # Spec ignored, NaN and a bool: all valid JSON
+    Report([('count', 0, ',d'), ('ratio', 1, '.2f')]).write(odd, buffer, 'jsonl')
+    assert [json.loads(line) for line in buffer.getvalue().splitlines()][::2] == [
+        {'count': 1000, 'ratio': 0.5}, {'count': True, 'ratio': float('-inf')}], buffer.getvalue()
+    print(buffer.getvalue(), end='')
+
+    benchmark()
@@ -0,0 +1,289 @@
+# Both StrKeyDict versions from "3 - Dictionaries and Sets" normalize keys the same way: str(key), computed again on
+# every miss and on every `in` test. d[2] on a dict holding '2' runs __missing__, builds a new '2' string, and throws it
+# away - and the next d[2] does it all again
+
+# NormalizingDict generalizes the idea:
+# * The normalizer is pluggable: str (StrKeyDict), str.casefold (case-insensitive keys), Unicode NFC or NFKC + casefold
+# * Keys are stored normalized, so a lookup with an already normalized key is a plain dict hit - no Python code runs
+# * Only misses are normalized, through a bounded memo: a hot key like 2, looked up a million times, is converted once
+#   and then found with one plain dict lookup. (functools.lru_cache would be the obvious tool, but its bookkeeping costs
+#   as much as str(2) itself - see the benchmark)
+# * update() normalizes a whole batch in one pass with no method call per key, and bypasses the memo, so a bulk load of
+#   a million cold keys doesn't evict the hot ones
+
+# NormalizingDict is a FastUserDict (see "Collections - Fast UserDict"): reads stay dict's C methods, and only the
+# write, miss and delete hooks are Python. The base class routes get, |, |= and copy through them
+
+# A normalizer must be idempotent: normalize(normalize(k)) == normalize(k). Then a stored key is always its own normal
+# form, and a key that hits the dict directly can never be the "wrong" one
+
+import os
+import sys
+import unicodedata
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'Libraries and Modules'))
+from fast_userdict import FastUserDict, StrKeyDict as StrKeyDictUser  # noqa: E402
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+# Normalizers
+
+
+def casefold_key(key):
+    """'Straße' -> 'strasse'. Non-str keys are left alone"""
+    return key.casefold() if isinstance(key, str) else key
+
+
+def nfc_key(key):
+    """'café' typed as 'cafe' + COMBINING ACUTE ACCENT -> 'café' with one precomposed code point"""
+    return unicodedata.normalize('NFC', key) if isinstance(key, str) else key
+
+
+def nfkc_casefold_key(key):
+    """The most aggressive one: compatibility characters, case and composition all folded ('ＦＯＯ', 'Foo' -> 'foo')"""
+    if not isinstance(key, str):
+        return key
+    # NFKC again after casefold(), because casefolding can produce strings that are not in NFKC any more
+    return unicodedata.normalize('NFKC', unicodedata.normalize('NFKC', key).casefold())
+
+
+NORMALIZERS = {
+    'str': str,
+    'casefold': casefold_key,
+    'nfc': nfc_key,
+    'nfkc_casefold': nfkc_casefold_key,
+}
+
+_MISSING = object()
+
+
+def _restore(cls, normalizer, cache_size, items):
+    new = cls(normalizer=normalizer, cache_size=cache_size)
+    dict.update(new, items)  # Already normalized
+    return new
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+class NormalizingDict(FastUserDict):
+    """A dict whose keys are stored normalized. d[k], k in d, get, pop, del all accept any form of the key"""
+
+    normalizer = str  # Subclasses can change the defaults, instances can override them
+    cache_size = 1024
+
+    def __init__(self, other=(), /, *, normalizer=None, cache_size=None, **kwargs):
+        super().__init__()
+        normalizer = normalizer if normalizer is not None else type(self).normalizer
+        self.normalizer = NORMALIZERS[normalizer] if isinstance(normalizer, str) else normalizer
+        self.cache_size = cache_size if cache_size is not None else type(self).cache_size
+        self._memo = {}  # raw key -> normalized key, at most cache_size entries
+        self.misses = 0
+        super().__init__(other, **kwargs)
+
+    def _normalize(self, key):
+        # The memo stores (type of the key, normalized key). 1, 1.0 and True are equal dict keys, but str() turns them
+        # into '1', '1.0' and 'True' - so a memo entry is only used for a key of the same type as the one that made it
+        entry = self._memo.get(key)  # .get, not try/except: a miss must not cost an exception
+        if entry is not None and entry[0] is type(key):
+            return entry[1]
+        return self._remember(key)
+
+    def _remember(self, key):
+        normalized = self.normalizer(key)
+        if self.cache_size:
+            self.misses += 1
+            if len(self._memo) >= self.cache_size:
+                self._memo.clear()  # Start over: the hot keys come back on their next lookup. No bookkeeping on hits,
+                # unlike LRU, and no scan over deleted slots, unlike a FIFO with del memo[next(iter(memo))]
+            self._memo[key] = type(key), normalized
+        return normalized
+
+    def cache_info(self):
+        return f'misses={self.misses}, size={len(self._memo)}/{self.cache_size}'
+
+    # Reads: dict.__getitem__ is not overridden - a hit with a normalized key never leaves C. A miss costs one Python
+    # call (__missing__), with the memo lookup inlined into it, so a hot key is never converted twice
+
+    def __missing__(self, key):
+        entry = self._memo.get(key)
+        normalized = entry[1] if entry is not None and entry[0] is type(key) else self._remember(key)
+        if normalized is key:
+            raise KeyError(key)
+        try:
+            return dict.__getitem__(self, normalized)
+        except KeyError:
+            raise KeyError(key) from None
+
+    def __contains__(self, key):
+        if dict.__contains__(self, key):
+            return True
+        entry = self._memo.get(key)
+        normalized = entry[1] if entry is not None and entry[0] is type(key) else self._remember(key)
+        return dict.__contains__(self, normalized)
+
+    # get() is FastUserDict's: self[key], so a miss goes through __missing__ and the memo
+
+    # Writes
+
+    def __setitem__(self, key, value):
+        dict.__setitem__(self, self.normalizer(key), value)  # Writes are mostly new, cold keys - the memo is for reads
+
+    def __delitem__(self, key):
+        dict.__delitem__(self, self._normalize(key))
+
+    def pop(self, key, default=_MISSING):  # One normalization - FastUserDict's pop is self[key], then del self[key]
+        if default is _MISSING:
+            return dict.pop(self, self._normalize(key))
+        return dict.pop(self, self._normalize(key), default)
+
+    def setdefault(self, key, default=None):
+        return dict.setdefault(self, self._normalize(key), default)
+
+    def update(self, other=(), /, **kwargs):  # Not through __setitem__: a bulk load normalizes with no call per key
+        normalize, store = self.normalizer, dict.__setitem__  # The normalizer itself, not the memo: bulk keys are cold
+        if isinstance(other, dict):
+            dict.update(self, zip(map(normalize, other), other.values()))
+        elif hasattr(other, 'keys'):
+            for key in other.keys():
+                store(self, normalize(key), other[key])
+        else:
+            for key, value in other:
+                store(self, normalize(key), value)
+        if kwargs:
+            dict.update(self, zip(map(normalize, kwargs), kwargs.values()))
+
+    def _empty_like(self):
+        # Used by FastUserDict's copy(), | and |=: the same settings, and a memo of its own
+        new = super()._empty_like()
+        new._memo = self._memo.copy()
+        return new
+
+    @classmethod
+    def fromkeys(cls, iterable, value=None, **kwargs):  # kwargs are settings here, normalizer= and cache_size=
+        new = cls(**kwargs)
+        dict.update(new, dict.fromkeys(map(new.normalizer, iterable), value))
+        return new
+
+    def __reduce__(self):
+        # Pickle the normalized items and the settings, not the memo
+        return _restore, (self.__class__, self.normalizer, self.cache_size, dict(self))
+
+
+class StrKeyDict(NormalizingDict):
+    """Chapter 3's StrKeyDict: d[2] finds '2'"""
+    normalizer = str
+
+
+class CaseInsensitiveDict(NormalizingDict):
+    normalizer = staticmethod(casefold_key)  # staticmethod: a plain function as a class attribute would become a method
+
+
+class UnicodeKeyDict(NormalizingDict):
+    normalizer = staticmethod(nfkc_casefold_key)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+# The chapter 3 originals, for the benchmark (without the print() in __missing__). The UserDict one, StrKeyDictUser, is
+# imported from fast_userdict
+
+
+class StrKeyDictDict(dict):
+    def __missing__(self, key):
+        if isinstance(key, str):
+            raise KeyError(key)
+        return self[str(key)]
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __contains__(self, key):
+        return key in self.keys() or str(key) in self.keys()
+
+
+def benchmark(n=200_000, hot=100, repeat=3):
+    import functools
+    import random
+    import timeit
+
+    rng = random.Random(1)
+    items = [(str(i), i) for i in range(n)]
+    int_items = [(i, i) for i in range(n)]
+    hot_keys = [rng.randrange(hot) for _ in range(n)]  # Int lookups concentrated on a few hot keys
+    words = [f'Straße-{i}' for i in range(hot)]
+    word_keys = [rng.choice(words).upper() for _ in range(n)]
+
+    def best(fn):
+        return min(timeit.repeat(fn, number=1, repeat=repeat)) * 1e9 / n  # ns per key
+
+    def read_all(mapping, keys):
+        for k in keys:
+            mapping[k]
+
+    def contains_all(mapping, keys):
+        for k in keys:
+            k in mapping
+
+    memo, lru = {}, functools.lru_cache(1024, typed=True)(str)
+    memo.update((k, str(k)) for k in range(hot))
+    print(f'Normalizing hot int keys: str() {best(lambda: list(map(str, hot_keys))):.0f} ns, '
+          f'lru_cache(str) {best(lambda: list(map(lru, hot_keys))):.0f} ns, '
+          f'dict memo {best(lambda: list(map(memo.__getitem__, hot_keys))):.0f} ns')
+
+    print(f'{"ns / key":<32}{"d[int]":>8}{"int in d":>10}')
+    for name, mapping in [('StrKeyDict(dict)', StrKeyDictDict(items)),
+                          ('StrKeyDict(UserDict)', StrKeyDictUser(items)),
+                          ('StrKeyDict, no cache', StrKeyDict(items, cache_size=0)),
+                          ('StrKeyDict, cached', StrKeyDict(items))]:
+        print(f'{name:<32}{best(lambda: read_all(mapping, hot_keys)):>8.0f}'
+              f'{best(lambda: contains_all(mapping, hot_keys)):>10.0f}')
+
+    def word_items():
+        return ((w, i) for i, w in enumerate(words))
+
+    print(f'{"ns / key (mixed-case lookups)":<32}{"d[key]":>8}')
+    for name, mapping in [('casefold, no cache', CaseInsensitiveDict(word_items(), cache_size=0)),
+                          ('casefold, cached', CaseInsensitiveDict(word_items())),
+                          ('NFKC + casefold, no cache', UnicodeKeyDict(word_items(), cache_size=0)),
+                          ('NFKC + casefold, cached', UnicodeKeyDict(word_items()))]:
+        print(f'{name:<32}{best(lambda: read_all(mapping, word_keys)):>8.0f}')
+
+    def one_by_one():
+        d = StrKeyDict()
+        for k, v in int_items:
+            d[k] = v
+
+    def chapter_3():
+        d = StrKeyDictUser()
+        for k, v in int_items:
+            d[k] = v
+
+    print(f'Loading {n} int keys: StrKeyDict(UserDict) {best(chapter_3):.0f} ns/key, one by one {best(one_by_one):.0f}'
+          f' ns/key, bulk update() {best(lambda: StrKeyDict(int_items)):.0f} ns/key')
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+if __name__ == '__main__':
+    d = StrKeyDict([('2', 'two'), ('3', 'three'), ('4', 'four')])
+    print(d, d['2'], d[2], d.get(4), d.get(1), 2 in d, 1 in d)
+    d.update({5: 'five'}, six=6)
+    d.setdefault(7, 'seven')
+    d |= {8: 'eight'}
+    print(d, d.pop(8), d.cache_info())
+
+    ci = CaseInsensitiveDict(Straße='street')
+    print(ci, ci['STRASSE'], 'strasse' in ci, ci.get('Strasse'))
+
+    uk = UnicodeKeyDict({'ＦＯＯ': 1, 'café': 2})  # Fullwidth letters, and 'e' + a combining accent
+    print(uk, uk['Foo'], uk['CAFÉ'], uk.get('cafe'))
+
+    import copy
+    import pickle
+    print(pickle.loads(pickle.dumps(uk)) == uk, type(copy.deepcopy(ci)).__name__, type(d | {9: 9}).__name__)
+
+    benchmark()
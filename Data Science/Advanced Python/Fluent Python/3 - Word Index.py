@@ -0,0 +1,630 @@
+# "3 - Dictionaries and Sets" builds index[word].append((line_no, column_no)) three times, with three strategies
+# (get + reassign, setdefault, defaultdict), reading sys.argv[1] three times. The defaultdict version is the right one -
+# this file scales it to many large files:
+# * One pass per file, files are indexed in parallel worker processes
+# * A location is packed into ONE int instead of a (line_no, column_no) tuple - 8 bytes instead of ~120
+# * Each word's locations are sorted, so they are stored as deltas (gaps) in the smallest array type that fits them,
+#   in blocks of 128 - with the first location of every block stored plainly, so a query can jump over whole blocks
+# * The per-worker indexes are merged and written to a single file, which is later opened with mmap: a query reads only
+#   the few pages it needs, nothing is re-indexed
+
+# Run it using $ python '3 - Word Index.py' build words.idx file1.txt file2.txt ...
+#              $ python '3 - Word Index.py' lookup words.idx word
+#              $ python '3 - Word Index.py' query words.idx 'dict & (set | frozenset) - UserDict'
+
+import bisect
+import heapq
+import itertools
+import mmap
+import operator
+import os
+import re
+import struct
+import sys
+from array import array
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+RE = re.compile(r'\w+')
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+# Packing a location into one int
+
+'''
+  63     44 43                  20 19                 0
+ +---------+----------------------+--------------------+
+ |   doc   |       line_no        |     column_no      |
+ +---------+----------------------+--------------------+
+   19 bits         24 bits               20 bits
+   ~500k files     ~16M lines            ~1M columns
+
+Packed ints sort exactly like (doc, line_no, column_no) tuples, and that's the whole trick: sorted lists of tuples
+become sorted arrays of ints
+'''
+
+DOC_BITS, LINE_BITS, COL_BITS = 19, 24, 20
+LINE_SHIFT, DOC_SHIFT = COL_BITS, COL_BITS + LINE_BITS
+COL_MASK, LINE_MASK = (1 << COL_BITS) - 1, (1 << LINE_BITS) - 1
+
+
+def pack(doc, line_no, column_no):
+    if doc >> DOC_BITS or line_no >> LINE_BITS or column_no >> COL_BITS:
+        raise ValueError(f'Location ({doc}, {line_no}, {column_no}) does not fit in the packed format')
+    return doc << DOC_SHIFT | line_no << LINE_SHIFT | column_no
+
+
+def unpack(location):
+    return location >> DOC_SHIFT, location >> LINE_SHIFT & LINE_MASK, location & COL_MASK
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+# Indexing one file (runs inside a worker)
+
+
+def index_file(doc, path, encoding='utf-8'):
+    index = defaultdict(lambda: array('Q'))  # Locations arrive in increasing order, so every array is already sorted
+    base = doc << DOC_SHIFT
+    with open(path, encoding=encoding, errors='replace') as fp:
+        for line_no, line in enumerate(fp, 1):
+            if line_no >> LINE_BITS:
+                raise ValueError(f'{path}: more than {LINE_MASK} lines')
+            line_base = base | line_no << LINE_SHIFT
+            for match in RE.finditer(line):
+                # Columns past ~1M (minified files) are clamped to the last column instead of failing the whole file
+                index[match.group()].append(line_base | min(match.start() + 1, COL_MASK))
+    return dict(index)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+# Building: parallel per-file indexes -> merge -> one file on disk
+
+
+class WordIndexer:
+    def __init__(self, workers=None, encoding='utf-8'):
+        self.workers = workers
+        self.encoding = encoding
+
+    def build(self, paths):
+        """Index paths and return {word: sorted array('Q') of packed locations}"""
+        paths = list(paths)
+        if len(paths) >> DOC_BITS:
+            raise ValueError(f'Too many files: at most {1 << DOC_BITS} can be indexed together')
+        merged = defaultdict(lambda: array('Q'))
+        docs = range(len(paths))
+        with ProcessPoolExecutor(self.workers) as executor:
+            # map() returns the results in doc order, and doc ids are the high bits of every location.
+            # So appending worker results one after another keeps every word's array sorted - the merge is a concat
+            for partial in executor.map(index_file, docs, paths, itertools.repeat(self.encoding)):
+                for word, locations in partial.items():
+                    merged[word].extend(locations)
+        return paths, dict(merged)
+
+    def write(self, out_path, paths):
+        docs, index = self.build(paths)
+        write_index(out_path, docs, index)
+        return out_path
+
+
+'''
+On-disk format (little-endian, every section 8-byte aligned):
+
+    header    magic b'WORDIDX2', n_docs, n_terms, docs_off, terms_off, table_off, postings_off     (8s + 6 x uint64)
+    docs      the file paths, utf-8, separated by '\\n'
+    terms     all the words, utf-8, sorted, back to back
+    table     5 x uint64 per word: end of the word in terms, first location, number of locations n,
+              offset of its skips in postings, item size of the gaps (1, 2, 4 or 8)
+    postings  for every word, 8-byte aligned:
+                  skips  ceil(n / BLOCK) x uint64: the first location of every block of BLOCK locations
+                  gaps   n - 1 gaps between consecutive locations, as an array of the smallest type that fits
+
+Version 1 (b'WORDIDX1') had no skips: a word's postings were its gaps alone, and a query decoded all of them
+
+Words are sorted by code point, which is the same as sorting their utf-8 bytes - so a lookup is a binary search
+directly over the mmap, without decoding anything
+
+Block b holds locations b*BLOCK ... b*BLOCK + BLOCK-1: it is skips[b] followed by the running sum of its BLOCK-1 gaps.
+To find x, a query binary-searches the skips and decodes the one block x can be in - 128 values, not 10 million
+'''
+
+MAGIC = b'WORDIDX2'
+HEADER = struct.Struct('<8s6Q')
+TABLE_FIELDS = 5
+GAP_TYPECODES = {1: 'B', 2: 'H', 4: 'I', 8: 'Q'}
+BLOCK = 128
+
+
+def _align(fp):
+    pad = -fp.tell() % 8
+    fp.write(b'\0' * pad)
+
+
+def encode_gaps(locations):
+    gaps = list(map(operator.sub, locations[1:], locations[:-1]))  # Pairwise differences, in C
+    biggest = max(gaps, default=0)
+    for itemsize, typecode in GAP_TYPECODES.items():
+        if biggest < 1 << (8 * itemsize):
+            return array(typecode, gaps)
+
+
+def write_index(out_path, docs, index):
+    terms = sorted(index)
+    with open(out_path, 'wb') as fp:
+        fp.write(b'\0' * HEADER.size)
+        docs_off = fp.tell()
+        fp.write('\n'.join(map(str, docs)).encode('utf-8'))
+        _align(fp)
+
+        terms_off = fp.tell()
+        ends, pos = array('Q'), 0
+        for term in terms:
+            encoded = term.encode('utf-8')
+            fp.write(encoded)
+            pos += len(encoded)
+            ends.append(pos)
+        _align(fp)
+
+        table_off = fp.tell()
+        fp.write(b'\0' * (8 * TABLE_FIELDS * len(terms)))  # Filled in after the postings are written
+        _align(fp)
+
+        postings_off = fp.tell()
+        table = array('Q')
+        for term, end in zip(terms, ends):
+            locations = index[term]
+            gaps = encode_gaps(locations)
+            table.extend((end, locations[0], len(locations), fp.tell() - postings_off, gaps.itemsize))
+            skips = locations[::BLOCK]
+            if sys.byteorder != 'little':
+                skips.byteswap()
+            skips.tofile(fp)
+            gaps.tofile(fp)
+            _align(fp)
+
+        if sys.byteorder != 'little':
+            table.byteswap()
+        fp.seek(table_off)
+        table.tofile(fp)
+        fp.seek(0)
+        fp.write(HEADER.pack(MAGIC, len(docs), len(terms), docs_off, terms_off, table_off, postings_off))
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+# Reading: a mmap-backed index
+
+
+class WordIndex:
+    """A read-only word index mapped from disk. index[word] -> sorted array('Q') of packed locations"""
+
+    def __init__(self, path):
+        if sys.byteorder != 'little':
+            raise NotImplementedError('The index file can be mapped on little-endian machines only')
+        with open(path, 'rb') as fp:
+            self._mm = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.n_docs, self.n_terms, docs_off, terms_off, table_off, postings_off = HEADER.unpack_from(self._mm)
+        if magic != MAGIC:
+            raise ValueError(f'{path!r} is not a word index file')
+        self._view = memoryview(self._mm)
+        self.docs = str(self._mm[docs_off:terms_off], 'utf-8').rstrip('\0').split('\n')
+        self._terms_off = terms_off
+        self._table = self._view[table_off:table_off + 8 * TABLE_FIELDS * self.n_terms].cast('Q')
+        self._postings_off = postings_off
+
+    def close(self):
+        self._table.release()
+        self._view.release()
+        self._mm.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return self.n_terms
+
+    def _term_bytes(self, i):
+        start = self._table[TABLE_FIELDS * (i - 1)] if i else 0
+        end = self._table[TABLE_FIELDS * i]
+        return self._mm[self._terms_off + start:self._terms_off + end]
+
+    def term(self, i):
+        return str(self._term_bytes(i), 'utf-8')
+
+    def _find(self, word):
+        key = word.encode('utf-8')
+        # bisect with key= (3.10+) binary-searches the term list without ever building it
+        i = bisect.bisect_left(range(self.n_terms), key, key=self._term_bytes)
+        if i < self.n_terms and self._term_bytes(i) == key:
+            return i
+        return -1
+
+    def __contains__(self, word):
+        return self._find(word) >= 0
+
+    def __iter__(self):
+        return (self.term(i) for i in range(self.n_terms))
+
+    def count(self, word):
+        i = self._find(word)
+        return self._table[TABLE_FIELDS * i + 2] if i >= 0 else 0
+
+    def gaps(self, i):
+        """The stored skips and gaps of term i: zero-copy memoryviews over the mmap"""
+        _, first, count, offset, itemsize = self._table[TABLE_FIELDS * i:TABLE_FIELDS * (i + 1)]
+        start = self._postings_off + offset
+        gaps_start = start + 8 * -(-count // BLOCK)
+        skips = self._view[start:gaps_start].cast('Q')
+        return first, skips, self._view[gaps_start:gaps_start + itemsize * (count - 1)].cast(GAP_TYPECODES[itemsize])
+
+    def postings_at(self, i):
+        first, _, gaps = self.gaps(i)
+        return array('Q', itertools.accumulate(gaps, initial=first))  # Running sum of the gaps, in C
+
+    def cursor(self, word):
+        """A BlockGalloper over the postings of word - nothing is decoded until it seeks"""
+        i = self._find(word)
+        if i < 0:
+            return Galloper(array('Q'))
+        _, skips, gaps = self.gaps(i)
+        return BlockGalloper(skips, gaps)
+
+    def __getitem__(self, word):
+        i = self._find(word)
+        if i < 0:
+            raise KeyError(word)
+        return self.postings_at(i)
+
+    def get(self, word, default=None):
+        try:
+            return self[word]
+        except KeyError:
+            return default
+
+    def locations(self, word):
+        """(path, line_no, column_no) tuples, like the original index - decoded lazily"""
+        for location in self.get(word, ()):
+            doc, line_no, column_no = unpack(location)
+            yield self.docs[doc], line_no, column_no
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+# Querying: set algebra over the posting lists
+
+# Chapter 8 answers index['DIGIT'] ^ (index['NINE'] | index['EIGHT']) with Python sets. Over a persisted index the
+# operands are sorted integer arrays instead, and every set operator becomes a walk over sorted sequences:
+'''
+Operator   Meaning                  Algorithm on sorted arrays
+a & b      in both                  walk the SMALLEST operand, gallop through the others
+a | b      in either                k-way merge (heapq.merge), dropping duplicates
+a - b      in a, not in b           walk a, gallop through b
+a ^ b      in exactly one           merge both, keep the values that appear once
+
+Galloping (exponential) search: to find x in a sorted array from the current position, probe pos+1, pos+2, pos+4,
+pos+8... until we overshoot, then binary-search only that last stretch. Intersecting 10 postings with 10 million costs
+~10 * log(10M) probes instead of 10M steps
+'''
+# Python's precedence is kept: - binds tighter than &, & tighter than ^, ^ tighter than |
+
+QUERY_TOKEN = re.compile(r'\s*(?:(?P<op>[&|^()-])|(?P<word>\w+))')
+PRECEDENCE = {'|': 1, '^': 2, '&': 3, '-': 4}
+
+
+def parse_query(text):
+    """'DIGIT ^ (NINE | EIGHT)' -> ('^', ('word', 'DIGIT'), ('|', ('word', 'NINE'), ('word', 'EIGHT')))"""
+    tokens, pos = [], 0
+    text = text.strip()
+    while pos < len(text):
+        match = QUERY_TOKEN.match(text, pos)
+        if not match or match.end() == pos:
+            raise SyntaxError(f'Unexpected character {text[pos]!r} at position {pos} in query {text!r}')
+        tokens.append(match.group('op') or ('word', match.group('word')))
+        pos = match.end()
+    tokens.append(None)
+
+    def primary(i):
+        token = tokens[i]
+        if token == '(':
+            node, i = expression(i + 1, 0)
+            if tokens[i] != ')':
+                raise SyntaxError(f'Missing ) in query {text!r}')
+            return node, i + 1
+        if isinstance(token, tuple):
+            return token, i + 1
+        raise SyntaxError(f'Expected a word or ( in query {text!r}, got {token!r}')
+
+    def expression(i, min_prec):  # Precedence climbing
+        left, i = primary(i)
+        while tokens[i] in PRECEDENCE and PRECEDENCE[tokens[i]] > min_prec:
+            op = tokens[i]
+            right, i = expression(i + 1, PRECEDENCE[op])
+            left = (op, left, right)
+        return left, i
+
+    node, i = expression(0, 0)
+    if tokens[i] is not None:
+        raise SyntaxError(f'Unexpected {tokens[i]!r} in query {text!r}')
+    return node
+
+
+def canonical(node):
+    """A hashable key for a sub-expression: a & b, b & a and (a & b) & c share the same key"""
+    if node[0] == 'word':
+        return node
+    op = node[0]
+    if op == '-':
+        return op, canonical(node[1]), canonical(node[2])
+    operands = []
+    for child in node[1:]:  # Flatten nested & / | / ^ - they are associative
+        child = canonical(child)
+        operands.extend(child[1] if child[0] == op else [child])
+    return op, tuple(sorted(operands, key=repr))
+
+
+class Galloper:
+    """A cursor over a sorted array that only moves forward"""
+
+    __slots__ = ('values', 'pos')
+
+    def __init__(self, values):
+        self.values = values
+        self.pos = 0
+
+    def seek(self, x):
+        """Move to the first value >= x and return it - None once past the end"""
+        values, pos, n = self.values, self.pos, len(self.values)
+        step = 1
+        while pos + step < n and values[pos + step] < x:
+            step *= 2
+        lo = pos + step // 2 if step > 1 else pos
+        self.pos = pos = bisect.bisect_left(values, x, lo, min(n, pos + step + 1))
+        return values[pos] if pos < n else None
+
+
+class BlockGalloper:
+    """A Galloper over a WordIndex's postings: skips whole blocks by their first values, decodes only the one x is in"""
+
+    __slots__ = ('skips', 'gaps', 'block', 'values', 'pos')
+
+    def __init__(self, skips, gaps):
+        self.skips, self.gaps = skips, gaps
+        self.block, self.values, self.pos = 0, None, 0
+
+    def seek(self, x):
+        values, block, skips = self.values, self.block, self.skips
+        if values is None or values[-1] < x:
+            if block >= len(skips):
+                return None
+            # The last block that starts at or before x - never one behind the current block
+            block = max(block, bisect.bisect_right(skips, x, block) - 1)
+            start = block * BLOCK
+            self.block, self.pos = block, 0
+            self.values = values = array('Q', itertools.accumulate(self.gaps[start:start + BLOCK - 1],
+                                                                   initial=skips[block]))
+        self.pos = pos = bisect.bisect_left(values, x, self.pos)
+        if pos < len(values):
+            return values[pos]
+        # x falls between this block and the next: the answer is the first value of the next block
+        self.block, self.values, self.pos = block + 1, None, 0
+        return skips[block + 1] if block + 1 < len(skips) else None
+
+
+def _dedup(sorted_values):
+    return (value for value, _ in itertools.groupby(sorted_values))
+
+
+class QueryEngine:
+    """Evaluate boolean queries over a WordIndex (or any {word: sorted array} mapping)"""
+
+    LEVELS = {'location': 0, 'line': LINE_SHIFT, 'doc': DOC_SHIFT}
+
+    def __init__(self, index, level='line', cache_size=256):
+        self.index = index
+        self.shift = self.LEVELS[level]  # Match whole lines by default: 'a & b' = lines containing both a and b
+        self.level = level
+        self.cache_size = cache_size
+        self._cache = OrderedDict()  # canonical sub-expression -> sorted array('Q'), LRU-bounded
+
+    # Leaves
+
+    def _term(self, word):
+        postings = self.index.get(word)
+        if postings is None:
+            return array('Q')
+        if not self.shift:
+            return postings
+        return array('Q', _dedup(map(operator.rshift, postings, itertools.repeat(self.shift))))
+
+    def _estimate(self, key):
+        """An upper bound of the result size - without evaluating anything that isn't cached yet"""
+        if key in self._cache:
+            return len(self._cache[key])
+        op = key[0]
+        if op == 'word':
+            if isinstance(self.index, WordIndex):
+                return self.index.count(key[1])  # Read from the table, the postings aren't decoded
+            return len(self.index.get(key[1], ()))
+        if op == '-':
+            return self._estimate(key[1])
+        sizes = [self._estimate(k) for k in key[1]]
+        return min(sizes) if op == '&' else sum(sizes)
+
+    # Evaluation
+
+    def _materialize(self, key):
+        cached = self._cache.get(key)
+        if cached is not None:
+            self._cache.move_to_end(key)
+            return cached
+        values = self._term(key[1]) if key[0] == 'word' else array('Q', self._stream(key))
+        self._remember(key, values)
+        return values
+
+    def _remember(self, key, values):
+        self._cache[key] = values
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def _recording(self, key, stream):
+        # Results stream lazily; once a sub-expression has been read to the end, it is cached for the next query
+        values = array('Q')
+        for x in stream:
+            values.append(x)
+            yield x
+        self._remember(key, values)
+
+    def _probe(self, key):
+        """A membership test x -> bool for ascending x, built from forward-only gallopers over the leaves"""
+        if key in self._cache:
+            return self._member(Galloper(self._materialize(key)).seek, 0)
+        op = key[0]
+        if op == 'word':
+            # A leaf that is only probed is never decoded in full: its cursor skips blocks, and works in locations -
+            # line (or doc) x is in the postings if the first location >= x << shift is on line x
+            if isinstance(self.index, WordIndex):
+                return self._member(self.index.cursor(key[1]).seek, self.shift)
+            return self._member(Galloper(self.index.get(key[1], array('Q'))).seek, self.shift)
+        if op == '-':
+            left, right = self._probe(key[1]), self._probe(key[2])
+            return lambda x: left(x) and not right(x)
+        probes = [self._probe(k) for k in sorted(key[1], key=self._estimate)]
+        if op == '&':
+            return lambda x: all(p(x) for p in probes)
+        if op == '|':
+            return lambda x: any(p(x) for p in probes)
+        return lambda x: sum(p(x) for p in probes) % 2 == 1  # '^'
+
+    @staticmethod
+    def _member(seek, shift):
+        if not shift:
+            return lambda x: seek(x) == x
+        return lambda x: (found := seek(x << shift)) is not None and found >> shift == x
+
+    def _stream(self, key):
+        if key in self._cache or key[0] == 'word':
+            return iter(self._materialize(key))
+        op = key[0]
+        if op == '&':
+            # Only the cheapest operand is walked. The others are probed - a union inside an intersection is never
+            # materialized, each of its branches is galloped through separately
+            operands = sorted(key[1], key=self._estimate)
+            driver, probe = self._stream(operands[0]), self._probe(('&', tuple(operands[1:])))
+            stream = (x for x in driver if probe(x))
+        elif op == '-':
+            right = self._probe(key[2])
+            stream = (x for x in self._stream(key[1]) if not right(x))
+        elif op == '|':
+            stream = _dedup(heapq.merge(*(self._stream(k) for k in key[1])))
+        else:
+            stream = self._xor([self._stream(k) for k in key[1]])
+        return self._recording(key, stream)
+
+    @staticmethod
+    def _xor(streams):
+        # With more than 2 operands, a ^ b ^ c keeps the values that appear an odd number of times
+        for value, group in itertools.groupby(heapq.merge(*(_dedup(s) for s in streams))):
+            if sum(1 for _ in group) % 2:
+                yield value
+
+    def search(self, query):
+        """Lazily yield the matching keys (packed locations, line keys or doc ids - depending on level)"""
+        key = canonical(parse_query(query) if isinstance(query, str) else query)
+        return self._stream(key)
+
+    def count(self, query):
+        return sum(1 for _ in self.search(query))
+
+    def explain(self, query):
+        key = canonical(parse_query(query))
+        return key, self._estimate(key)
+
+    def results(self, query):
+        """Decode the matches back into (path, line_no) / path / (path, line_no, column_no)"""
+        docs = getattr(self.index, 'docs', None)
+        for key in self.search(query):
+            location = key << self.shift
+            doc, line_no, column_no = unpack(location)
+            path = docs[doc] if docs else doc
+            if self.level == 'doc':
+                yield path
+            elif self.level == 'line':
+                yield path, line_no
+            else:
+                yield path, line_no, column_no
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+if __name__ == '__main__':
+    if len(sys.argv) > 3 and sys.argv[1] == 'build':
+        WordIndexer().write(sys.argv[2], sys.argv[3:])
+    elif len(sys.argv) > 3 and sys.argv[1] == 'lookup':
+        with WordIndex(sys.argv[2]) as idx:
+            for word in sys.argv[3:]:
+                print(word, list(idx.locations(word)))
+    elif len(sys.argv) > 3 and sys.argv[1] == 'query':
+        with WordIndex(sys.argv[2]) as idx:
+            for path, line_no in QueryEngine(idx).results(' '.join(sys.argv[3:])):
+                print(f'{path}:{line_no}')
+    else:
+        # Demo: index the chapter files of this folder
+        import tempfile
+        import time
+
+        here = os.path.dirname(os.path.abspath(__file__))
+        files = sorted(os.path.join(here, name) for name in os.listdir(here) if name.endswith('.py'))
+        with tempfile.TemporaryDirectory() as tmp:
+            out = os.path.join(tmp, 'fluent.idx')
+            t0 = time.perf_counter()
+            WordIndexer().write(out, files)
+            t1 = time.perf_counter()
+            with WordIndex(out) as idx:
+                t2 = time.perf_counter()
+                print(f'{len(files)} files, {len(idx)} words, built in {t1 - t0:.2f} s, opened in {t2 - t1:.4f} s, '
+                      f'{os.path.getsize(out) / 1024:.0f} KiB')
+                print('StrKeyDict:', idx.count('StrKeyDict'), 'times')
+                for path, line_no, column_no in list(idx.locations('StrKeyDict'))[:3]:
+                    print(f'    {os.path.basename(path)}:{line_no}:{column_no}')
+
+                engine = QueryEngine(idx)
+                query = 'dict & (set | frozenset) - UserDict'
+                print(query, '->', engine.explain(query))
+                for path, line_no in engine.results(query):
+                    print(f'    {os.path.basename(path)}:{line_no}')
+
+        # 10M postings: 3 frequent words and 2 rare ones, written to an index file and mapped like any other. Position
+        # i is column (i % 8) * 10 + 1 of line i // 8 + 1, so 'line' queries have lines to match
+        import random
+
+        def located(positions):
+            return array('Q', ((i >> 3) + 1 << LINE_SHIFT | (i & 7) * 10 + 1 for i in positions))
+
+        rnd = random.Random(8)
+        universe = 48_000_000
+        synthetic = {'the': located(range(0, universe, 12)),  # 4M
+                     'and': located(range(0, universe, 16)),  # 3M
+                     'of': located(range(0, universe, 15)),  # 3.2M
+                     'python': located(sorted(rnd.sample(range(universe), 800))),
+                     'mmap': located(sorted(rnd.sample(range(universe), 200)))}
+        queries = ['python & the & and & of', 'mmap & (the | and)', '(python | mmap) - of', 'python ^ mmap']
+        with tempfile.TemporaryDirectory() as tmp:
+            out = os.path.join(tmp, 'synthetic.idx')
+            write_index(out, ['synthetic'], synthetic)
+            with WordIndex(out) as idx:
+                for level in ('location', 'line'):
+                    engine, in_memory = QueryEngine(idx, level=level), QueryEngine(synthetic, level=level)
+                    print(f'{os.path.getsize(out) / 2 ** 20:.0f} MiB index, level={level!r}')
+                    for query in queries:
+                        t0 = time.perf_counter()
+                        n = engine.count(query)
+                        t1 = time.perf_counter()
+                        n_again = engine.count(query)  # Sub-expressions are cached now
+                        t2 = time.perf_counter()
+                        assert n == n_again == in_memory.count(query)
+                        print(f'    {query:<28} {n:>6} matches  {(t1 - t0) * 1000:8.2f} ms  '
+                              f'(again: {(t2 - t1) * 1000:.2f} ms)')
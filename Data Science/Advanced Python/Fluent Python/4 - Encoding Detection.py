@@ -0,0 +1,255 @@
+# "4 - Unicode Text Versus Bytes": bytes don't say which encoding they are in. b'Montr\xe9al' is 'Montréal' in cp1252
+# and latin-1, 'Montrιal' in iso8859_7, 'MontrИal' in koi8_r - and raises UnicodeDecodeError in utf-8. Read a UTF-8
+# file as cp1252 and 'café' becomes the mojibake 'cafÃ©'. The chapter's advice is that you can't know, only guess well
+
+# This module guesses well, fast, for a lot of files:
+# * Only a bounded prefix sample is read (64 KB by default) - a GB file costs the same as a small one
+# * Every candidate codec gets a score in [0, 1] from cheap statistics, computed with C-level bytes methods:
+#   - A BOM                  -> certain (utf-8-sig, UTF-16 / UTF-32 LE / BE)
+#   - UTF-8                  -> the sample must decode. Then one multibyte sequence is enough to beat the 8-bit code
+#                               pages - 'café' is 5 bytes with 1 of them - and every other one makes a coincidence less
+#                               likely: 'Ã©' (b'\xc3\xa9') in cp1252 text is possible, a hundred of them is not
+#   - UTF-16 without a BOM   -> mostly-Latin text has a zero byte in every other position: odd positions for LE, even
+#                               for BE
+#   - cp1252 / latin-1       -> any byte sequence decodes, so look at the high bytes: are they letters inside words
+#                               (Montr\xe9al), and are any in 0x80-0x9F, which are curly quotes and dashes in cp1252 but
+#                               invisible control characters in latin-1?
+# * The result is memoized per source - a path is re-examined only when its size or mtime changes
+# * detect_many() runs over many files in a thread pool: reading files releases the GIL, and so do the big bytes scans
+
+import codecs
+import hashlib
+import os
+import re
+import sys
+import threading
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'Libraries and Modules'))
+from batching import bounded_map  # noqa: E402
+
+SAMPLE_SIZE = 1 << 16
+
+Detection = namedtuple('Detection', 'encoding confidence scores')
+
+BOMS = [  # Longest first: the UTF-32-LE BOM starts with the UTF-16-LE one
+    (codecs.BOM_UTF32_LE, 'utf-32-le'),
+    (codecs.BOM_UTF32_BE, 'utf-32-be'),
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+]
+
+ASCII_BYTES = bytes(range(0x80))
+NOT_C1_BYTES = bytes(range(0xA0, 0x100))  # Deleting these from the high bytes leaves 0x80-0x9F
+CP1252_UNDEFINED = b'\x81\x8d\x8f\x90\x9d'  # The five bytes cp1252 leaves undefined
+# A high byte next to an ASCII letter: é in Montr\xe9al, ü in Z\xfcrich. Letters in the 0xC0-0xFF range of cp1252
+RE_HIGH_IN_WORD = re.compile(rb'[A-Za-z][\xc0-\xff]|[\xc0-\xff][A-Za-z]')
+
+
+def sniff_bom(sample):
+    for bom, codec in BOMS:
+        if sample.startswith(bom):
+            return codec
+    return None
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+# Scorers: sample bytes -> score in [0, 1]
+
+
+def score_utf8(sample, nulls):
+    try:
+        # An incremental decoder without final=True: a sample cut in the middle of a character is still valid UTF-8
+        text = codecs.getincrementaldecoder('utf-8')().decode(sample)
+    except UnicodeDecodeError:
+        return 0.0
+    multibyte = len(text) - len(text.encode('ascii', 'ignore'))
+    if not multibyte:
+        return 0.0
+    # Above the 0.9 that score_single_byte never exceeds: in cp1252 text, high bytes that all pair up as valid UTF-8 are
+    # the rare case. Each more valid sequence by chance is ~1/4 likely at best - compound it
+    score = 0.91 + 0.08 * (1 - 0.25 ** min(multibyte - 1, 30))
+    return score * (0.1 if nulls else 1)  # Valid, but zero bytes mean UTF-16 much more likely
+
+
+def score_utf16(sample):
+    """(LE score, BE score)"""
+    n = len(sample) // 2
+    if not n:
+        return 0.0, 0.0
+    even_zeros = sample[0:2 * n:2].count(0)
+    odd_zeros = sample[1:2 * n:2].count(0)
+    scores = []
+    for codec, zeros, other in (('utf-16-le', odd_zeros, even_zeros), ('utf-16-be', even_zeros, odd_zeros)):
+        try:
+            codecs.getincrementaldecoder(codec)().decode(sample[:2 * n])  # Unpaired surrogates -> not UTF-16
+        except UnicodeDecodeError:
+            scores.append(0.0)
+            continue
+        scores.append(min(0.99, max(0.0, 2 * (zeros - other) / n)))
+    return tuple(scores)
+
+
+def score_single_byte(sample, nulls):
+    """(cp1252 score, latin-1 score). Both decode anything - the score is how much the high bytes look like text"""
+    high = sample.translate(None, ASCII_BYTES)  # Only the bytes >= 0x80, in one C pass
+    if nulls:
+        return 0.05, 0.05  # Zero bytes are not text in any 8-bit code page
+    if not high:
+        return 0.5, 0.5
+    c1 = len(high.translate(None, NOT_C1_BYTES))
+    in_words = 2 * len(RE_HIGH_IN_WORD.findall(sample))
+
+    def plausibility(text_like):  # At most 0.9: valid UTF-8 with a multibyte character should win
+        return 0.3 + 0.6 * min(1.0, text_like / len(high))
+
+    if any(byte in high for byte in CP1252_UNDEFINED):
+        return 0.0, plausibility(in_words) * 0.5  # Not cp1252. latin-1 decodes it, as control characters
+    # In cp1252 the 0x80-0x9F bytes are text too: quotes, dashes, €. In latin-1 they are invisible controls. Without
+    # them both codecs give the same text, and the tie goes to cp1252 (browsers decode 'latin-1' pages as cp1252, too)
+    return plausibility(in_words + c1), plausibility(in_words) * (0.9 if not c1 else 0.3)
+
+
+def score_candidates(sample):
+    if bom := sniff_bom(sample):
+        return {bom: 1.0}
+    nulls = sample.count(0)
+    if not nulls and sample.isascii():
+        return {'ascii': 1.0}  # Also valid utf-8, cp1252 and latin-1 - any of them decodes it right
+    le, be = score_utf16(sample)
+    cp1252, latin_1 = score_single_byte(sample, nulls)
+    return {'utf-8': score_utf8(sample, nulls), 'utf-16-le': le, 'utf-16-be': be, 'cp1252': cp1252, 'latin-1': latin_1}
+
+
+def detect_bytes(sample):
+    scores = score_candidates(sample)
+    encoding = max(scores, key=scores.get)
+    return Detection(encoding, round(scores[encoding], 3), scores)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+# The service: memoized, concurrent
+
+
+class EncodingDetector:
+    """Detect the encoding of paths or bytes from a prefix sample, memoizing the results"""
+
+    def __init__(self, sample_size=SAMPLE_SIZE, maxsize=100_000):
+        self.sample_size = sample_size
+        self.maxsize = maxsize
+        self._cache = OrderedDict()  # source key -> Detection, least recently used first
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def _key(self, source):
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            # Bytes have no identity worth keeping - the digest of the sample is the key
+            return 'bytes', hashlib.blake2b(source[:self.sample_size], digest_size=16).digest()
+        stat = os.stat(source)
+        # A changed file has a new size or mtime, so a stale entry is never returned
+        return os.path.realpath(source), stat.st_size, stat.st_mtime_ns
+
+    def _sample(self, source):
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            return bytes(source[:self.sample_size])
+        with open(source, 'rb') as fp:
+            return fp.read(self.sample_size)
+
+    def detect(self, source) -> Detection:
+        key = self._key(source)
+        with self._lock:
+            if (cached := self._cache.get(key)) is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return cached
+        detection = detect_bytes(self._sample(source))  # Outside the lock: two threads may both compute it, rarely
+        with self._lock:
+            self.misses += 1
+            self._cache[key] = detection
+            if len(self._cache) > self.maxsize:
+                self._cache.popitem(last=False)
+        return detection
+
+    def detect_many(self, sources, workers=8):
+        """(source, Detection) for every source, in order. Unreadable sources give a Detection of None with the error"""
+        with ThreadPoolExecutor(workers) as executor:
+            # At most `prefetch` sources ahead, so an endless iterable of paths is fine
+            yield from bounded_map(executor, self._detect_or_error, sources, prefetch=64)
+
+    def _detect_or_error(self, source):
+        try:
+            return source, self.detect(source)
+        except OSError as error:
+            return source, Detection(None, 0.0, {'error': str(error)})
+
+    def open(self, path, **kwargs):
+        """open(path) in text mode, with the detected encoding"""
+        encoding = self.detect(path).encoding
+        return open(path, encoding='utf-8' if encoding == 'ascii' else encoding, **kwargs)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+if __name__ == '__main__':
+    samples = {
+        "b'Montr\\xe9al'": b'Montr\xe9al',
+        'café as utf-8': 'café, São Paulo, Zürich'.encode('utf-8'),
+        'café as cp1252': 'café, São Paulo, Zürich'.encode('cp1252'),
+        'cp1252 quotes': '“Smart quotes” – and 100€'.encode('cp1252'),
+        'utf-16 with BOM': 'El Niño'.encode('utf-16'),
+        'utf-16-le no BOM': 'El Niño and more text'.encode('utf-16-le'),
+        'utf-16-be no BOM': 'El Niño and more text'.encode('utf-16-be'),
+        'utf-8-sig': 'café'.encode('utf-8-sig'),
+        'ascii': b'plain old ASCII',
+        'short utf-8': 'café'.encode('utf-8'),
+        'short utf-8 words': 'Montréal is a city'.encode('utf-8'),
+        'short utf-8 ñ': 'El Niño'.encode('utf-8'),
+    }
+    detector = EncodingDetector()
+    for name, data in samples.items():
+        encoding, confidence, _ = detector.detect(data)
+        print(f'{name:<20} {encoding:<10} {confidence:<6} {data.decode(encoding)!r}')
+    for text in ('café', 'Montréal is a city', 'El Niño', 'São Paulo'):  # Short UTF-8: no mojibake
+        assert detect_bytes(text.encode()).encoding == 'utf-8', text
+        assert detect_bytes(text.encode('cp1252')).encoding == 'cp1252', text
+    print(detector.detect(samples['ascii']), detector.hits, detector.misses)
+
+    import random
+    import tempfile
+    import time
+
+    texts = ['Montréal, São Paulo, Zürich, El Niño - “quoted” – 100€\n' * 2000, 'plain ascii log line\n' * 3000]
+    codecs_used = ['utf-8', 'cp1252', 'utf-16', 'utf-16-le', 'utf-8-sig']
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        expected = {}
+        for i in range(2000):
+            path = os.path.join(tmp, f'{i}.txt')
+            codec = rng.choice(codecs_used)
+            with open(path, 'wb') as fp:
+                fp.write(rng.choice(texts).encode(codec))
+            expected[path] = codec
+        paths = list(expected)
+
+        for workers in (1, 8):
+            detector = EncodingDetector()
+            t0 = time.perf_counter()
+            results = list(detector.detect_many(paths, workers=workers))
+            print(f'{len(paths)} files, {workers} thread(s): {time.perf_counter() - t0:.3f} s')
+        t0 = time.perf_counter()
+        list(detector.detect_many(paths))
+        print(f'Again, memoized: {time.perf_counter() - t0:.3f} s, hits={detector.hits}')
+
+        def read_as(path, encoding):
+            with open(path, encoding=encoding) as fp:
+                return fp.read()
+
+        # 'ascii' for a utf-8 file, or 'utf-8-sig' for one written as utf-8 + BOM, is still the right answer
+        right = sum(read_as(path, detection.encoding) == read_as(path, expected[path]) for path, detection in results)
+        print(f'Decoded to the text that was written: {right}/{len(paths)} files')
+        print('(One CPU and files in the page cache: threads only pay off when the reads have to wait for a disk)'
+              if os.cpu_count() == 1 else '')
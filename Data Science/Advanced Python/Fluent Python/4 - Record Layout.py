@@ -0,0 +1,266 @@
+# "4 - Unicode Text Versus Bytes" turns array('h', [...]) into bytes, and "12 - Special Methods for Sequences" turns
+# them back with VectorMD.from_bytes. Both are one flat array of one type. Real binary files are arrays of RECORDS:
+# a fixed-width struct repeated N times - an id (uint32), two coordinates (float64), a name (12 bytes)...
+
+# The naive way to read them copies every byte at least twice:
+#     data = fp.read()                                  # copy 1: the whole file into a bytes object
+#     for i in range(n):
+#         chunk = data[i * size:(i + 1) * size]         # copy 2: a new bytes object per record
+#         record = struct.unpack(fmt, chunk)
+
+# RecordLayout declares the fields once and then reads records WITHOUT intermediate copies:
+# * record i           -> struct.unpack_from(buffer, i * size): reads in place, O(1) random access
+# * all records        -> struct.iter_unpack over a memoryview: one C loop, no slices
+# * one field          -> a strided memoryview: memoryview(buffer).cast('d')[k::step] is a view of every record's x,
+#                         and sum(), min(), array() run over it without building any tuple
+# * a whole file       -> mmap: the OS pages the file in on demand, so a 10 GB file opens instantly
+# * NumPy (optional)   -> np.frombuffer with a structured dtype: the same bytes as a table with named columns
+
+# The same trick fixes VectorMD.from_bytes, which does memoryview(octets[1:]): octets[1:] copies everything but the
+# first byte before the memoryview is even made. memoryview(octets)[1:] is a view - slicing a memoryview never copies
+
+import mmap
+import struct
+import sys
+from array import array, typecodes
+from collections import namedtuple
+from itertools import starmap
+from operator import itemgetter
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+BYTE_ORDERS = {'<': 'little', '>': 'big', '!': 'big', '=': sys.byteorder, '@': sys.byteorder}
+VIEW_CODES = set('bBhHiIlLqQfd')  # struct codes that memoryview.cast understands too
+
+
+class RecordLayout:
+    """A fixed-width record: fields = [(name, struct code), ...], e.g. [('id', 'I'), ('x', 'd'), ('name', '12s')]"""
+
+    def __init__(self, name, fields, byteorder='<', encoding=None):
+        if byteorder not in BYTE_ORDERS:
+            raise ValueError(f'byteorder must be one of {"".join(BYTE_ORDERS)}, got {byteorder!r}')
+        self.names = [field_name for field_name, _ in fields]
+        self.codes = [code for _, code in fields]
+        self.byteorder = byteorder
+        self.struct = struct.Struct(byteorder + ''.join(self.codes))
+        self.size = self.struct.size
+        # The offset of a field is the size of everything before it, plus the padding in front of it ('@' only)
+        self.offsets = [struct.calcsize(byteorder + ''.join(self.codes[:i + 1])) - struct.calcsize(byteorder + code)
+                        for i, code in enumerate(self.codes)]
+        self.record_class = namedtuple(name, self.names)
+        # With an encoding, the fixed-size 's' fields come out as str, NUL padding stripped - that's one Python call
+        # per field per record, so it's opt-in. Without it they are bytes, and nothing runs per field
+        self.encoding = encoding
+        self._text_fields = [i for i, code in enumerate(self.codes) if code.endswith('s')] if encoding else []
+
+    def __repr__(self):
+        fields = ', '.join(f'{name}:{code}' for name, code in zip(self.names, self.codes))
+        return f'RecordLayout({self.record_class.__name__}, [{fields}], {self.size} bytes)'
+
+    def _make(self, values):
+        if self._text_fields:
+            values = list(values)
+            for i in self._text_fields:
+                values[i] = values[i].rstrip(b'\0').decode(self.encoding)
+        return self.record_class._make(values)
+
+    # Writing
+
+    def pack(self, records):
+        """Many records -> one bytes object. The text fields are encoded if the layout has an encoding"""
+        if self._text_fields:
+            records = (self._encode(record) for record in records)
+        return b''.join(starmap(self.struct.pack, records))
+
+    def _encode(self, record):
+        values = list(record)
+        for i in self._text_fields:
+            values[i] = values[i].encode(self.encoding)  # struct pads (or truncates) to the field size
+        return values
+
+    # Reading
+
+    def view(self, buffer, offset=0, count=None):
+        return RecordView(self, buffer, offset, count)
+
+    def open(self, path, offset=0):
+        return RecordFile(self, path, offset)
+
+
+class RecordView:
+    """N records laid out back to back in a buffer (bytes, bytearray, mmap, memoryview...) - nothing is copied"""
+
+    def __init__(self, layout, buffer, offset=0, count=None):
+        self.layout = layout
+        memory = memoryview(buffer).cast('B')  # Byte-addressed, whatever the buffer's own format is
+        available = (len(memory) - offset) // layout.size
+        self.count = available if count is None else count
+        if not 0 <= self.count <= available:
+            raise ValueError(f'{count} records of {layout.size} bytes do not fit in {len(memory) - offset} bytes')
+        self._memory = memory[offset:offset + self.count * layout.size]  # A view: slicing a memoryview never copies
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            start, stop, step = i.indices(self.count)
+            if step != 1:
+                raise ValueError('RecordView slices must be contiguous')
+            return RecordView(self.layout, self._memory, start * self.layout.size, max(0, stop - start))
+        if i < 0:
+            i += self.count
+        if not 0 <= i < self.count:
+            raise IndexError('record index out of range')
+        return self.layout._make(self.layout.struct.unpack_from(self._memory, i * self.layout.size))
+
+    def __iter__(self):
+        values = self.layout.struct.iter_unpack(self._memory)
+        if self.layout._text_fields:
+            return map(self.layout._make, values)
+        return map(self.layout.record_class._make, values)
+
+    def tuples(self):
+        """Plain tuples, straight from struct.iter_unpack - the fastest way through every record"""
+        return self.layout.struct.iter_unpack(self._memory)
+
+    def column(self, name):
+        """One field of every record: a zero-copy strided memoryview when possible, else a compact array"""
+        layout = self.layout
+        i = layout.names.index(name)
+        code, offset = layout.codes[i], layout.offsets[i]
+        if (view := self._strided(code, offset)) is not None:
+            return view
+        # The fallback is still C: a struct that skips the other fields with pad bytes ('x'), run by iter_unpack
+        item_size = struct.calcsize(layout.byteorder + code)
+        skipper = struct.Struct(f'{layout.byteorder}{offset}x{code}{layout.size - offset - item_size}x')
+        values = map(itemgetter(0), skipper.iter_unpack(self._memory))
+        if i in layout._text_fields:
+            return [value.rstrip(b'\0').decode(layout.encoding) for value in values]
+        return array(code, values) if len(code) == 1 and code in typecodes else list(values)
+
+    def _strided(self, code, offset):
+        # memoryview.cast uses the machine's byte order and native sizes: the field has to match both, and the record
+        # size has to be a whole number of fields, so that every record's value sits a whole number of items further
+        layout = self.layout
+        if BYTE_ORDERS[layout.byteorder] != sys.byteorder or code not in VIEW_CODES:
+            return None
+        item_size = struct.calcsize(code)
+        if struct.calcsize(layout.byteorder + code) != item_size or layout.size % item_size or not self.count:
+            return None
+        span = (self.count - 1) * layout.size + item_size  # From the first record's field to the last one's
+        return self._memory[offset:offset + span].cast(code)[::layout.size // item_size]
+
+    def to_numpy(self):
+        """A NumPy structured array over the same bytes (read-only if the buffer is)"""
+        if np is None:
+            raise ImportError('to_numpy() needs NumPy')
+        layout = self.layout
+        order = {'!': '>', '@': '='}.get(layout.byteorder, layout.byteorder)
+        formats = [f'S{code[:-1] or 1}' if code.endswith('s') else order + code for code in layout.codes]
+        dtype = np.dtype({'names': layout.names, 'formats': formats, 'offsets': layout.offsets,
+                          'itemsize': layout.size})
+        return np.frombuffer(self._memory, dtype=dtype, count=self.count)
+
+    def release(self):
+        self._memory.release()
+
+
+class RecordFile:
+    """A file of records, mmap-ed: with layout.open(path) as records: records[i], records.column('x')..."""
+
+    def __init__(self, layout, path, offset=0):
+        self.layout = layout
+        self.path = path
+        self.offset = offset
+        self._fp = self._mm = self.records = None
+
+    def __enter__(self):
+        self._fp = open(self.path, 'rb')
+        self._mm = mmap.mmap(self._fp.fileno(), 0, access=mmap.ACCESS_READ)
+        self.records = RecordView(self.layout, self._mm, self.offset)
+        return self.records
+
+    def __exit__(self, *exc_info):
+        self.records.release()  # Every view of the map has to go before the map can be closed
+        self._mm.close()
+        self._fp.close()
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+# VectorMD.from_bytes without the copy
+
+
+def from_bytes(octets):
+    """Chapter 12's format: one typecode byte, then the components. Returns a view of the components - no copy"""
+    return memoryview(octets)[1:].cast(chr(octets[0]))
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+if __name__ == '__main__':
+    City = RecordLayout('City', [('id', 'I'), ('population', 'I'), ('lat', 'd'), ('lon', 'd'), ('name', '12s')],
+                        encoding='utf-8')
+    print(City)
+    data = City.pack([(1, 36_933_000, 35.689722, 139.691667, 'Tokyo'),
+                      (2, 21_935_000, 28.613889, 77.208889, 'Delhi'),
+                      (3, 20_142_000, 19.433333, -99.133333, 'Mexico City')])
+    cities = City.view(data)
+    print(len(cities), cities[1], cities[-1].name)
+    print(list(cities.column('lat')), type(cities.column('lat')).__name__, cities.column('name'))
+    print([city.name for city in cities[1:]])
+
+    octets = bytes([ord('d')]) + bytes(array('d', [3.0, 4.0]))
+    print(from_bytes(octets).tolist())
+
+    import os
+    import random
+    import tempfile
+    import time
+
+    Point = RecordLayout('Point', [('id', 'Q'), ('x', 'd'), ('y', 'd'), ('tag', '8s')])
+    n = 1_000_000
+    rng = random.Random(0)
+    rows = [(i, rng.random(), rng.random(), b'p%07d' % (i % 10_000_000)) for i in range(n)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'points.bin')
+        with open(path, 'wb') as fp:
+            fp.write(Point.pack(rows))
+        print(f'{n:,} records x {Point.size} bytes = {os.path.getsize(path) / 1e6:.0f} MB')
+
+        def timed(label, fn):
+            t0 = time.perf_counter()
+            result = fn()
+            print(f'{label:<44}{time.perf_counter() - t0:>8.3f} s')
+            return result
+
+        def naive():
+            with open(path, 'rb') as fp:
+                raw = fp.read()
+            size, unpack = Point.size, Point.struct.unpack
+            return sum(unpack(raw[i * size:(i + 1) * size])[1] for i in range(len(raw) // size))
+
+        def naive_column():
+            with open(path, 'rb') as fp:
+                raw = fp.read()
+            return sum(Point.view(raw).column('x'))
+
+        expected = timed('read() + slice + unpack, sum(x)', naive)
+        with Point.open(path) as points:
+            assert timed('mmap + iter_unpack, sum(x)', lambda: sum(t[1] for t in points.tuples())) == expected
+            assert timed('mmap + strided column view, sum(x)', lambda: sum(points.column('x'))) == expected
+            timed('mmap + column view -> array', lambda: array('d', points.column('x')))
+            if np is not None:
+                assert timed('mmap + NumPy structured view, sum(x)', lambda: points.to_numpy()['x'].sum()) > 0
+            probes = [rng.randrange(n) for _ in range(100_000)]
+            timed('100,000 random records[i] on the mmap', lambda: [points[i] for i in probes])
+            print(points[123_456])
+
+        big = bytes([ord('d')]) + bytes(array('d', range(10_000_000)))
+        timed('VectorMD.from_bytes: memoryview(octets[1:])', lambda: memoryview(big[1:]).cast('d'))
+        timed('fixed:                memoryview(octets)[1:]', lambda: from_bytes(big))
@@ -0,0 +1,252 @@
+# "4 - Unicode Text Versus Bytes" recommends the Unicode sandwich: decode bytes on input, process str, encode on output.
+# The chapter does it with open().read() and one-shot .encode() - the whole file in memory, twice (bytes and str).
+# For a multi-GB log that doesn't fit, and it's also slow: nothing can start until the last byte is read
+
+# The streaming version reads fixed-size chunks and decodes them one by one. The catch: a chunk boundary can fall in the
+# middle of a character. 'é' in UTF-8 is b'\xc3\xa9' - if a chunk ends with b'\xc3', chunk.decode() raises
+# UnicodeDecodeError. An incremental decoder (codecs.getincrementaldecoder) solves it: it keeps the incomplete tail of
+# one chunk and prepends it to the next
+
+# The pipeline is a chain of generators, so memory stays O(chunk) whatever the file size:
+#   read_chunks -> decode_chunks (BOM sniffing + incremental decoder + ASCII fast path) -> split_lines -> your code
+#   your code -> encode_chunks (incremental encoder) -> write_chunks
+
+import codecs
+import functools
+import io
+import sys
+from collections.abc import Iterable, Iterator
+from itertools import chain, repeat
+
+CHUNK_SIZE = 1 << 16
+DEFAULT_ENCODING = 'utf-8'
+
+# Longest BOMs first: the UTF-32-LE BOM starts with the UTF-16-LE one
+BOMS = [
+    (codecs.BOM_UTF32_LE, 'utf-32-le'),
+    (codecs.BOM_UTF32_BE, 'utf-32-be'),
+    (codecs.BOM_UTF8, 'utf-8'),
+    (codecs.BOM_UTF16_LE, 'utf-16-le'),
+    (codecs.BOM_UTF16_BE, 'utf-16-be'),
+]
+
+# utf-8, latin-1 and ascii have hand-written C decoders that already skip over ASCII runs word by word. The single-byte
+# code pages (cp1252, iso8859-15, cp437...) are charmap codecs: one table lookup per byte, ~10x slower. For those, a
+# chunk that is pure ASCII is decoded by the ascii codec instead - the result is the same, and it's one fast C pass.
+# Only for those: in a stateful codec (iso2022_jp, utf-7, hz) ASCII bytes are escape sequences, or mean other characters
+# after one, so b'\x1b$BEl5~\x1b(B' is '東京' - not text to copy through
+ASCII = bytes(range(128))
+
+
+@functools.cache
+def has_ascii_fast_path(encoding: str) -> bool:
+    """A charmap codec - a 256-character table, one byte per character, no state - that maps ASCII to ASCII"""
+    decoder = codecs.lookup(encoding).incrementaldecoder
+    # The charmap codecs in the encodings package keep their table in the module, as decoding_table: the C-coded and the
+    # stateful codecs have none
+    table = getattr(sys.modules.get(decoder.__module__), 'decoding_table', None)
+    return isinstance(table, str) and len(table) == 256 and table[:128] == ASCII.decode('ascii')
+
+
+def sniff_bom(head: bytes) -> tuple[str | None, int]:
+    """(codec, BOM length) for the BOM at the start of head, or (None, 0)"""
+    for bom, codec in BOMS:
+        if head.startswith(bom):
+            return codec, len(bom)
+    return None, 0
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+# Stages
+
+
+def read_chunks(binary: io.RawIOBase, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    while chunk := binary.read(chunk_size):
+        yield chunk
+
+
+def decode_chunks(chunks: Iterable[bytes], encoding: str | None = None, errors: str = 'strict',
+                  ascii_fast_path: bool = True) -> Iterator[str]:
+    """
+    Decode a stream of byte chunks. With encoding=None the codec comes from the BOM (utf-8-sig, UTF-16 / UTF-32 LE or
+    BE), and is DEFAULT_ENCODING when there is none. The BOM is never part of the text
+    """
+    chunks = iter(chunks)
+    head = b''
+    if encoding is None or codecs.lookup(encoding).name == 'utf-8-sig':
+        for chunk in chunks:  # A BOM is at most 4 bytes - but a (silly) chunk size could be smaller than that
+            head += chunk
+            if len(head) >= 4:
+                break
+        sniffed, bom_length = sniff_bom(head)
+        encoding = sniffed or encoding or DEFAULT_ENCODING
+        if codecs.lookup(encoding).name == 'utf-8-sig':
+            encoding = 'utf-8'  # No BOM after all: utf-8-sig decodes the rest exactly like utf-8
+        head = head[bom_length:]
+
+    decoder = codecs.getincrementaldecoder(encoding)(errors)
+    decode = decoder.decode
+    ascii_fast_path = ascii_fast_path and has_ascii_fast_path(encoding)
+    pending = False  # Does the decoder hold the incomplete tail of the previous chunk?
+
+    for chunk in _prepend(head, chunks):
+        if ascii_fast_path and not pending and chunk.isascii():
+            yield chunk.decode('ascii')
+            continue
+        text = decode(chunk)
+        pending = bool(decoder.getstate()[0])
+        if text:
+            yield text
+    if tail := decode(b'', final=True):  # Raises UnicodeDecodeError if the stream ends in the middle of a character
+        yield tail
+
+
+def _prepend(head, chunks):
+    if head:
+        yield head
+    yield from chunks
+
+
+def split_lines(texts: Iterable[str], keepends: bool = False) -> Iterator[str]:
+    """Re-cut decoded chunks into lines - a line can span any number of chunks"""
+    # Universal newlines, like open() in text mode: \r\n and \r become \n. io.IncrementalNewlineDecoder is the piece of
+    # TextIOWrapper that does it, and it knows that a \r at the end of a chunk may be the first half of \r\n
+    newlines = io.IncrementalNewlineDecoder(None, translate=True)
+    end = '\n' if keepends else ''
+    partial = ''
+    # One more, final decode at the end: it flushes a held-back \r, which is a line end like any other
+    for text, final in chain(zip(texts, repeat(False)), [('', True)]):
+        lines = (partial + newlines.decode(text, final)).split('\n')
+        partial = lines.pop()
+        if keepends:
+            yield from (line + end for line in lines)
+        else:
+            yield from lines
+    if partial:
+        yield partial
+
+
+def encode_chunks(texts: Iterable[str], encoding: str = DEFAULT_ENCODING, errors: str = 'strict',
+                  chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """Encode a stream of str, and regroup the output into chunks of about chunk_size bytes"""
+    encode = codecs.getincrementalencoder(encoding)(errors).encode  # Writes the BOM once, for utf-16 / utf-8-sig
+    buffer, size = [], 0
+    for text in texts:
+        data = encode(text)
+        buffer.append(data)
+        size += len(data)
+        if size >= chunk_size:
+            yield b''.join(buffer)
+            buffer, size = [], 0
+    buffer.append(encode('', final=True))
+    if data := b''.join(buffer):
+        yield data
+
+
+def write_chunks(chunks: Iterable[bytes], binary: io.RawIOBase) -> int:
+    written = 0
+    for chunk in chunks:
+        written += binary.write(chunk)
+    return written
+
+
+def transcode(source: io.RawIOBase, target: io.RawIOBase, from_encoding: str | None = None,
+              to_encoding: str = DEFAULT_ENCODING, chunk_size: int = CHUNK_SIZE) -> int:
+    """The whole Unicode sandwich, streaming: bytes in one encoding -> str -> bytes in another"""
+    texts = decode_chunks(read_chunks(source, chunk_size), from_encoding)
+    return write_chunks(encode_chunks(texts, to_encoding, chunk_size=chunk_size), target)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+# Benchmark: throughput per codec
+
+
+def benchmark(megabytes=16):
+    import os
+    import tempfile
+    import time
+
+    lines = ['GET /index.html HTTP/1.1 200 5120', 'São Paulo, Montréal, Zürich - El Niño', '東京 - 北京 - 서울 - €100']
+    ascii_text = (lines[0] + '\n') * (megabytes * 2 ** 20 // (len(lines[0]) + 1))
+    mixed_text = '\n'.join(lines * (megabytes * 2 ** 20 // sum(len(line.encode()) + 1 for line in lines))) + '\n'
+    cases = [
+        # name, codec of the file, text, codec given to decode_chunks (None: sniff the BOM)
+        ('ascii', 'utf-8', ascii_text, None),
+        ('utf-8', 'utf-8', mixed_text, None),
+        ('utf-8-sig', 'utf-8-sig', mixed_text, None),
+        ('utf-16 (LE BOM)', 'utf-16', mixed_text, None),
+        ('utf-16-be + BOM', 'utf-16-be', '\ufeff' + mixed_text, None),
+        ('cp1252', 'cp1252', mixed_text.encode('cp1252', 'replace').decode('cp1252'), 'cp1252'),
+        ('ascii as cp1252', 'cp1252', ascii_text, 'cp1252'),
+    ]
+
+    def rate(size, fn):
+        t0 = time.perf_counter()
+        fn()
+        return size / 2 ** 20 / (time.perf_counter() - t0)
+
+    print(f'{"MB/s":<18}{"read()":>9}{"stream":>9}{"no fast path":>14}{"lines":>9}{"for line in open()":>20}')
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, encoding, text, decode_as in cases:
+            path = os.path.join(tmp, name)
+            with open(path, 'wb') as fp:
+                fp.write(text.encode(encoding))
+            size = os.path.getsize(path)
+            open_encoding = 'utf-16' if encoding.startswith('utf-16') else encoding  # The chapter's way: name it
+
+            def read_all():
+                with open(path, encoding=open_encoding) as fp:
+                    fp.read()
+
+            def stream(fast=True):
+                with open(path, 'rb') as fp:
+                    for _ in decode_chunks(read_chunks(fp), decode_as, ascii_fast_path=fast):
+                        pass
+
+            def stream_lines():
+                with open(path, 'rb') as fp:
+                    for _ in split_lines(decode_chunks(read_chunks(fp), decode_as)):
+                        pass
+
+            def text_lines():
+                with open(path, encoding=open_encoding) as fp:
+                    for _ in fp:
+                        pass
+
+            rates = [rate(size, fn) for fn in (read_all, stream, lambda: stream(False), stream_lines, text_lines)]
+            print(f'{name:<18}' + ''.join(f'{r:>{w}.0f}' for r, w in zip(rates, (9, 9, 14, 9, 20))))
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+if __name__ == '__main__':
+    text = 'Zoë, café, El Niño, 東京\r\nsecond line\rthird\n'
+    for encoding in ('utf-8', 'utf-8-sig', 'utf-16', 'utf-16-be', 'utf-32'):
+        data = text.encode(encoding)
+        if encoding == 'utf-16-be':
+            data = codecs.BOM_UTF16_BE + data
+        # 3-byte chunks: nearly every multibyte character is cut in two, and so is the \r\n
+        chunks = [data[i:i + 3] for i in range(0, len(data), 3)]
+        decoded = ''.join(decode_chunks(chunks))
+        print(f'{encoding:<10} {sniff_bom(data)[0]!s:<10} {decoded == text} {list(split_lines(decode_chunks(chunks)))}')
+
+    print(has_ascii_fast_path('cp1252'), has_ascii_fast_path('utf-8'), has_ascii_fast_path('utf-16'),
+          ''.join(decode_chunks([b'Montr', b'\xe9al', b' 100\x80'], 'cp1252')))  # ASCII chunk, then a charmap one
+
+    tokyo = '東京 tokyo'.encode('iso2022_jp')  # Pure ASCII bytes, but stateful: no fast path
+    assert not has_ascii_fast_path('iso2022_jp') and ''.join(decode_chunks([tokyo], 'iso2022_jp')) == '東京 tokyo'
+    assert not has_ascii_fast_path('utf-7') and not has_ascii_fast_path('hz') and has_ascii_fast_path('cp437')
+    assert list(split_lines(['a\r', '\nb\r'])) == ['a', 'b'] and list(split_lines(['a\r'], keepends=True)) == ['a\n']
+
+    try:
+        ''.join(decode_chunks([b'caf\xc3']))
+    except UnicodeDecodeError as error:
+        print('Truncated stream:', error)
+
+    source, target = io.BytesIO(text.encode('utf-16')), io.BytesIO()
+    transcode(source, target, to_encoding='utf-8', chunk_size=5)
+    print(target.getvalue())
+
+    benchmark()
@@ -0,0 +1,372 @@
+# "5 - Data Class Builders" classifies cities with match/case:
+#     match city:
+#         case City(continent=c, country='US' | 'CN', name=cc):
+# A match statement tries its cases top to bottom: with 50 cases, a city that matches none of them pays for 50 tests.
+# And the cases are code - they can't be loaded from a config file, counted, or reordered at runtime
+
+# RuleSet takes the same class / keyword patterns as data:
+#     Rule('us-cn', Pattern(City, continent=Capture('c'), country=OneOf('US', 'CN'), name=Capture('cc')))
+# and compiles them into a decision table:
+# * For each rule, the most selective attribute is picked: the literal constraint that the fewest records pass - from
+#   a sample of the data if compile() gets one, else the one with the fewest allowed values
+# * Those attributes are the index. A record's key is (type(record), value of each index attribute), with every value
+#   that no rule mentions folded into one OTHER value, so the table stays small: one entry per combination that
+#   the rules tell apart
+# * Each entry is the list of rules that can still match, in priority order, and only their remaining constraints are
+#   checked - by a function generated per rule, like the bytecode of one case
+# * First match wins, like match/case. evaluate(records) runs a whole batch and counts the hits per rule
+
+import collections
+import itertools
+
+_MISSING = object()  # The record has no such attribute
+OTHER = object()  # A value no rule's index constraint mentions
+
+Match = collections.namedtuple('Match', 'rule bindings')
+
+
+class OneOf:
+    """'US' | 'CN' in a case: the attribute equals one of the values"""
+
+    def __init__(self, *values):
+        self.values = frozenset(values)
+
+    def __repr__(self):
+        return f'OneOf({", ".join(map(repr, sorted(self.values, key=repr)))})'
+
+
+class Capture:
+    """A capture pattern: matches anything, and binds the value to a name"""
+
+    def __init__(self, name):
+        self.name = name
+
+    def __repr__(self):
+        return f'Capture({self.name!r})'
+
+
+class Guard:
+    """A test on the value, like a case's if clause: Guard(lambda population: population > 10_000_000)"""
+
+    def __init__(self, test, label=None):
+        self.test = test
+        self.label = label or getattr(test, '__name__', 'guard')
+
+    def __repr__(self):
+        return f'Guard({self.label})'
+
+
+class Pattern:
+    """A class pattern. Positional values go through __match_args__, as in a case: Pattern(City, 'Asia')"""
+
+    def __init__(self, cls, *args, **kwargs):
+        self.cls = cls
+        match_args = getattr(cls, '__match_args__', ())
+        if len(args) > len(match_args):
+            raise TypeError(f'{cls.__name__}() accepts {len(match_args)} positional sub-patterns ({len(args)} given)')
+        self.constraints = dict(zip(match_args, args))
+        for name, value in kwargs.items():
+            if name in self.constraints:
+                raise TypeError(f'{cls.__name__}() got multiple sub-patterns for attribute {name!r}')
+            self.constraints[name] = value
+
+    def __repr__(self):
+        return f'{self.cls.__name__}({", ".join(f"{k}={v!r}" for k, v in self.constraints.items())})'
+
+    def literals(self):
+        """{attribute: allowed values} for the top-level constraints that can go in an index"""
+        result = {}
+        for name, value in self.constraints.items():
+            if isinstance(value, OneOf):
+                result[name] = value.values
+            elif not isinstance(value, (Capture, Guard, Pattern)):
+                result[name] = frozenset([value])
+        return result
+
+
+Rule = collections.namedtuple('Rule', 'name pattern')
+
+
+def _passing(sample, cls, name, values):
+    """How many records of the sample pass one constraint: the fewer, the more selective"""
+    return sum(1 for record in sample if isinstance(record, cls) and getattr(record, name, _MISSING) in values)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+# Code generation: a pattern -> the source of a test
+
+
+class _Source:
+    def __init__(self):
+        self.namespace = {'_MISSING': _MISSING}
+        self._counter = itertools.count()
+
+    def constant(self, value, prefix='_c'):
+        name = f'{prefix}{next(self._counter)}'
+        self.namespace[name] = value
+        return name
+
+    def test(self, pattern, expr, skip=()):
+        """Conditions (a list of expressions) for `expr` to match `pattern`. The attributes in skip are already known"""
+        conditions = [f'isinstance({expr}, {self.constant(pattern.cls, "_cls")})']
+        for name, value in pattern.constraints.items():
+            if name in skip or isinstance(value, Capture):
+                continue
+            attribute = f'getattr({expr}, {name!r}, _MISSING)'
+            if isinstance(value, OneOf):
+                conditions.append(f'{attribute} in {self.constant(value.values, "_one_of")}')
+            elif isinstance(value, Guard):
+                conditions.append(f'{attribute} is not _MISSING and {self.constant(value.test, "_guard")}({attribute})')
+            elif isinstance(value, Pattern):
+                variable = f'v{next(self._counter)}'
+                conditions.append(f'({variable} := {attribute}) is not _MISSING')
+                conditions.extend(self.test(value, variable))
+            else:
+                conditions.append(f'{attribute} == {self.constant(value)}')
+        return conditions
+
+    def bindings(self, pattern, expr):
+        """(name, expression) for every Capture, nested ones included"""
+        result = []
+        for name, value in pattern.constraints.items():
+            attribute = f'getattr({expr}, {name!r})'
+            if isinstance(value, Capture):
+                result.append((value.name, attribute))
+            elif isinstance(value, Pattern):
+                result.extend(self.bindings(value, attribute))
+        return result
+
+
+def _compile_rule(pattern, skip):
+    source = _Source()
+    conditions = source.test(pattern, 'r', skip)
+    bindings = source.bindings(pattern, 'r')
+    captures = ', '.join(f'{name!r}: {expr}' for name, expr in bindings)
+    exec(f'def test(r):\n    return {" and ".join(conditions) or "True"}\n\n'
+         f'def bind(r):\n    return {{{captures}}}\n', source.namespace)
+    return source.namespace['test'], source.namespace['bind']
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+class RuleSet:
+    """Ordered rules, compiled into a decision table. First match wins"""
+
+    def __init__(self, rules=()):
+        self.rules = list(rules)
+        self.hits = collections.Counter()
+        self._table = None
+
+    def add(self, name, pattern):
+        self.rules.append(Rule(name, pattern))
+        self._table = None
+
+    def compile(self, sample=None):
+        """Pick each rule's index attribute, using the sample (a list of records) to measure selectivity"""
+        index = {}  # attribute -> the values some rule's index constraint allows
+        self._chosen = []
+        for rule in self.rules:
+            literals = rule.pattern.literals()
+            if not literals:
+                self._chosen.append(None)  # Nothing to index: a candidate for every record of its class
+                continue
+            if sample:
+                cls = rule.pattern.cls
+                name = min(literals, key=lambda name: _passing(sample, cls, name, literals[name]))
+            else:
+                name = min(literals, key=lambda name: len(literals[name]))
+            self._chosen.append(name)
+            index.setdefault(name, set()).update(literals[name])
+        self.index_attributes = tuple(index)
+        self._index_values = [frozenset(index[name]) for name in self.index_attributes]
+        # Each rule's test skips its index constraint: the table lookup has already checked it
+        self._compiled = [_compile_rule(rule.pattern, (chosen,) if chosen else ())
+                          for rule, chosen in zip(self.rules, self._chosen)]
+        self._table = {}
+        return self
+
+    def _key(self, record):
+        key = [type(record)]
+        for name, values in zip(self.index_attributes, self._index_values):
+            value = getattr(record, name, _MISSING)
+            try:
+                key.append(value if value in values else OTHER)
+            except TypeError:  # Unhashable: no index constraint can be equal to it... as far as the table knows
+                key.append(OTHER)
+        return tuple(key)
+
+    def _candidates(self, key):
+        """The rules that can match records with this key, in order: a table entry, built on first use"""
+        cls, values = key[0], dict(zip(self.index_attributes, key[1:]))
+        candidates = []
+        for i, (rule, chosen) in enumerate(zip(self.rules, self._chosen)):
+            if not issubclass(cls, rule.pattern.cls):
+                continue
+            if chosen is not None and values[chosen] not in rule.pattern.literals()[chosen]:
+                continue
+            candidates.append((rule.name, self._compiled[i][0], i))
+        self._table[key] = candidates
+        return candidates
+
+    def match(self, record):
+        """Match(rule name, captured values) for the first matching rule, or None"""
+        if self._table is None:
+            self.compile()
+        key = self._key(record)
+        candidates = self._table.get(key)
+        if candidates is None:  # Not `or`: a key no rule can match is cached as [], and must stay cached
+            candidates = self._candidates(key)
+        for name, test, i in candidates:
+            if test(record):
+                self.hits[name] += 1
+                return Match(name, self._compiled[i][1](record))
+        self.hits[None] += 1
+        return None
+
+    def evaluate(self, records):
+        """The name of the first matching rule (or None) for each record, in one pass. Counts the hits"""
+        if self._table is None:
+            self.compile()
+        table, key_of, find = self._table, self._key, self._candidates
+        results = []
+        append = results.append
+        for record in records:
+            key = key_of(record)
+            candidates = table.get(key)
+            if candidates is None:
+                candidates = find(key)
+            for name, test, _ in candidates:
+                if test(record):
+                    append(name)
+                    break
+            else:
+                append(None)
+        self.hits.update(results)
+        return results
+
+    def report(self):
+        width = max((len(str(rule.name)) for rule in self.rules), default=4)
+        lines = [f'{str(rule.name):<{width}} {self.hits[rule.name]:>10,}' for rule in self.rules]
+        lines.append(f'{"(none)":<{width}} {self.hits[None]:>10,}')
+        return '\n'.join(lines)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+# Benchmark
+
+
+def _match_statement(rules):
+    """The same rules as one generated match statement, the chapter's way - for the benchmark"""
+    namespace = {}
+    cases = []
+    for rule in rules:
+        namespace[rule.pattern.cls.__name__] = rule.pattern.cls
+        parts, guards = [], []
+        for name, value in rule.pattern.constraints.items():
+            if isinstance(value, OneOf):
+                parts.append(f'{name}={" | ".join(map(repr, sorted(value.values)))}')
+            elif isinstance(value, Guard):
+                k = len(namespace)
+                namespace[f'_guard{k}'] = value.test
+                parts.append(f'{name}=_g{k}')
+                guards.append(f'_guard{k}(_g{k})')
+            elif not isinstance(value, (Capture, Pattern)):
+                parts.append(f'{name}={value!r}')
+        guard = f' if {" and ".join(guards)}' if guards else ''
+        cases.append(f'        case {rule.pattern.cls.__name__}({", ".join(parts)}){guard}:\n'
+                     f'            return {rule.name!r}')
+    exec('def classify(city):\n    match city:\n' + '\n'.join(cases) + '\n    return None', namespace)
+    return namespace['classify']
+
+
+def benchmark(n=1_000_000):
+    import random
+    import time
+    import typing
+
+    class City(typing.NamedTuple):
+        continent: str
+        name: str
+        country: str
+        population: int = 0
+
+    rng = random.Random(0)
+    countries = {'Asia': ['JP', 'CN', 'IN', 'KR', 'ID', 'VN', 'TH'], 'Europe': ['FR', 'DE', 'IT', 'ES', 'PL', 'NL'],
+                 'North America': ['US', 'CA', 'MX'], 'Africa': ['KE', 'NG', 'EG', 'ZA'],
+                 'South America': ['BR', 'AR', 'CO', 'PE']}
+    cities = [City(continent, f'city {i}', rng.choice(countries[continent]), int(rng.paretovariate(1.2) * 10_000))
+              for i in range(n) for continent in [rng.choice(list(countries))]]
+    rules = []
+    for continent, codes in countries.items():  # 5 continents x 5 rules, and a catch-all: 26 rules
+        for code in codes[:2]:
+            rules.append(Rule(f'{code}-megacity', Pattern(City, country=code, population=Guard(lambda p: p > 1e6))))
+            rules.append(Rule(f'{code}-city', Pattern(City, continent=continent, country=code, name=Capture('name'))))
+        rules.append(Rule(f'{continent}-other', Pattern(City, continent=continent, country=OneOf(*codes[2:]))))
+    rules.append(Rule('other', Pattern(City, continent=OneOf('Antarctica'))))
+
+    classify = _match_statement(rules)
+    t0 = time.perf_counter()
+    expected = [classify(city) for city in cities]
+    print(f'{n:,} cities, {len(rules)} rules')
+    print(f'generated match statement     {n / (time.perf_counter() - t0) / 1e6:6.2f} M records/s')
+
+    def linear(city, tests=[(rule.name, _compile_rule(rule.pattern, ())[0]) for rule in rules]):
+        for name, test in tests:
+            if test(city):
+                return name
+        return None
+
+    t0 = time.perf_counter()
+    assert [linear(city) for city in cities] == expected
+    print(f'compiled tests, linear scan   {n / (time.perf_counter() - t0) / 1e6:6.2f} M records/s')
+
+    for sample in (None, cities[:1000]):
+        ruleset = RuleSet(rules).compile(sample)
+        t0 = time.perf_counter()
+        assert ruleset.evaluate(cities) == expected
+        label = 'RuleSet, sampled' if sample else 'RuleSet, by value count'
+        print(f'{label:<30}{n / (time.perf_counter() - t0) / 1e6:6.2f} M records/s  '
+              f'(index: {", ".join(ruleset.index_attributes)}; {len(ruleset._table)} table entries)')
+    print(ruleset.report())
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+if __name__ == '__main__':
+    import typing
+
+    class City(typing.NamedTuple):
+        continent: str
+        name: str
+        country: str
+
+    class Coordinate(typing.NamedTuple):
+        lat: float
+        lon: float
+
+    class Capital(typing.NamedTuple):
+        city: City
+        where: Coordinate
+
+    cities = [
+        City('Asia', 'Tokyo', 'JP'),
+        City('Asia', 'Beijing', 'CN'),
+        City('North America', 'Washington DC', 'US'),
+        City('Africa', 'Kiberas', 'KN'),
+        Capital(City('Europe', 'Paris', 'FR'), Coordinate(48.85, 2.35)),
+    ]
+    rules = RuleSet([
+        Rule('us-cn', Pattern(City, continent=Capture('c'), country=OneOf('US', 'CN'), name=Capture('cc'))),
+        Rule('asia', Pattern(City, 'Asia', Capture('name'))),
+        Rule('northern capital', Pattern(Capital, where=Pattern(Coordinate, lat=Guard(lambda lat: lat > 45)),
+                                         city=Pattern(City, name=Capture('name')))),
+    ]).compile()
+    for city in cities:
+        print(rules.match(city), '<-', city)
+    print(rules.evaluate(cities))
+    print(rules.report())
+
+    benchmark()
@@ -0,0 +1,283 @@
+# "5 - Data Class Builders" compares namedtuple, typing.NamedTuple and @dataclass. For a million instances, two things
+# matter that the chapter's table leaves out: how much memory each instance takes, and how fast they can be built
+# * A @dataclass instance keeps its fields in a __dict__ (compact in 3.11, but still a separate object that grows)
+# * A namedtuple is a tuple: small, but its __new__ is generated Python code that calls tuple.__new__ - and field
+#   access goes through a property-like descriptor (_tuplegetter)
+# * __slots__ stores the fields in fixed slots inside the instance: no __dict__ at all, and attribute access is a
+#   member descriptor, as fast as it gets
+
+# @record builds a __slots__ class from the annotations, the way @dataclass does it - by generating source code and
+# exec-ing it once per class, so that every __init__ is specialized: no loop over the fields, no **kwargs
+#     @record
+#     class Coordinate:
+#         lat: float
+#         lon: float
+# * Defaults and dataclasses.field(default_factory=list) work as in @dataclass, and so does __post_init__
+# * __repr__, __eq__, __match_args__ (for chapter 5's match/case), _fields, _astuple(), _asdict()
+# * Bulk constructors for lists of rows: Coordinate.from_tuple(rows), Coordinate.from_dict(dicts). They are generated
+#   loops too: one frame for the whole list instead of one __init__ call per row
+# make_record('Coordinate', ['lat', 'lon']) is the function form, like namedtuple() and make_dataclass()
+
+import dataclasses
+import keyword
+import sys
+
+_MISSING = dataclasses.MISSING
+
+
+def _field_specs(cls):
+    """[(name, default, default_factory)] from the annotations of cls and the record classes it inherits from"""
+    specs = {}
+    for base in reversed(cls.__mro__[1:]):
+        for spec in base.__dict__.get('__record_fields__', ()):
+            specs[spec[0]] = spec
+    for name in cls.__dict__.get('__annotations__', {}):
+        default = cls.__dict__.get(name, _MISSING)
+        if isinstance(default, dataclasses.Field):
+            specs[name] = name, default.default, default.default_factory
+        else:
+            if isinstance(default, (list, dict, set)):
+                raise ValueError(f'mutable default {type(default)} for field {name} is not allowed: '
+                                 f'use default_factory')
+            specs[name] = name, default, _MISSING
+    return list(specs.values())
+
+
+def _check(specs, class_name):
+    seen_default = False
+    for name, default, factory in specs:
+        if not name.isidentifier() or keyword.iskeyword(name) or name.startswith('_'):
+            raise ValueError(f'invalid field name for {class_name}: {name!r}')
+        if default is _MISSING and factory is _MISSING:
+            if seen_default:
+                raise TypeError(f'non-default argument {name!r} follows default argument')
+        else:
+            seen_default = True
+
+
+def _indent(lines, depth):
+    return '\n'.join(' ' * 4 * depth + line for line in lines)
+
+
+def _make_functions(cls, specs):
+    """The generated source of __init__, __repr__, __eq__, from_tuple and from_dict, exec-ed in one namespace"""
+    names = [name for name, _, _ in specs]
+    namespace = {'_MISSING': _MISSING, '_new': object.__new__}
+    params, assigns, from_dict = [], [], []
+    for name, default, factory in specs:
+        if factory is not _MISSING:
+            namespace[f'_factory_{name}'] = factory
+            params.append(f'{name}=_MISSING')
+            assigns.append(f'self.{name} = _factory_{name}() if {name} is _MISSING else {name}')
+            from_dict.append(f'self.{name} = row[{name!r}] if {name!r} in row else _factory_{name}()')
+        elif default is not _MISSING:
+            namespace[f'_default_{name}'] = default
+            params.append(f'{name}=_default_{name}')
+            assigns.append(f'self.{name} = {name}')
+            from_dict.append(f'self.{name} = row.get({name!r}, _default_{name})')
+        else:
+            params.append(name)
+            assigns.append(f'self.{name} = {name}')
+            from_dict.append(f'self.{name} = row[{name!r}]')
+    post_init = ['self.__post_init__()'] if hasattr(cls, '__post_init__') else []
+    unpack = f'{", ".join(names)}{"," if len(names) == 1 else ""} = row' if names else 'pass'
+    values = ', '.join(f'self.{name}' for name in names)
+    others = ', '.join(f'other.{name}' for name in names)
+    body = _indent(assigns + post_init or ['pass'], 1)
+    row_body = _indent(['self = _new(cls)', *assigns, *post_init, 'append(self)'], 3)
+    dict_body = _indent(['self = _new(cls)', *from_dict, *post_init, 'append(self)'], 3)
+    repr_fields = ', '.join(f'{name}={{self.{name}!r}}' for name in names)
+    source = f'''
+def __init__(self, {', '.join(params)}):
+{body}
+
+def __repr__(self):
+    return f'{{self.__class__.__qualname__}}({repr_fields})'
+
+def __eq__(self, other):
+    if other.__class__ is self.__class__:
+        return ({values},) == ({others},)
+    return NotImplemented
+
+def _astuple(self):
+    return ({values},)
+
+def _asdict(self):
+    return {{{', '.join(f'{name!r}: self.{name}' for name in names)}}}
+
+def from_tuple(cls, rows):
+    """Build one instance per row: a list of tuples of the fields, in order"""
+    result = []
+    append = result.append
+    for row in rows:
+        if len(row) == {len(names)}:
+            {unpack}
+{row_body}
+        else:
+            append(cls(*row))  # A short row: let __init__ fill in the defaults, or complain
+    return result
+
+def from_dict(cls, rows):
+    """Build one instance per row: a list of dicts with the field names as keys. Other keys are ignored"""
+    result = []
+    append = result.append
+    for row in rows:
+{dict_body}
+    return result
+'''
+    exec(source, namespace)
+    return namespace
+
+
+def _build(cls_name, bases, namespace, specs):
+    _check(specs, cls_name)
+    inherited = {spec[0] for base in bases for spec in getattr(base, '__record_fields__', ())}
+    namespace['__slots__'] = tuple(name for name, _, _ in specs if name not in inherited)
+    namespace['__record_fields__'] = tuple(specs)
+    namespace['__match_args__'] = namespace['_fields'] = tuple(name for name, _, _ in specs)
+    for name, _, _ in specs:  # The defaults live in __init__'s signature: a class attribute would clash with the slot
+        namespace.pop(name, None)
+    namespace.pop('__dict__', None)
+    namespace.pop('__weakref__', None)
+    cls = type(cls_name, bases, namespace)
+    functions = _make_functions(cls, specs)
+    for name in ('__init__', '__repr__', '__eq__', '_astuple', '_asdict'):
+        functions[name].__qualname__ = f'{cls.__qualname__}.{name}'
+        setattr(cls, name, functions[name])
+    cls.__hash__ = None  # Mutable and compared by value, like a @dataclass: unhashable
+    cls.from_tuple = classmethod(functions['from_tuple'])
+    cls.from_dict = classmethod(functions['from_dict'])
+    return cls
+
+
+def record(cls):
+    """Class decorator: a __slots__ class from the annotations, like @dataclass"""
+    namespace = {key: value for key, value in cls.__dict__.items()}
+    return _build(cls.__name__, cls.__bases__, namespace, _field_specs(cls))
+
+
+def make_record(cls_name, fields, *, defaults=(), module=None):
+    """make_record('Coordinate', ['lat', 'lon'], defaults=[0.0]): the defaults apply to the rightmost fields"""
+    if isinstance(fields, str):
+        fields = fields.replace(',', ' ').split()
+    defaults = list(defaults)
+    specs = [(name, _MISSING, _MISSING) for name in fields[:len(fields) - len(defaults)]]
+    specs += [(name, default, _MISSING) for name, default in zip(fields[len(fields) - len(defaults):], defaults)]
+    if module is None:  # Like namedtuple: the caller's module, so that pickle can find the class
+        module = sys._getframe(1).f_globals.get('__name__', '__main__')
+    return _build(cls_name, (), {'__module__': module, '__qualname__': cls_name}, specs)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+# Benchmark: 1M instances of the chapter's classes, built by each class builder
+
+
+def benchmark(n=1_000_000):
+    import gc
+    import time
+    import tracemalloc
+    import typing
+    from collections import namedtuple
+    from datetime import date
+    from enum import Enum, auto
+    from itertools import starmap
+
+    class ResourceType(Enum):
+        BOOK = auto()
+        EBOOK = auto()
+        VIDEO = auto()
+
+    fields = {
+        'Coordinate': [('lat', float), ('lon', float)],
+        'ClubMember': [('name', str), ('guests', list), ('athlete', bool)],
+        'Resource': [('identifier', str), ('title', str), ('creators', list), ('date', date), ('type', ResourceType),
+                     ('description', str), ('language', str), ('subjects', list)],
+    }
+    creators, subjects = ['Stanislav Chentsov'], ['war']
+    rows = {
+        'Coordinate': [(i / n * 90, -i / n * 180) for i in range(n)],
+        'ClubMember': [(f'member {i}', [], i % 2 == 0) for i in range(n)],
+        'Resource': [(f'id-{i}', 'The nature of War', creators, date(2029, 4, 18), ResourceType.BOOK, '', 'EN',
+                      subjects) for i in range(n)],
+    }
+
+    def builders(name):
+        names = [field_name for field_name, _ in fields[name]]
+        yield 'namedtuple', namedtuple(name, names)
+        yield 'typing.NamedTuple', typing.NamedTuple(name, fields[name])
+        yield '@dataclass', dataclasses.make_dataclass(name, fields[name])
+        yield '@dataclass(slots=True)', dataclasses.make_dataclass(name, fields[name], slots=True)
+        yield '@record', make_record(name, names)
+
+    def build(cls, name, bulk):
+        if bulk:
+            return cls.from_tuple(rows[name])
+        return list(starmap(cls, rows[name]))
+
+    print(f'{n:,} instances{"bytes each":>32}{"M/s cls(*row)":>16}{"M/s from_tuple":>16}')
+    for name in fields:
+        for label, cls in builders(name):
+            gc.collect()
+            tracemalloc.start()
+            before = tracemalloc.get_traced_memory()[0]
+            instances = build(cls, name, False)
+            size = (tracemalloc.get_traced_memory()[0] - before) / n - 8  # Minus the list's pointer
+            tracemalloc.stop()
+            del instances
+            rates = []
+            for bulk in (False, True) if hasattr(cls, 'from_tuple') else (False,):
+                gc.collect()
+                t0 = time.perf_counter()
+                instances = build(cls, name, bulk)
+                rates.append(f'{n / (time.perf_counter() - t0) / 1e6:>16.2f}')
+                del instances
+            print(f'{name:<12}{label:<24}{size:>11.0f}{"".join(rates)}')
+    # 3.11's specialized bytecode makes every generated __init__ fast, so the construction rates end up close: the gain
+    # of __slots__ is the memory - no __dict__ per instance, and 8 bytes less than the tuple's length field + GC link
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+if __name__ == '__main__':
+    from dataclasses import field
+    from datetime import date
+
+    @record
+    class Coordinate:
+        lat: float
+        lon: float
+
+        def __str__(self):
+            ns = 'N' if self.lat >= 0 else 'S'
+            nt = 'E' if self.lon >= 0 else 'W'
+            return f'{abs(self.lat):.1f}° {ns}, {abs(self.lon):.1f}° {nt}'
+
+    moscow = Coordinate(55.76, 37.62)
+    print(moscow, repr(moscow), moscow == Coordinate(55.76, 37.62), Coordinate.__slots__, hasattr(moscow, '__dict__'))
+
+    @record
+    class ClubMember:
+        name: str
+        guests: list[str] = field(default_factory=list)
+        athlete: bool = False
+
+    @record
+    class HackerClubMember(ClubMember):
+        handle: str = ''
+
+        def __post_init__(self):
+            self.handle = self.handle or self.name.split()[0]
+
+    members = ClubMember.from_dict([{'name': 'Alice'}, {'name': 'Bob', 'guests': ['Carol'], 'athlete': True}])
+    print(members, members[0].guests is not ClubMember('x').guests)
+    print(HackerClubMember.from_tuple([('Ada Lovelace',), ('Bob', [], False, 'bobby')]), HackerClubMember._fields)
+
+    match moscow:
+        case Coordinate(lat, lon) if lat > 50:
+            print('North', lat, lon)
+
+    Resource = make_record('Resource', 'identifier title creators date', defaults=['<untitled>', (), None])
+    print(Resource('Bestseller', date=date(2029, 4, 18))._asdict())
+
+    benchmark()
@@ -0,0 +1,281 @@
+# "5 - Data Class Builders" turns records into JSON with json.dumps(delhi._asdict()), and the table lists
+# dataclasses.asdict(x) for data classes. Both are fine for one record, and both have problems with a million:
+# * dataclasses.asdict recurses through every value and deep-copies it - copy.deepcopy for anything it doesn't know,
+#   lists and dicts rebuilt element by element - and asks dataclasses.fields() again for every instance
+# * neither knows Enum or date: json.dumps(asdict(resource)) raises TypeError: Object of type ResourceType is not JSON
+#   serializable, so the usual fix is a default= hook that json calls back, one Python call per unknown value
+
+# compile_encoder(cls) reads the field metadata ONCE - dataclasses.fields or _fields, plus typing.get_type_hints - and
+# generates the encoding functions for that class:
+#     def to_dict(o):
+#         return {'identifier': o.identifier, 'creators': o.creators,
+#                 'date': None if (v0 := o.date) is None else v0.isoformat(), 'type': o.type.name, ...}
+# * Enum -> its name, date / datetime -> ISO 8601, nested records -> their own compiled encoder
+# * A value that needs no conversion is not touched: o.creators (a list[str]) goes out as the same list, no copy.
+#   Change the dict and you change the record - the price of not copying
+# * Fields without useful hints (collections.namedtuple has none) go through encode_value(), which decides at runtime
+# Three outputs: to_dict(obj), to_tuple(obj), to_json(obj), and write_jsonl(records, stream) for millions of them
+
+import dataclasses
+import datetime as dt
+import enum
+import functools
+import itertools
+import json
+import types
+import typing
+from collections import namedtuple
+from datetime import date, datetime, time
+
+BATCH_SIZE = 10_000
+
+Encoder = namedtuple('Encoder', 'fields to_dict to_tuple')
+
+PLAIN = (str, int, float, bool, type(None))
+_compiling = set()
+
+
+def is_record(cls):
+    return isinstance(cls, type) and (dataclasses.is_dataclass(cls) or hasattr(cls, '_fields'))
+
+
+def record_fields(cls):
+    if dataclasses.is_dataclass(cls):
+        return [field.name for field in dataclasses.fields(cls)]  # Without the InitVar and ClassVar pseudo-fields
+    return list(cls._fields)
+
+
+def encode_value(value, as_tuple=False):
+    """The runtime fallback, for values the type hints say nothing about"""
+    if isinstance(value, PLAIN):
+        return value
+    if isinstance(value, enum.Enum):
+        return value.name
+    if isinstance(value, (date, time)):  # datetime is a date
+        return value.isoformat()
+    cls = type(value)
+    if is_record(cls):
+        encoder = compile_encoder(cls)
+        return encoder.to_tuple(value) if as_tuple else encoder.to_dict(value)
+    if isinstance(value, dict):
+        return {key: encode_value(item, as_tuple) for key, item in value.items()}
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return [encode_value(item, as_tuple) for item in value]
+    return value
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+# Code generation: type hint -> Python expression
+
+
+class _Source:
+    """The namespace of one generated module, and fresh names for the walrus / loop variables"""
+
+    def __init__(self, as_tuple):
+        self.as_tuple = as_tuple
+        self.namespace = {'_encode_value': encode_value}
+        self._counter = itertools.count()
+
+    def name(self, prefix):
+        return f'{prefix}{next(self._counter)}'
+
+    def constant(self, value):
+        name = self.name('_c')
+        self.namespace[name] = value
+        return name
+
+    def convert(self, hint, expr):
+        """An expression that encodes `expr`, a value of type `hint`. Returns expr itself if there's nothing to do"""
+        origin, args = typing.get_origin(hint), typing.get_args(hint)
+        if hint in PLAIN:
+            return expr
+        if origin in (typing.Union, types.UnionType):
+            others = [arg for arg in args if arg is not type(None)]
+            if len(others) == 1:  # Optional[X]
+                var = self.name('v')
+                inner = self.convert(others[0], var)
+                return expr if inner == var else f'(None if ({var} := {expr}) is None else {inner})'
+            return f'_encode_value({expr}, {self.as_tuple})'
+        if isinstance(hint, type):
+            if issubclass(hint, enum.Enum):
+                return f'{expr}.name'
+            if issubclass(hint, (date, time)):
+                return f'{expr}.isoformat()'
+            if is_record(hint):
+                return f'{self.constant(_nested_encoder(hint, self.as_tuple))}({expr})'
+        if origin in (list, set, frozenset) or (origin is tuple and len(args) == 2 and args[1] is Ellipsis):
+            var = self.name('x')
+            inner = self.convert(args[0], var) if args else var
+            if inner == var and origin is list:
+                return expr  # Same list, not copied
+            return f'[{inner} for {var} in {expr}]'  # JSON has no sets: they become lists
+        if origin is tuple and args:  # tuple[float, float]: the coordinates in the chapter's City
+            if all(self.convert(arg, 'x') == 'x' for arg in args):
+                return expr
+        if origin is dict and len(args) == 2:
+            key, var = self.name('k'), self.name('x')
+            inner = self.convert(args[1], var)
+            return expr if inner == var else f'{{{key}: {inner} for {key}, {var} in {expr}.items()}}'
+        return f'_encode_value({expr}, {self.as_tuple})'  # Any, no hint, or a type we don't know
+
+
+def _nested_encoder(cls, as_tuple):
+    if cls in _compiling:  # A recursive type (a Node with children: list[Node]): look the encoder up when it's called
+        return lambda value: encode_value(value, as_tuple)
+    encoder = compile_encoder(cls)
+    return encoder.to_tuple if as_tuple else encoder.to_dict
+
+
+@functools.cache
+def compile_encoder(cls) -> Encoder:
+    """Generate to_dict and to_tuple for a dataclass or a named tuple class - once per class"""
+    if not is_record(cls):
+        raise TypeError(f'{cls.__name__} is not a dataclass or a named tuple')
+    fields = record_fields(cls)
+    try:
+        hints = typing.get_type_hints(cls)
+    except (NameError, TypeError):  # A forward reference that doesn't resolve: no hints, all decided at runtime
+        hints = {}
+    _compiling.add(cls)
+    try:
+        functions = {}
+        for as_tuple in (False, True):
+            source = _Source(as_tuple)
+            values = [source.convert(hints.get(name, typing.Any), f'o.{name}') for name in fields]
+            if as_tuple:
+                body = f'({"".join(value + ", " for value in values)})'
+            else:
+                body = '{' + ', '.join(f'{name!r}: {value}' for name, value in zip(fields, values)) + '}'
+            exec(f'def encode(o):\n    return {body}', source.namespace)
+            functions[as_tuple] = source.namespace['encode']
+    finally:
+        _compiling.discard(cls)
+    return Encoder(tuple(fields), functions[False], functions[True])
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+# The API
+
+
+def to_dict(record):
+    return compile_encoder(type(record)).to_dict(record)
+
+
+def to_tuple(record):
+    return compile_encoder(type(record)).to_tuple(record)
+
+
+def to_json(record, **kwargs):
+    return json.dumps(compile_encoder(type(record)).to_dict(record), **kwargs)
+
+
+def write_jsonl(records, stream, batch_size=BATCH_SIZE, ensure_ascii=False):
+    """One JSON object per line, written a batch at a time. Returns the number of records"""
+    encode = json.JSONEncoder(ensure_ascii=ensure_ascii).encode
+    records = iter(records)
+    count = 0
+    encoders = {}  # type -> to_dict, without going through functools.cache for every record
+    while batch := list(itertools.islice(records, batch_size)):
+        cls = type(batch[0])
+        encode_record = encoders.get(cls) or encoders.setdefault(cls, compile_encoder(cls).to_dict)
+        if all(type(record) is cls for record in batch):
+            dicts = map(encode_record, batch)
+        else:
+            dicts = map(to_dict, batch)
+        stream.write('\n'.join(map(encode, dicts)) + '\n')
+        count += len(batch)
+    return count
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+# The chapter's classes
+
+
+class ResourceType(enum.Enum):
+    BOOK = enum.auto()
+    EBOOK = enum.auto()
+    VIDEO = enum.auto()
+
+
+@dataclasses.dataclass
+class Resource:
+    identifier: str
+    title: str = '<untitled>'
+    creators: list[str] = dataclasses.field(default_factory=list)
+    # Not Optional[date], as in the chapter: the annotation is evaluated after `date = None` runs in the class body, so
+    # there it means Optional[None] - get_type_hints(Resource)['date'] is NoneType
+    date: typing.Optional[dt.date] = None
+    type: ResourceType = ResourceType.BOOK
+    description: str = ''
+    language: str = ''
+    subjects: list[str] = dataclasses.field(default_factory=list)
+
+
+Coordinate = namedtuple('Coordinate', ['latitude', 'longitude'])
+City = typing.NamedTuple('City', [('name', str), ('country', str), ('population', int),
+                                  ('coordinates', tuple[float, float])])
+
+
+def benchmark(n=1_000_000):
+    import io
+    import timeit
+
+    resources = [Resource(f'id-{i}', 'The nature of War', ['Stanislav Chentsov'], date(2029, 4, 18),
+                          ResourceType.EBOOK, language='EN', subjects=['war', 'strategy']) for i in range(n)]
+
+    def default(value):  # The usual json.dumps hook for what JSON doesn't know
+        if isinstance(value, enum.Enum):
+            return value.name
+        if isinstance(value, date):
+            return value.isoformat()
+        raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+    def rate(fn):
+        return n / min(timeit.repeat(fn, number=1, repeat=2)) / 1e6
+
+    print(f'{n:,} Resource records, M records/s')
+    print(f'  dataclasses.asdict          {rate(lambda: list(map(dataclasses.asdict, resources))):6.2f}')
+    print(f'  compiled to_dict            {rate(lambda: list(map(compile_encoder(Resource).to_dict, resources))):6.2f}')
+    print(f'  dataclasses.astuple         {rate(lambda: list(map(dataclasses.astuple, resources))):6.2f}')
+    print(f'  compiled to_tuple           '
+          f'{rate(lambda: list(map(compile_encoder(Resource).to_tuple, resources))):6.2f}')
+    print(f'  json.dumps(asdict, default) '
+          f'{rate(lambda: [json.dumps(dataclasses.asdict(r), default=default) for r in resources]):6.2f}')
+    print(f'  write_jsonl                 {rate(lambda: write_jsonl(resources, io.StringIO())):6.2f}')
+
+    cities = [City(f'city {i}', 'JP', i, Coordinate(35.68, 139.69)) for i in range(n)]
+    print(f'{n:,} City named tuples')
+    print(f'  _asdict()                   {rate(lambda: [city._asdict() for city in cities]):6.2f}')
+    print(f'  compiled to_dict            {rate(lambda: list(map(compile_encoder(City).to_dict, cities))):6.2f}')
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+if __name__ == '__main__':
+    import sys
+
+    bestseller = Resource('Bestseller', 'The nature of War', ['Stanislav Chentsov'], date(2029, 4, 18),
+                          ResourceType.EBOOK, language='EN')
+    print(to_dict(bestseller))
+    print(to_tuple(bestseller))
+    print(to_json(bestseller))
+    print(to_dict(bestseller)['creators'] is bestseller.creators)  # Not copied
+
+    delhi = City._make(('Delhi NCR', 'IN', 21948, Coordinate(123.456, -122.456)))
+    print(to_dict(delhi), to_json(Coordinate(1.5, 2.5)))
+
+    @dataclasses.dataclass
+    class Shelf:
+        label: str
+        books: list[Resource]
+        by_language: dict[str, Resource]
+        founded: typing.Optional[datetime] = None
+
+    shelf = Shelf('war', [bestseller], {'EN': bestseller}, datetime(2024, 1, 2, 3, 4))
+    print(to_json(shelf))
+    write_jsonl([bestseller, delhi], sys.stdout)
+
+    benchmark()
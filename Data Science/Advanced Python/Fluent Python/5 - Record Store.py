@@ -0,0 +1,298 @@
+# "5 - Data Class Builders" ends the InitVar section with class C, whose __post_init__ receives a database:
+#     @dataclass
+#     class C:
+#         i: int
+#         j: int = None
+#         database: InitVar[sqlite3] = None
+# This module is the database: dataclasses stored in SQLite tables, fast enough for millions of rows
+# * Table(Resource) maps a dataclass to a table, from dataclasses.fields() and the type hints: int -> INTEGER,
+#   float -> REAL, str -> TEXT, Enum -> its name, date / datetime -> ISO 8601 text, lists and dicts -> JSON text.
+#   to_row / from_row are generated once per class, like @dataclass generates __init__
+# * Writes: executemany in batched transactions. A commit per row costs a write to the journal per row - a batch of
+#   50,000 rows costs one. The INSERT text is the same for every batch, so sqlite3's statement cache prepares it once
+# * WAL mode (journal_mode=WAL): readers don't block the writer and the writer doesn't block readers, and with
+#   synchronous=NORMAL a commit doesn't wait for fsync
+# * Reads: fetchmany, streamed into instances - a million rows never sit in memory at once
+# * Connections: one per thread, from a threading.local. A sqlite3 connection must not be shared between threads
+#   without locking, but many connections to one WAL database can read at the same time
+
+import dataclasses
+import datetime as dt
+import enum
+import itertools
+import json
+import sqlite3
+import threading
+import types
+import typing
+
+BATCH_SIZE = 50_000
+
+SQL_TYPES = {int: 'INTEGER', float: 'REAL', str: 'TEXT', bytes: 'BLOB', bool: 'INTEGER'}
+FROM_ISO = {dt.date: dt.date.fromisoformat, dt.datetime: dt.datetime.fromisoformat, dt.time: dt.time.fromisoformat}
+
+
+def _quote(identifier):
+    return '"' + identifier.replace('"', '""') + '"'
+
+
+def _same(expr):
+    return expr
+
+
+def _or_none(convert):
+    """The conversion of an Optional field: None stays None"""
+    if convert is _same:
+        return _same
+    return lambda expr: f'(None if (v := {expr}) is None else {convert("v")})'
+
+
+class Table:
+    """The table for a dataclass: its SQL, and the generated to_row(record) and from_row(row)"""
+
+    def __init__(self, cls, name=None):
+        if not dataclasses.is_dataclass(cls):
+            raise TypeError(f'{cls.__name__} is not a dataclass')
+        self.cls = cls
+        self.name = name or cls.__name__
+        hints = typing.get_type_hints(cls)
+        # Fields with init=False are computed by __post_init__, and InitVars are not fields: neither is stored
+        self.fields = [field.name for field in dataclasses.fields(cls) if field.init]
+        namespace = {'_dumps': json.dumps, '_loads': json.loads, '_cls': cls}
+        columns, to_sql, from_sql = [], [], []
+        for i, name in enumerate(self.fields):
+            sql_type, nullable, encode, decode = self._column(hints.get(name, typing.Any), namespace, i)
+            columns.append(f'{_quote(name)} {sql_type}{"" if nullable else " NOT NULL"}')
+            to_sql.append(encode(f'r.{name}'))
+            from_sql.append(decode(f'row[{i}]'))
+        quoted = ', '.join(map(_quote, self.fields))
+        self.create_sql = f'CREATE TABLE IF NOT EXISTS {_quote(self.name)} ({", ".join(columns)})'
+        self.insert_sql = f'INSERT INTO {_quote(self.name)} ({quoted}) VALUES ({", ".join("?" * len(self.fields))})'
+        self.select_sql = f'SELECT {quoted} FROM {_quote(self.name)}'
+        exec(f'def to_row(r):\n    return ({"".join(value + ", " for value in to_sql)})\n\n'
+             f'def from_row(row):\n    return _cls({", ".join(from_sql)})\n', namespace)
+        self.to_row, self.from_row = namespace['to_row'], namespace['from_row']
+
+    def __repr__(self):
+        return f'Table({self.cls.__name__}, {self.create_sql!r})'
+
+    @staticmethod
+    def _column(hint, namespace, i):
+        """(SQL type, nullable, encode(expr) -> expr, decode(expr) -> expr) for one field"""
+        origin, args = typing.get_origin(hint), typing.get_args(hint)
+        if origin in (typing.Union, types.UnionType) and type(None) in args:
+            others = [arg for arg in args if arg is not type(None)]
+            if len(others) == 1:  # Optional[X]: X's column, NULL allowed
+                sql_type, _, encode, decode = Table._column(others[0], namespace, i)
+                return sql_type, True, _or_none(encode), _or_none(decode)
+        if hint is bool:
+            return 'INTEGER', False, _same, lambda expr: f'bool({expr})'  # SQLite has no BOOLEAN: True is stored as 1
+        if hint in SQL_TYPES:
+            return SQL_TYPES[hint], False, _same, _same
+        if isinstance(hint, type) and issubclass(hint, enum.Enum):
+            namespace[f'_enum{i}'] = hint
+            return 'TEXT', False, lambda expr: f'{expr}.name', lambda expr: f'_enum{i}[{expr}]'
+        if hint in FROM_ISO:
+            namespace[f'_from_iso{i}'] = FROM_ISO[hint]
+            return 'TEXT', False, lambda expr: f'{expr}.isoformat()', lambda expr: f'_from_iso{i}({expr})'
+        # Lists, dicts, anything else: JSON text. json.dumps raises TypeError for what it can't write - better than
+        # storing a repr() that can't be read back
+        return 'TEXT', True, lambda expr: f'_dumps({expr})', lambda expr: f'_loads({expr})'
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+class RecordStore:
+    """A SQLite database of dataclass records. One connection per thread, WAL mode, batched writes"""
+
+    def __init__(self, path, batch_size=BATCH_SIZE):
+        self.path = path
+        self.batch_size = batch_size
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = []
+        self._tables = {}
+
+    def connection(self):
+        """This thread's connection, opened on first use"""
+        try:
+            return self._local.connection
+        except AttributeError:
+            pass
+        # check_same_thread=False only so that close() can close them all from one thread: otherwise a connection is
+        # only ever used by the thread that opened it
+        connection = sqlite3.connect(self.path, cached_statements=256, check_same_thread=False)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        self._local.connection = connection
+        with self._lock:
+            self._connections.append(connection)
+        return connection
+
+    def table(self, cls):
+        with self._lock:
+            table = self._tables.get(cls)
+        if table is None:
+            table = Table(cls)
+            with self.connection() as connection:
+                connection.execute(table.create_sql)
+            with self._lock:
+                table = self._tables.setdefault(cls, table)
+        return table
+
+    def insert(self, records, cls=None):
+        """Insert records of one dataclass, batch_size rows per transaction. Returns the number of rows"""
+        records = iter(records)
+        if cls is None:
+            first = next(records, None)
+            if first is None:
+                return 0
+            cls, records = type(first), itertools.chain([first], records)
+        table = self.table(cls)
+        connection, rows = self.connection(), map(table.to_row, records)
+        total = 0
+        while True:
+            with connection:  # One transaction: commits at the end of the batch, rolls it back on an exception
+                count = connection.executemany(table.insert_sql, itertools.islice(rows, self.batch_size)).rowcount
+            total += count
+            if count < self.batch_size:
+                return total
+
+    def select(self, cls, where='', params=(), batch_size=None):
+        """Stream instances of cls: select(Resource, 'WHERE language = ?', ['EN']). Only `params` may hold values"""
+        table = self.table(cls)
+        cursor = self.connection().execute(f'{table.select_sql} {where}', params)
+        size, from_row = batch_size or self.batch_size, table.from_row
+        try:
+            while rows := cursor.fetchmany(size):
+                yield from map(from_row, rows)
+        finally:
+            cursor.close()
+
+    def count(self, cls, where='', params=()):
+        table = self.table(cls)
+        return self.connection().execute(f'SELECT count(*) FROM {_quote(table.name)} {where}', params).fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            for connection in self._connections:
+                connection.close()
+            self._connections.clear()
+        self._local = threading.local()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+# The chapter's classes
+
+
+class ResourceType(enum.Enum):
+    BOOK = enum.auto()
+    EBOOK = enum.auto()
+    VIDEO = enum.auto()
+
+
+@dataclasses.dataclass
+class Resource:
+    identifier: str
+    title: str = '<untitled>'
+    creators: list[str] = dataclasses.field(default_factory=list)
+    date: typing.Optional[dt.date] = None  # dt.date: see "5 - Record Serializer" for why not Optional[date]
+    type: ResourceType = ResourceType.BOOK
+    description: str = ''
+    language: str = ''
+    subjects: list[str] = dataclasses.field(default_factory=list)
+
+
+@dataclasses.dataclass
+class C:
+    i: int
+    j: typing.Optional[int] = None
+    database: dataclasses.InitVar[typing.Optional[RecordStore]] = None
+
+    def __post_init__(self, database):
+        if self.j is None and database is not None:  # The chapter's "Looking for a query", for real
+            found = next(database.select(C, 'WHERE i = ? AND j IS NOT NULL LIMIT 1', [self.i]), None)
+            self.j = found.j if found else None
+
+
+def benchmark(n=1_000_000, readers=4):
+    import os
+    import tempfile
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+
+    def resources(count):
+        for i in range(count):
+            yield Resource(f'id-{i}', 'The nature of War', ['Stanislav Chentsov'], dt.date(2029, 4, 18),
+                           ResourceType.EBOOK, language='EN' if i % 3 else 'PT', subjects=['war'])
+
+    def rate(label, count, fn):
+        t0 = time.perf_counter()
+        fn()
+        print(f'{label:<52}{count / (time.perf_counter() - t0):>12,.0f} rows/s')
+
+    with tempfile.TemporaryDirectory() as tmp:
+        with RecordStore(os.path.join(tmp, 'naive.db')) as store:
+            table = store.table(Resource)
+            connection = store.connection()
+
+            def commit_every_row(count=2_000):
+                for record in resources(count):
+                    with connection:
+                        connection.execute(table.insert_sql, table.to_row(record))
+
+            def one_transaction(count=100_000):
+                with connection:
+                    for record in resources(count):
+                        connection.execute(table.insert_sql, table.to_row(record))
+
+            rate('execute() + commit, per row (2,000 rows)', 2_000, commit_every_row)
+            rate('execute() per row, one transaction (100,000 rows)', 100_000, one_transaction)
+
+        path = os.path.join(tmp, 'resources.db')
+        with RecordStore(path) as store:
+            rate(f'RecordStore.insert: executemany, {BATCH_SIZE:,} per commit', n, lambda: store.insert(resources(n)))
+            print(f'{os.path.getsize(path) / 2 ** 20:.0f} MB, {store.count(Resource):,} rows')
+            table = store.table(Resource)
+            rate('fetchall() + from_row', n,
+                 lambda: list(map(table.from_row, store.connection().execute(table.select_sql).fetchall())))
+            rate('select(): fetchmany, streamed', n, lambda: sum(1 for _ in store.select(Resource)))
+
+            def read_slice(k):  # Each reader thread gets its own connection from the pool
+                step = n // readers
+                where = 'WHERE rowid > ? AND rowid <= ?'
+                return sum(1 for _ in store.select(Resource, where, [k * step, (k + 1) * step]))
+
+            for workers in (1, readers):
+                with ThreadPoolExecutor(workers) as executor:
+                    rate(f'{readers} rowid ranges, {workers} reader thread(s)', n,
+                         lambda: sum(executor.map(read_slice, range(readers))))
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+if __name__ == '__main__':
+    import os
+    import tempfile
+
+    print(Table(Resource).create_sql)
+    with tempfile.TemporaryDirectory() as tmp, RecordStore(os.path.join(tmp, 'chapter5.db')) as store:
+        store.insert([Resource('Stas', type=ResourceType.EBOOK),
+                      Resource('Bestseller', 'The nature of War', ['Stanislav Chentsov'], dt.date(2029, 4, 18),
+                               language='EN')])
+        print(list(store.select(Resource)))
+        print(list(store.select(Resource, 'WHERE date IS NOT NULL')))
+
+        store.insert([C(10, 20), C(11)])
+        print(C(10, database=store), C(11, database=store), C(12))
+        print(Table(C).create_sql)  # The InitVar is not a column
+
+    benchmark()
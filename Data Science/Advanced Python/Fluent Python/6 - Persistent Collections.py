@@ -0,0 +1,784 @@
+# "6 - Object References, Mutability, and Recycling" copies a Bus two ways: copy.copy(bus_149) shares the passengers
+# list, so dropping a passenger from one bus drops it from both; copy.deepcopy(bus_149) copies the list and everything
+# in it - correct, and O(size of everything reachable). The Prototype pattern (clone a configured object, then tweak
+# the clone) is the same deepcopy: Core/Design Patterns/Gamma Categorization/Creational/Prototype.py clones its Person
+# with copy.deepcopy. For a graph of 100,000 nodes that's a full walk with a memo dict of every object, per copy
+
+# Persistent collections make the copy free instead: nothing is ever changed in place, so two versions can share all
+# the parts that are the same
+# * PVector - a sequence stored as a tree of 32-slot lists (a bit-partitioned trie). v.set(i, x) copies only the path
+#   from the root to the leaf with slot i: log32(n) small lists - 4 of them for a million items. append() writes to a
+#   separate tail of up to 32 items, and only moves a full tail into the tree
+# * PMap - a mapping stored as a hash array mapped trie (HAMT): each level uses 5 bits of hash(key) to pick a child,
+#   and a bitmap says which of the 32 children exist, so a node stores only those. m.set(k, v) copies one path, too
+# * CowList / CowDict - the mutable faces of the two, for code written against list and dict, like Bus: b.pick(name)
+#   swaps in a new version. copy.copy() is O(1): the copy gets the same version, and the next change to either one
+#   makes a new version for that one only - copy-on-write
+# copy.deepcopy() is O(1) too while every item is a value - a str, a number, None, a tuple, PVector or PMap of values -
+# since nothing in it can change. A passenger name is a value. Each change checks the items it adds, so knowing that
+# costs nothing at copy time. Once a list, an Address, any mutable object gets in, deepcopy copies the items like
+# list's deepcopy does; copy() stays the cheap way
+# The price is paid on reads: a PMap lookup walks 3-4 levels in Python code, about 20x slower than a dict lookup in C.
+# Worth it when copies are many and each changes a little - versions, undo, Prototype clones - not as a dict replacement
+
+import copy
+from collections.abc import Mapping, MutableMapping, MutableSequence, Sequence
+
+BITS = 5
+WIDTH = 1 << BITS  # 32 slots per node
+MASK = WIDTH - 1
+HASH_MASK = (1 << 64) - 1
+
+_MISSING = object()
+_ATOMS = frozenset({str, int, float, complex, bool, bytes, type(None)})
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+# PVector: the tree holds the items in full 32-item leaves, the tail holds the last 1..32 items
+
+
+def _chunks(items, size=WIDTH):
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+class PVector(Sequence):
+    """An immutable list. set/append/pop return a new PVector that shares all but one path with this one"""
+
+    __slots__ = ('_count', '_shift', '_root', '_tail', '_hash')
+
+    def __new__(cls, iterable=()):
+        items = list(iterable)
+        count = len(items)
+        tail_offset = ((count - 1) >> BITS) << BITS if count else 0
+        nodes, shift = _chunks(items[:tail_offset]), BITS
+        while len(nodes) > WIDTH:  # Group the leaves 32 by 32 until one root is left: the same shape appends build
+            nodes, shift = _chunks(nodes), shift + BITS
+        return cls._make(count, shift, nodes, items[tail_offset:])
+
+    @classmethod
+    def _make(cls, count, shift, root, tail):
+        vector = object.__new__(cls)
+        vector._count, vector._shift, vector._root, vector._tail, vector._hash = count, shift, root, tail, None
+        return vector
+
+    def _tail_offset(self):
+        return ((self._count - 1) >> BITS) << BITS if self._count else 0
+
+    def __len__(self):
+        return self._count
+
+    def _leaf(self, i):
+        if i >= self._tail_offset():
+            return self._tail
+        node = self._root
+        for level in range(self._shift, 0, -BITS):
+            node = node[(i >> level) & MASK]
+        return node
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return PVector(list(self)[i])
+        if i < 0:
+            i += self._count
+        if not 0 <= i < self._count:
+            raise IndexError('PVector index out of range')
+        return self._leaf(i)[i & MASK]
+
+    def __iter__(self):
+        stack = [iter(self._root)]  # Depth-first over the tree: every leaf in order, then the tail
+        depth = self._shift // BITS
+        while stack:
+            for node in stack[-1]:
+                if len(stack) == depth:
+                    yield from node
+                else:
+                    stack.append(iter(node))
+                    break
+            else:
+                stack.pop()
+        yield from self._tail
+
+    def __reversed__(self):
+        return reversed(list(self))
+
+    def __eq__(self, other):
+        if isinstance(other, PVector):
+            return self is other or (self._count == other._count and all(map(_eq, self, other)))
+        return NotImplemented
+
+    def __hash__(self):
+        if self._hash is None:
+            self._hash = hash(tuple(self))
+        return self._hash
+
+    def __repr__(self):
+        return f'PVector({list(self)!r})'
+
+    def __reduce__(self):
+        return PVector, (list(self),)
+
+    # New versions
+
+    def set(self, i, value):
+        if i < 0:
+            i += self._count
+        if not 0 <= i < self._count:
+            raise IndexError('PVector assignment index out of range')
+        if i >= self._tail_offset():
+            tail = self._tail[:]
+            tail[i & MASK] = value
+            return PVector._make(self._count, self._shift, self._root, tail)
+        return PVector._make(self._count, self._shift, self._set_path(self._shift, self._root, i, value), self._tail)
+
+    @staticmethod
+    def _set_path(level, node, i, value):
+        node = node[:]  # The copy: one small list per level
+        if level == 0:
+            node[i & MASK] = value
+        else:
+            slot = (i >> level) & MASK
+            node[slot] = PVector._set_path(level - BITS, node[slot], i, value)
+        return node
+
+    def append(self, value):
+        count = self._count
+        if count - self._tail_offset() < WIDTH:  # Room in the tail: only the tail is copied
+            return PVector._make(count + 1, self._shift, self._root, self._tail + [value])
+        # The tail is full: it becomes a leaf of the tree, and [value] is the new tail
+        shift = self._shift
+        if (count >> BITS) > (1 << shift):  # The tree is full too: it gets one level taller
+            root = [self._root, self._new_path(shift, self._tail)]
+            shift += BITS
+        else:
+            root = self._push_tail(count, shift, self._root, self._tail)
+        return PVector._make(count + 1, shift, root, [value])
+
+    @staticmethod
+    def _new_path(level, node):
+        while level:
+            node, level = [node], level - BITS
+        return node
+
+    @staticmethod
+    def _push_tail(count, level, parent, tail):
+        slot = ((count - 1) >> level) & MASK
+        parent = parent[:]
+        if level == BITS:
+            child = tail
+        elif slot < len(parent):
+            child = PVector._push_tail(count, level - BITS, parent[slot], tail)
+        else:
+            child = PVector._new_path(level - BITS, tail)
+        if slot < len(parent):
+            parent[slot] = child
+        else:
+            parent.append(child)
+        return parent
+
+    def pop(self):
+        """(new PVector without the last item, the last item)"""
+        count = self._count
+        if not count:
+            raise IndexError('pop from empty PVector')
+        last = self._tail[-1]
+        if count == 1:
+            return PVector(), last
+        if len(self._tail) > 1:
+            return PVector._make(count - 1, self._shift, self._root, self._tail[:-1]), last
+        # The tail is empty now: the last leaf of the tree comes back out as the tail
+        tail = self._leaf(count - 2)
+        root, shift = self._pop_tail(count, self._shift, self._root), self._shift
+        if root is None:
+            root = []
+        if shift > BITS and len(root) == 1:
+            root, shift = root[0], shift - BITS
+        return PVector._make(count - 1, shift, root, tail), last
+
+    @staticmethod
+    def _pop_tail(count, level, node):
+        slot = ((count - 2) >> level) & MASK
+        if level > BITS:
+            child = PVector._pop_tail(count, level - BITS, node[slot])
+            if child is None and slot == 0:
+                return None
+            node = node[:slot] + ([child] if child is not None else [])
+            return node
+        return None if slot == 0 else node[:slot]
+
+    def extend(self, iterable):
+        vector = self
+        for value in iterable:
+            vector = vector.append(value)
+        return vector
+
+    def delete(self, i):
+        """A new PVector without item i. O(n), like del on a list - except at the end, which is pop()"""
+        if i < 0:
+            i += self._count
+        if i == self._count - 1:
+            return self.pop()[0]
+        items = list(self)
+        del items[i]
+        return PVector(items)
+
+    def insert(self, i, value):
+        if i >= self._count:
+            return self.append(value)
+        items = list(self)
+        items.insert(i, value)
+        return PVector(items)
+
+    def remove(self, value):
+        return self.delete(self.index(value))
+
+
+def _eq(a, b):
+    return a is b or a == b
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+# PMap: a hash array mapped trie. A node has a 32-bit bitmap, and one entry per bit set - a leaf (hash, key, value) or a
+# child node. Keys whose 64-bit hashes are equal end up together in a collision node
+
+
+class _Bitmap:
+    __slots__ = ('bitmap', 'entries', 'owner')
+
+    def __init__(self, bitmap, entries, owner=None):
+        self.bitmap = bitmap
+        self.entries = entries
+        self.owner = owner  # Nodes built by one PMap.from_items call may be changed in place by that call, only
+
+    def assoc(self, shift, h, key, value, owner=None):
+        """(new node, True if the key was added rather than replaced)"""
+        bit = 1 << ((h >> shift) & MASK)
+        index = (self.bitmap & (bit - 1)).bit_count()
+        if not self.bitmap & bit:
+            return self._with(index, (h, key, value), owner, insert=True, bit=bit), True
+        entry = self.entries[index]
+        if type(entry) is tuple:
+            if entry[1] is key or entry[1] == key:
+                if entry[2] is value:
+                    return self, False
+                return self._with(index, (h, key, value), owner), False
+            child = _merge(shift + BITS, entry, entry[0], (h, key, value), h, owner)
+            return self._with(index, child, owner), True
+        child, added = entry.assoc(shift + BITS, h, key, value, owner)
+        return (self, added) if child is entry else (self._with(index, child, owner), added)
+
+    def _with(self, index, entry, owner, insert=False, bit=0):
+        if owner is not None and self.owner is owner:  # Ours, from this build: no copy
+            node = self
+        else:
+            node = _Bitmap(self.bitmap, self.entries[:], owner)
+        if insert:
+            node.entries.insert(index, entry)
+            node.bitmap |= bit
+        else:
+            node.entries[index] = entry
+        return node
+
+    def without(self, shift, h, key):
+        """self if the key isn't here, None if the node is now empty, a leaf to inline into the parent, or a new node"""
+        bit = 1 << ((h >> shift) & MASK)
+        if not self.bitmap & bit:
+            return self
+        index = (self.bitmap & (bit - 1)).bit_count()
+        entry = self.entries[index]
+        if type(entry) is tuple:
+            if not (entry[1] is key or entry[1] == key):
+                return self
+            child = None
+        else:
+            child = entry.without(shift + BITS, h, key)
+            if child is entry:
+                return self
+        entries = self.entries[:]
+        if child is None:
+            del entries[index]
+            bitmap = self.bitmap & ~bit
+            if not bitmap:
+                return None
+        else:
+            entries[index] = child
+            bitmap = self.bitmap
+        if shift and len(entries) == 1 and type(entries[0]) is tuple:
+            return entries[0]  # A lone leaf moves up a level
+        return _Bitmap(bitmap, entries)
+
+    def __iter__(self):
+        for entry in self.entries:
+            if type(entry) is tuple:
+                yield entry
+            else:
+                yield from entry
+
+
+class _Collision:
+    __slots__ = ('hash', 'entries')
+
+    def __init__(self, h, entries):
+        self.hash = h
+        self.entries = entries
+
+    def find(self, shift, h, key):
+        for entry in self.entries:
+            if entry[1] is key or entry[1] == key:
+                return entry[2]
+        return _MISSING
+
+    def assoc(self, shift, h, key, value, owner=None):
+        if h != self.hash:  # A different hash reached this collision node: split at this level
+            return _merge(shift, self, self.hash, (h, key, value), h, owner), True
+        for i, entry in enumerate(self.entries):
+            if entry[1] is key or entry[1] == key:
+                entries = self.entries[:]
+                entries[i] = (h, key, value)
+                return _Collision(h, entries), False
+        return _Collision(h, self.entries + [(h, key, value)]), True
+
+    def without(self, shift, h, key):
+        entries = [entry for entry in self.entries if not (entry[1] is key or entry[1] == key)]
+        if len(entries) == len(self.entries):
+            return self
+        return entries[0] if len(entries) == 1 else _Collision(self.hash, entries)
+
+    def __iter__(self):
+        return iter(self.entries)
+
+
+def _merge(shift, entry1, h1, entry2, h2, owner=None):
+    """A node holding two entries (leaves or collision nodes) whose hashes agreed up to `shift`"""
+    if h1 == h2:
+        return _Collision(h1, [entry1, entry2])
+    slot1, slot2 = (h1 >> shift) & MASK, (h2 >> shift) & MASK
+    if slot1 == slot2:
+        return _Bitmap(1 << slot1, [_merge(shift + BITS, entry1, h1, entry2, h2, owner)], owner)
+    entries = [entry1, entry2] if slot1 < slot2 else [entry2, entry1]
+    return _Bitmap((1 << slot1) | (1 << slot2), entries, owner)
+
+
+_EMPTY_NODE = _Bitmap(0, [])
+
+
+class PMap(Mapping):
+    """An immutable dict. set/delete/update return a new PMap that shares all but the changed paths with this one"""
+
+    __slots__ = ('_root', '_count')
+
+    def __new__(cls, other=(), **kwargs):
+        if isinstance(other, PMap) and not kwargs:
+            return other
+        return cls.from_items(other.items() if isinstance(other, Mapping) else other, **kwargs)
+
+    @classmethod
+    def _make(cls, root, count):
+        pmap = object.__new__(cls)
+        pmap._root, pmap._count = root, count
+        return pmap
+
+    @classmethod
+    def from_items(cls, items, **kwargs):
+        """Build a PMap from (key, value) pairs, changing its own new nodes in place instead of copying them"""
+        owner = object()  # The build's token: nodes with this owner were made here, and no one else has seen them
+        root, count = _Bitmap(0, [], owner), 0
+        for items_ in (items, kwargs.items()):
+            for key, value in items_:
+                root, added = root.assoc(0, hash(key) & HASH_MASK, key, value, owner)
+                count += added
+        _seal(root)
+        return cls._make(root, count)
+
+    def __len__(self):
+        return self._count
+
+    def _find(self, key):
+        h = hash(key) & HASH_MASK
+        node, shift = self._root, 0
+        while type(node) is _Bitmap:  # A loop down the levels, not a method call per level
+            bit = 1 << ((h >> shift) & MASK)
+            if not node.bitmap & bit:
+                return _MISSING
+            node = node.entries[(node.bitmap & (bit - 1)).bit_count()]
+            if type(node) is tuple:
+                return node[2] if node[1] is key or node[1] == key else _MISSING
+            shift += BITS
+        return node.find(shift, h, key)
+
+    def __getitem__(self, key):
+        value = self._find(key)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def get(self, key, default=None):
+        value = self._find(key)
+        return default if value is _MISSING else value
+
+    def __contains__(self, key):
+        return self._find(key) is not _MISSING
+
+    def __iter__(self):
+        return (entry[1] for entry in self._root)
+
+    def items(self):
+        return [(entry[1], entry[2]) for entry in self._root]
+
+    def values(self):
+        return [entry[2] for entry in self._root]
+
+    def __repr__(self):
+        return f'PMap({dict(self.items())!r})'
+
+    def __reduce__(self):
+        return PMap.from_items, (self.items(),)
+
+    def __hash__(self):
+        return hash(frozenset(self.items()))
+
+    # New versions
+
+    def set(self, key, value):
+        root, added = self._root.assoc(0, hash(key) & HASH_MASK, key, value)
+        return self if root is self._root else PMap._make(root, self._count + added)
+
+    def delete(self, key):
+        root = self._root.without(0, hash(key) & HASH_MASK, key)
+        if root is self._root:
+            raise KeyError(key)
+        return PMap._make(root if root is not None else _EMPTY_NODE, self._count - 1)
+
+    def update(self, other=(), **kwargs):
+        pmap = self
+        for key, value in (other.items() if isinstance(other, Mapping) else other):
+            pmap = pmap.set(key, value)
+        for key, value in kwargs.items():
+            pmap = pmap.set(key, value)
+        return pmap
+
+
+def _seal(node):
+    """End of a from_items build: take the token away, so that no later build can change these nodes"""
+    if type(node) is _Bitmap and node.owner is not None:
+        node.owner = None
+        for entry in node.entries:
+            if type(entry) is not tuple:
+                _seal(entry)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+# The mutable faces: copy-on-write list and dict. _values is True when every item is known to be a value
+
+
+def _is_value(item):
+    """True if nothing inside the item can ever change: a deepcopy may share it"""
+    kind = type(item)
+    if kind in _ATOMS:
+        return True
+    if kind is tuple or kind is PVector:
+        return all(map(_is_value, item))
+    if kind is PMap:
+        return all(_is_value(key) and _is_value(value) for key, value in item.items())
+    return False
+
+
+class CowList(MutableSequence):
+    """A list that copies in O(1): every change makes a new PVector version, shared with nobody else"""
+
+    __slots__ = ('_items', '_values')
+
+    def __init__(self, iterable=()):
+        if isinstance(iterable, CowList):
+            self._items, self._values = iterable._items, iterable._values
+        else:
+            self._items = PVector(iterable)
+            self._values = all(map(_is_value, self._items))
+
+    def __len__(self):
+        return len(self._items)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return CowList(self._items[i])
+        return self._items[i]
+
+    def __setitem__(self, i, value):
+        if isinstance(i, slice):
+            items = list(self._items)
+            items[i] = value
+            self._items = PVector(items)
+            self._values = all(map(_is_value, items))
+        else:
+            self._items = self._items.set(i, value)
+            self._values = self._values and _is_value(value)
+
+    def __delitem__(self, i):
+        if isinstance(i, slice):
+            items = list(self._items)
+            del items[i]
+            self._items = PVector(items)
+        else:
+            self._items = self._items.delete(i)
+
+    def insert(self, i, value):
+        self._items = self._items.insert(i, value)
+        self._values = self._values and _is_value(value)
+
+    def append(self, value):
+        self._items = self._items.append(value)
+        self._values = self._values and _is_value(value)
+
+    def pop(self, i=-1):
+        if i in (-1, len(self._items) - 1):
+            self._items, value = self._items.pop()
+            return value
+        value = self._items[i]
+        del self[i]
+        return value
+
+    def remove(self, value):
+        self._items = self._items.remove(value)
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def __eq__(self, other):
+        if isinstance(other, CowList):
+            return self._items == other._items
+        if isinstance(other, list):
+            return list(self._items) == other
+        return NotImplemented
+
+    def __repr__(self):
+        return f'CowList({list(self._items)!r})'
+
+    def snapshot(self):
+        """The current version, a PVector: it never changes"""
+        return self._items
+
+    def copy(self):
+        new = CowList.__new__(CowList)
+        new._items, new._values = self._items, self._values
+        return new
+
+    __copy__ = copy
+
+    def __deepcopy__(self, memo):
+        if not self._values:  # A removed item may have been the only mutable one: look again before copying them all
+            self._values = all(map(_is_value, self._items))
+        new = memo[id(self)] = self.copy()
+        if not self._values:
+            new._items = PVector(copy.deepcopy(list(self._items), memo))
+        return new
+
+
+class CowDict(MutableMapping):
+    """A dict that copies in O(1): every change makes a new PMap version, shared with nobody else"""
+
+    __slots__ = ('_map', '_values')
+
+    def __init__(self, other=(), **kwargs):
+        if isinstance(other, CowDict) and not kwargs:
+            self._map, self._values = other._map, other._values
+        else:
+            self._map = PMap(other, **kwargs)
+            self._values = _is_value(self._map)
+
+    def __len__(self):
+        return len(self._map)
+
+    def __getitem__(self, key):
+        return self._map[key]
+
+    def get(self, key, default=None):
+        return self._map.get(key, default)
+
+    def __contains__(self, key):
+        return key in self._map
+
+    def __setitem__(self, key, value):
+        self._map = self._map.set(key, value)
+        self._values = self._values and _is_value(key) and _is_value(value)
+
+    def __delitem__(self, key):
+        self._map = self._map.delete(key)
+
+    def __iter__(self):
+        return iter(self._map)
+
+    def __repr__(self):
+        return f'CowDict({dict(self._map.items())!r})'
+
+    def snapshot(self):
+        """The current version, a PMap: it never changes"""
+        return self._map
+
+    def copy(self):
+        new = CowDict.__new__(CowDict)
+        new._map, new._values = self._map, self._values
+        return new
+
+    __copy__ = copy
+
+    def __deepcopy__(self, memo):
+        if not self._values:
+            self._values = _is_value(self._map)
+        new = memo[id(self)] = self.copy()
+        if not self._values:
+            new._map = PMap(copy.deepcopy(dict(self._map.items()), memo))
+        return new
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+# The chapter's Bus, and a benchmark
+
+
+class Bus:
+    def __init__(self, passengers: list = None):
+        if passengers is None:
+            self.passengers = []
+        else:
+            self.passengers = passengers
+
+    def pick(self, name):
+        return self.passengers.append(name)
+
+    def drop(self, name):
+        if name in self.passengers:
+            self.passengers.remove(name)
+        else:
+            raise ValueError(f'{name[0].upper()} is not in {self.passengers}')
+
+
+def benchmark(n=100_000, degree=5, versions=1000):
+    import random
+    import time
+    import tracemalloc
+
+    rng = random.Random(0)
+    edges = {node: [rng.randrange(n) for _ in range(degree)] for node in range(n)}
+
+    def measure(label, fn, repeat):
+        """Time per copy, and memory per copy - the copies are kept alive, so the memory still in use is theirs"""
+        kept = []
+        tracemalloc.start()
+        t0 = time.perf_counter()
+        for _ in range(repeat):
+            kept.append(fn())
+        elapsed = (time.perf_counter() - t0) / repeat
+        size = tracemalloc.get_traced_memory()[0] / repeat
+        tracemalloc.stop()
+        print(f'{label:<52}{repeat:>7,}{elapsed * 1e3:>12.3f} ms{size / 2 ** 10:>12,.1f} KB')
+
+    def dict_version():
+        clone = copy.deepcopy(graph)
+        clone[rng.randrange(n)].append(1)
+        return clone
+
+    def cow_version():
+        clone = copy.deepcopy(cow)
+        node = rng.randrange(n)
+        clone[node] = clone[node].append(1)  # Copies one path of the PMap, and the PVector's tail
+        return clone
+
+    print(f'A graph of {n:,} nodes x {degree} edges, node -> neighbours. Timed under tracemalloc')
+    print(f'{"a copy + 1 new edge":<52}{"copies":>7}{"per copy":>15}{"memory per copy":>18}')
+    graph = {node: list(neighbours) for node, neighbours in edges.items()}
+    measure('copy.deepcopy(dict of lists)', dict_version, repeat=3)  # Slow: only a few
+    cow = CowDict((node, PVector(neighbours)) for node, neighbours in edges.items())
+    measure('copy.deepcopy(CowDict of PVectors)', cow_version, repeat=versions)
+
+    t0 = time.perf_counter()
+    total = sum(len(graph[node]) for node in range(n))
+    t1 = time.perf_counter()
+    assert total == sum(len(cow[node]) for node in range(n))
+    t2 = time.perf_counter()
+    print(f'The price: {n:,} lookups take {(t1 - t0) * 1e3:.0f} ms in the dict, {(t2 - t1) * 1e3:.0f} ms in the PMap')
+
+    prototype = Bus([f'passenger {i}' for i in range(n)])
+    cow_prototype = Bus(CowList(prototype.passengers))
+
+    def clone(bus):  # The Prototype pattern, as Prototype.py clones its Person: deepcopy the prototype, change the copy
+        bus = copy.deepcopy(bus)
+        bus.pick('Alice')
+        return bus
+
+    print(f'\nA Bus with {n:,} passengers as the prototype')
+    measure('copy.deepcopy(Bus(list)) + pick()', lambda: clone(prototype), repeat=3)
+    measure('copy.deepcopy(Bus(CowList)) + pick()', lambda: clone(cow_prototype), repeat=versions)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+if __name__ == '__main__':
+    bus_149 = Bus(CowList(['Alice', 'Bob', 'Charlie']))
+    bus_221 = copy.copy(bus_149)  # Shares the CowList object itself, like the chapter's shallow copy
+    bus_148 = copy.deepcopy(bus_149)  # O(1): a new CowList with the same version
+    print(bus_148.passengers.snapshot() is bus_149.passengers.snapshot())
+
+    bus_149.drop('Alice')
+    bus_149.passengers[-1] += ' Ive just added it'
+    bus_149.pick('Alesha')
+    print(f'bus_149.passengers = {bus_149.passengers}')
+    print(f'bus_221.passengers = {bus_221.passengers}')
+    print(f'bus_148.passengers = {bus_148.passengers}\n')
+
+    nested = CowList([[1]])  # Not values: deepcopy copies them, copy() shares them
+    deep, shallow = copy.deepcopy(nested), nested.copy()
+    nested[0].append(2)
+    assert deep == [[1]] and shallow == [[1, 2]] and deep[0] is not nested[0]
+    nested.pop()
+    assert copy.deepcopy(nested).snapshot() is nested.snapshot()  # Values again after the list went away
+    table = CowDict(a=(1, 'x'), b=PVector([2.5, None]))
+    assert copy.deepcopy(table).snapshot() is table.snapshot()
+    table['c'] = {'d': []}
+    twin = copy.deepcopy(table)
+    table['c']['d'].append(1)
+    assert twin['c'] == {'d': []} and twin['a'] is table['a']
+
+    import random
+
+    rng = random.Random(1)
+    model, vector = [], PVector()
+    for step in range(20_000):  # Against a list, through every path: tail, tree growth, pop back through levels
+        if model and rng.random() < 0.3:
+            vector, value = vector.pop()
+            assert value == model.pop()
+        else:
+            model.append(step)
+            vector = vector.append(step)
+        if model and step % 7 == 0:
+            i = rng.randrange(len(model))
+            model[i] = -step
+            vector = vector.set(i, -step)
+    assert list(vector) == model and len(vector) == len(model) and vector == PVector(model)
+    assert all(vector[i] == model[i] for i in range(0, len(model), 97))
+
+    class Colliding:  # Equal hashes for different keys: the collision nodes
+        def __init__(self, n):
+            self.n = n
+
+        def __hash__(self):
+            return self.n % 3
+
+        def __eq__(self, other):
+            return isinstance(other, Colliding) and self.n == other.n
+
+    keys = [Colliding(i) for i in range(30)] + list(range(5000)) + [f'k{i}' for i in range(5000)]
+    reference, pmap = {}, PMap()
+    for key in rng.sample(keys, len(keys)):
+        reference[key] = rng.random()
+        pmap = pmap.set(key, reference[key])
+    old = pmap
+    for key in rng.sample(keys, len(keys) // 2):
+        del reference[key]
+        pmap = pmap.delete(key)
+    assert dict(pmap.items()) == reference and len(pmap) == len(reference) and len(old) == len(keys)
+    assert PMap(reference) == pmap and all(old[key] is not None for key in keys)
+    print('PVector and PMap agree with list and dict')
+
+    benchmark()
@@ -0,0 +1,219 @@
+# name_index() from "8 - Type Hints in Functions" calls unicodedata.name() on every code point up to sys.maxunicode
+# (~1.1 million of them) and tokenizes every name it finds - on every start of the program. The result only changes
+# when the Unicode database changes, i.e. when Python is upgraded. So:
+# * Build the index once, and write it to a compact file whose name contains unicodedata.unidata_version
+# * On the next start, don't load the file - mmap it. Nothing is read until the first query
+# * A query binary-searches the sorted words in the mapped file and decodes only that word's code points
+# The t_index API stays the same: index['DIGIT'] ^ (index['NINE'] | index['EIGHT']) still works on sets of characters
+
+import bisect
+import mmap
+import os
+import re
+import struct
+import sys
+import tempfile
+import unicodedata
+from array import array
+from collections.abc import Iterator, Mapping
+
+RE_WORD = re.compile(r'\w+')
+STOP_CODE = sys.maxunicode + 1
+
+t_index = dict[str, set[str]]  # The chapter uses the 3.12 `type` statement; the plain alias works on older versions
+
+
+def tokenize(text: str) -> Iterator[str]:
+    """return iterable of uppercased words"""
+    for match in RE_WORD.finditer(text):
+        yield match.group().upper()
+
+
+def name_index(start: int = 32, end: int = STOP_CODE) -> t_index:
+    index: t_index = {}
+    for char in (chr(i) for i in range(start, end)):
+        if name := unicodedata.name(char, ''):
+            for word in tokenize(name):
+                index.setdefault(word, set()).add(char)
+    return index
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+# The file
+
+'''
+Little-endian, 8-byte aligned sections:
+
+    header     magic b'UNINAME1', format version, start, end, n_words, words_off, table_off, codes_off  (8s + 7 x u64)
+    unidata    unicodedata.unidata_version, utf-8, padded to 16 bytes
+    words      all the words, sorted, back to back (they are ASCII: Unicode names use only A-Z, 0-9, space and -)
+    table      3 x uint64 per word: end of the word in words, offset of its code points, how many
+    codes      for every word: its code points, sorted, as uint32
+
+The index of the full range is a few MB on disk. Building it is the slow part - opening it is one mmap() call
+'''
+
+MAGIC = b'UNINAME1'
+FORMAT_VERSION = 1
+HEADER = struct.Struct('<8s7Q')
+UNIDATA = struct.Struct('16s')
+TABLE_FIELDS = 3
+
+
+def _align(fp):
+    fp.write(b'\0' * (-fp.tell() % 8))
+
+
+def write_name_index(path: str, index: t_index, start: int, end: int) -> None:
+    words = sorted(index)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as fp:
+        fp.write(b'\0' * HEADER.size)
+        fp.write(UNIDATA.pack(unicodedata.unidata_version.encode()))
+        words_off = fp.tell()
+        ends, pos = array('Q'), 0
+        for word in words:
+            encoded = word.encode('utf-8')
+            fp.write(encoded)
+            pos += len(encoded)
+            ends.append(pos)
+        _align(fp)
+
+        table_off = fp.tell()
+        table, offset = array('Q'), 0
+        for word, word_end in zip(words, ends):
+            table.extend((word_end, offset, len(index[word])))
+            offset += 4 * len(index[word])
+        if sys.byteorder != 'little':
+            table.byteswap()
+        table.tofile(fp)
+
+        codes_off = fp.tell()
+        for word in words:
+            codes = array('I', sorted(map(ord, index[word])))
+            if sys.byteorder != 'little':
+                codes.byteswap()
+            codes.tofile(fp)
+
+        fp.seek(0)
+        fp.write(HEADER.pack(MAGIC, FORMAT_VERSION, start, end, len(words), words_off, table_off, codes_off))
+    os.replace(tmp_path, path)  # Atomic: a concurrent reader sees the old file or the complete new one, never half
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+# The lazily mapped index
+
+
+class MappedNameIndex(Mapping):
+    """A read-only t_index backed by a mmap-ed file. index[word] -> set of characters"""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._mm = None  # Opened on first use
+
+    def _open(self):
+        if self._mm is not None:
+            return
+        if sys.byteorder != 'little':
+            raise NotImplementedError('The name index file can be mapped on little-endian machines only')
+        with open(self.path, 'rb') as fp:
+            mm = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.start, self.end, self._n, self._words_off, table_off, self._codes_off = \
+            HEADER.unpack_from(mm)
+        unidata = UNIDATA.unpack_from(mm, HEADER.size)[0].rstrip(b'\0').decode()
+        if magic != MAGIC or version != FORMAT_VERSION or unidata != unicodedata.unidata_version:
+            mm.close()
+            raise ValueError(f'{self.path!r} is not a name index for this Python '
+                             f'(Unicode {unicodedata.unidata_version})')
+        self._table = memoryview(mm)[table_off:table_off + 8 * TABLE_FIELDS * self._n].cast('Q')
+        self._mm = mm
+
+    def close(self) -> None:
+        if self._mm is not None:
+            self._table.release()
+            self._mm.close()
+            self._mm = None
+
+    def _word_bytes(self, i):
+        start = self._table[TABLE_FIELDS * (i - 1)] if i else 0
+        return self._mm[self._words_off + start:self._words_off + self._table[TABLE_FIELDS * i]]
+
+    def _find(self, word):
+        self._open()
+        try:
+            key = word.encode('ascii')
+        except (UnicodeEncodeError, AttributeError):
+            return -1  # Not a str, or not ASCII -> can't be a word of a Unicode name
+        i = bisect.bisect_left(range(self._n), key, key=self._word_bytes)
+        return i if i < self._n and self._word_bytes(i) == key else -1
+
+    def code_points(self, word: str) -> array:
+        """The sorted code points of word, as array('I') - cheaper than the set when you just need to iterate"""
+        i = self._find(word)
+        if i < 0:
+            raise KeyError(word)
+        _, offset, count = self._table[TABLE_FIELDS * i:TABLE_FIELDS * (i + 1)]
+        start = self._codes_off + offset
+        return array('I', self._mm[start:start + 4 * count])
+
+    def __getitem__(self, word: str) -> set[str]:
+        return set(map(chr, self.code_points(word)))
+
+    def __contains__(self, word) -> bool:
+        return self._find(word) >= 0
+
+    def __len__(self) -> int:
+        self._open()
+        return self._n
+
+    def __iter__(self) -> Iterator[str]:
+        self._open()
+        return (str(self._word_bytes(i), 'ascii') for i in range(self._n))
+
+    def __repr__(self) -> str:
+        return f'MappedNameIndex({self.path!r})'
+
+
+def cache_path(start: int, end: int, cache_dir: str | None = None) -> str:
+    cache_dir = cache_dir or os.path.join(tempfile.gettempdir(), 'unicode-name-index')
+    return os.path.join(cache_dir, f'names-u{unicodedata.unidata_version}-f{FORMAT_VERSION}-{start}-{end}.idx')
+
+
+def load_name_index(start: int = 32, end: int = STOP_CODE, cache_dir: str | None = None) -> MappedNameIndex:
+    """The name index for [start, end): built and saved on the first call, mapped from the file ever after"""
+    path = cache_path(start, end, cache_dir)
+    if not os.path.exists(path):
+        # A new Python with a new Unicode database gets a new file name, so stale caches are simply never opened
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        write_name_index(path, name_index(start, end), start, end)
+    return MappedNameIndex(path)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+if __name__ == '__main__':
+    import time
+
+    with tempfile.TemporaryDirectory() as tmp:
+        t0 = time.perf_counter()
+        full = name_index()
+        t1 = time.perf_counter()
+        print(f'name_index() rebuild:        {t1 - t0:.3f} s, {len(full)} words')
+
+        t1 = time.perf_counter()
+        load_name_index(cache_dir=tmp).close()  # First run ever: build + write
+        t2 = time.perf_counter()
+        size = os.path.getsize(cache_path(32, STOP_CODE, tmp))
+        print(f'First load (build + write):  {t2 - t1:.3f} s, {size / 1e6:.1f} MB')
+
+        t2 = time.perf_counter()
+        index = load_name_index(cache_dir=tmp)  # Every later start
+        answer = index['DIGIT'] ^ (index['NINE'] | index['EIGHT'])
+        t3 = time.perf_counter()
+        print(f'Cold start + first query:    {(t3 - t2) * 1000:.2f} ms  ({(t1 - t0) / (t3 - t2):.0f}x faster)')
+
+        print(answer == full['DIGIT'] ^ (full['NINE'] | full['EIGHT']), sorted(index['GREATER'])[:8])
+        print(len(index) == len(full), 'GREATER' in index, 'greater' in index)
+        index.close()
@@ -0,0 +1,450 @@
+# ----------------------------------------------------------------------------------------------------------------------
+#                                   Bounded cache mapping (LRU / LFU / ARC)
+# ----------------------------------------------------------------------------------------------------------------------
+"""
+Collections.py shows OrderedDict.move_to_end('b') and move_to_end('b', last=False). Those two calls are exactly the
+primitives of an LRU cache:
+    * On every hit - move_to_end(key) -> the key becomes the most recently used one
+    * On eviction - popitem(last=False) -> drops the least recently used key (the head)
+
+Here they are turned into a real cache mapping:
+    * maxsize (number of entries) and/or maxbytes (sum of the sizes of the values)
+    * Per-entry TTL
+    * LRU, LFU and ARC eviction policies
+    * hits / misses / evictions counters
+    * Thread-safe and asyncio-safe get_or_compute: if 100 callers miss the same key at once, the value is computed once
+      and the other 99 wait for it (no thundering herd)
+"""
+
+import asyncio
+import functools
+import sys
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from collections.abc import MutableMapping
+from concurrent.futures import Future
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+# Eviction policies
+
+# A policy only knows about keys and their order. The cache owns the values, the sizes and the expiry times.
+# Every policy has the same 4 methods: insert, access, remove and victim
+
+
+class LRUPolicy:
+    def __init__(self, maxsize=None):
+        self.order = OrderedDict()
+
+    def insert(self, key):
+        self.order[key] = None
+
+    def access(self, key):
+        self.order.move_to_end(key)  # Most recently used -> tail
+
+    def remove(self, key):
+        del self.order[key]
+
+    def victim(self):
+        return next(iter(self.order))  # Least recently used -> head
+
+
+class LFUPolicy:
+    # Keys are grouped into buckets by their frequency. Each bucket is an OrderedDict, so ties are broken by LRU order.
+    # min_freq points to the bucket to evict from, which makes insert, access and eviction O(1). The one exception: when
+    # a remove() outside eviction (del cache[key]) empties that bucket, the next victim() scans the buckets for the new
+    # minimum - O(number of distinct frequencies), once. On the eviction path the insert that follows resets it to 1
+    def __init__(self, maxsize=None):
+        self.freq = {}
+        self.buckets = defaultdict(OrderedDict)
+        self.min_freq = 0
+
+    def insert(self, key):
+        self.freq[key] = 1
+        self.buckets[1][key] = None
+        self.min_freq = 1
+
+    def access(self, key):
+        f = self.freq[key]
+        bucket = self.buckets[f]
+        del bucket[key]
+        if not bucket:
+            del self.buckets[f]
+            if self.min_freq == f:
+                self.min_freq = f + 1
+        self.freq[key] = f + 1
+        self.buckets[f + 1][key] = None
+
+    def remove(self, key):
+        f = self.freq.pop(key)
+        bucket = self.buckets[f]
+        del bucket[key]
+        if not bucket:
+            del self.buckets[f]  # min_freq may now point to no bucket: victim() finds the next one, if it's needed
+
+    def victim(self):
+        if self.min_freq not in self.buckets:
+            self.min_freq = min(self.buckets, default=0)
+        return next(iter(self.buckets[self.min_freq]))
+
+
+class ARCPolicy:
+    '''
+    Adaptive Replacement Cache (Megiddo & Modha). Four LRU lists:
+        T1 - keys seen once recently          B1 - ghosts of keys evicted from T1
+        T2 - keys seen at least twice          B2 - ghosts of keys evicted from T2
+    Ghosts hold no values. A miss that hits a ghost list tells us which half was too small, and the target size p of
+    T1 is moved towards it. So the cache adapts between "recency" (LRU-like) and "frequency" (LFU-like) workloads
+    '''
+
+    def __init__(self, maxsize=None):
+        self.capacity = maxsize or 1024
+        self.p = 0
+        self.t1, self.t2, self.b1, self.b2 = OrderedDict(), OrderedDict(), OrderedDict(), OrderedDict()
+
+    def insert(self, key):
+        if key in self.b1:
+            self.p = min(self.capacity, self.p + max(len(self.b2) // max(len(self.b1), 1), 1))
+            del self.b1[key]
+            self.t2[key] = None
+        elif key in self.b2:
+            self.p = max(0, self.p - max(len(self.b1) // max(len(self.b2), 1), 1))
+            del self.b2[key]
+            self.t2[key] = None
+        else:
+            self.t1[key] = None
+
+    def access(self, key):
+        if key in self.t1:
+            del self.t1[key]
+            self.t2[key] = None
+        else:
+            self.t2.move_to_end(key)
+
+    def remove(self, key, ghost=False):
+        if key in self.t1:
+            del self.t1[key]
+            if ghost:
+                self._remember(self.b1, key)
+        else:
+            del self.t2[key]
+            if ghost:
+                self._remember(self.b2, key)
+
+    def _remember(self, ghosts, key):
+        ghosts[key] = None
+        while len(ghosts) > self.capacity:
+            ghosts.popitem(last=False)
+
+    def victim(self):
+        if self.t1 and (len(self.t1) > self.p or not self.t2):
+            return next(iter(self.t1))
+        return next(iter(self.t2))
+
+
+POLICIES = {'lru': LRUPolicy, 'lfu': LFUPolicy, 'arc': ARCPolicy}
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+# Counters
+
+
+class CacheStats:
+    __slots__ = ('hits', 'misses', 'evictions', 'expirations')
+
+    def __init__(self):
+        self.hits = self.misses = self.evictions = self.expirations = 0
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def __repr__(self):
+        return (f'CacheStats(hits={self.hits}, misses={self.misses}, evictions={self.evictions}, '
+                f'expirations={self.expirations}, hit_rate={self.hit_rate:.2%})')
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+# The cache itself
+
+
+class BoundedCache(MutableMapping):
+    """A mapping that evicts entries when it grows past maxsize entries or maxbytes bytes"""
+
+    def __init__(self, maxsize=128, maxbytes=None, ttl=None, policy='lru', sizeof=sys.getsizeof):
+        if maxsize is None and maxbytes is None:
+            raise ValueError('At least one of maxsize or maxbytes must be given')
+        self.maxsize = maxsize
+        self.maxbytes = maxbytes
+        self.ttl = ttl  # Default TTL in seconds, can be overridden per entry with set(key, value, ttl=...)
+        self.sizeof = sizeof
+        self.policy = POLICIES[policy](maxsize)
+        self.stats = CacheStats()
+        self.nbytes = 0
+        self._data = {}  # key -> (value, size, expires_at or None)
+        self._expiring = 0  # How many entries have an expires_at: while 0, nothing needs a look at the clock
+
+    # The MutableMapping ABC only needs these 5 methods to give us get, pop, setdefault, update, keys, items, ...
+
+    def __getitem__(self, key):
+        try:
+            value, _, expires = self._data[key]
+        except KeyError:
+            self.stats.misses += 1
+            raise
+        if expires is not None and expires <= time.monotonic():
+            self._discard(key)
+            self.stats.expirations += 1
+            self.stats.misses += 1
+            raise KeyError(key)
+        self.stats.hits += 1
+        self.policy.access(key)
+        return value
+
+    def __setitem__(self, key, value):
+        self.set(key, value)
+
+    def __delitem__(self, key):
+        if key not in self._data:
+            raise KeyError(key)
+        self._discard(key)
+
+    def __iter__(self):
+        return iter([key for key, _ in self._live()])
+
+    def __len__(self):
+        return len(self._data) if not self._expiring else sum(1 for _ in self._live())
+
+    def _live(self):
+        """(key, value) of the entries that haven't expired - straight from _data, no stats, no change of order"""
+        if not self._expiring:
+            return [(key, entry[0]) for key, entry in self._data.items()]
+        now = time.monotonic()
+        return [(key, value) for key, (value, _, expires) in self._data.items() if expires is None or expires > now]
+
+    # The ABC's items() and values() would go through __getitem__ - a hit, and a move in the eviction order, per entry
+
+    def items(self):
+        return self._live()
+
+    def values(self):
+        return [value for _, value in self._live()]
+
+    def __contains__(self, key):
+        # Overridden so that "in" neither touches the stats nor the eviction order
+        entry = self._data.get(key)
+        return entry is not None and (entry[2] is None or entry[2] > time.monotonic())
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        size = self.sizeof(value) if self.maxbytes is not None else 0
+        if self.maxbytes is not None and size > self.maxbytes:
+            raise ValueError(f'Value of {size} bytes will never fit in a cache of {self.maxbytes} bytes')
+        if key in self._data:
+            self._discard(key)
+        # Room first, then the new key: inserted first, it could be its own victim - under LFU a new key has the lowest
+        # count of all
+        self._evict(size)
+        self._data[key] = (value, size, time.monotonic() + ttl if ttl is not None else None)
+        self.nbytes += size
+        self._expiring += ttl is not None
+        self.policy.insert(key)
+
+    def _discard(self, key, ghost=False):
+        _, size, expires = self._data.pop(key)
+        self.nbytes -= size
+        self._expiring -= expires is not None
+        if ghost:
+            self.policy.remove(key, ghost=True)
+        else:
+            self.policy.remove(key)
+
+    def _evict(self, size):
+        """Evict until one more entry of `size` bytes fits"""
+        while self._data and ((self.maxsize is not None and len(self._data) >= self.maxsize) or
+                              (self.maxbytes is not None and self.nbytes + size > self.maxbytes)):
+            if isinstance(self.policy, ARCPolicy):
+                self._discard(self.policy.victim(), ghost=True)
+            else:
+                self._discard(self.policy.victim())
+            self.stats.evictions += 1
+
+    def get_or_compute(self, key, func, ttl=None):
+        try:
+            return self[key]
+        except KeyError:
+            value = func(key)
+            self.set(key, value, ttl)
+            return value
+
+    def __repr__(self):
+        return f'{type(self).__name__}({dict(self._live())!r})'
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+# Thread-safe variant
+
+# A single RLock guards the mapping - every public method takes it, including the ones the ABC builds out of two calls:
+# pop() is self[key] followed by del self[key], and another thread must not get in between. The expensive part -
+# func(key) - runs OUTSIDE the lock, otherwise the cache would serialize all the computations. To avoid the thundering
+# herd, the first thread that misses a key registers a Future for it; everybody else who misses the same key waits on
+# that Future instead of calling func again
+
+
+class ThreadSafeCache(BoundedCache):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._lock = threading.RLock()
+        self._inflight = {}
+
+    def get_or_compute(self, key, func, ttl=None):
+        with self._lock:
+            try:
+                return super().__getitem__(key)
+            except KeyError:
+                pass
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = self._inflight[key] = Future()
+        if not owner:
+            return future.result()  # Blocks until the owner finishes; re-raises the owner's exception
+        try:
+            value = func(key)
+        except BaseException as exc:
+            future.set_exception(exc)
+            raise
+        else:
+            self.set(key, value, ttl)
+            future.set_result(value)
+            return value
+        finally:
+            with self._lock:
+                del self._inflight[key]
+
+
+def _locked(method):
+    @functools.wraps(method)
+    def locked(self, *args, **kwargs):
+        with self._lock:
+            return method(self, *args, **kwargs)
+    return locked
+
+
+for _name in ('__getitem__', '__setitem__', '__delitem__', '__iter__', '__len__', '__contains__', '__eq__', '__repr__',
+              'set', 'get', 'items', 'keys', 'values', 'pop', 'popitem', 'setdefault', 'update', 'clear'):
+    setattr(ThreadSafeCache, _name, _locked(getattr(BoundedCache, _name)))
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+# asyncio-safe variant
+
+# Inside one event loop there is no preemption, so the mapping itself needs no lock. Only the await in the middle of
+# get_or_compute can interleave coroutines - and the same in-flight trick with an asyncio.Future handles that
+
+
+class AsyncCache(BoundedCache):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._inflight = {}
+
+    async def get_or_compute(self, key, coro_func, ttl=None):
+        try:
+            return self[key]
+        except KeyError:
+            pass
+        future = self._inflight.get(key)
+        if future is not None:
+            return await asyncio.shield(future)  # shield: a cancelled waiter must not cancel the shared computation
+        future = self._inflight[key] = asyncio.get_running_loop().create_future()
+        try:
+            value = await coro_func(key)
+        except BaseException as exc:
+            future.set_exception(exc)
+            future.exception()  # Mark the exception as retrieved, in case nobody else was waiting
+            raise
+        else:
+            self.set(key, value, ttl)
+            future.set_result(value)
+            return value
+        finally:
+            del self._inflight[key]
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+if __name__ == '__main__':
+    lru = BoundedCache(maxsize=3)
+    for k in 'abcd':
+        lru[k] = k.upper()
+    lru['b']  # 'b' becomes the most recently used
+    lru['e'] = 'E'  # So 'c' is evicted, not 'b'
+    print(list(lru), lru.stats)
+
+    lfu = BoundedCache(maxsize=3, policy='lfu')
+    for k in 'abc':
+        lfu[k] = k
+    for k in 'aab':
+        lfu[k]
+    lfu['d'] = 'd'  # 'c' was used the least
+    print(list(lfu), lfu.stats)
+
+    arc = BoundedCache(maxsize=3, policy='arc')
+    for k in 'abcdab':
+        arc.get_or_compute(k, str.upper)
+    print(list(arc), arc.stats)
+
+    by_bytes = BoundedCache(maxsize=None, maxbytes=200)
+    for i in range(10):
+        by_bytes[i] = 'x' * 50  # ~99 bytes each
+    print(list(by_bytes), by_bytes.nbytes)
+
+    ttl = BoundedCache(ttl=0.05)
+    ttl['a'] = 1
+    time.sleep(0.1)
+    print('a' in ttl, ttl.get('a'), ttl.stats)
+    ttl['b'] = 2
+    ttl.set('c', 3, ttl=60)
+    time.sleep(0.1)
+    assert dict(ttl) == {'c': 3} and ttl.items() == [('c', 3)] and len(ttl) == 1 and ttl != {}
+
+    for policy in POLICIES:  # The new key is never the victim - even under LFU, where it has the lowest count
+        cache = BoundedCache(maxsize=2, policy=policy)
+        cache['a'], cache['b'] = 1, 2
+        cache['a'], cache['b']
+        cache['c'] = 3
+        assert 'c' in cache and len(cache) == 2, policy
+
+    calls = []
+
+    def slow_square(key):
+        calls.append(key)
+        time.sleep(0.05)
+        return key * key
+
+    cache = ThreadSafeCache(maxsize=10)
+    threads = [threading.Thread(target=cache.get_or_compute, args=(7, slow_square)) for _ in range(50)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    print(f'50 threads, {len(calls)} computation(s):', cache[7])
+
+    async def main():
+        async_calls = []
+
+        async def fetch(key):
+            async_calls.append(key)
+            await asyncio.sleep(0.05)
+            return f'<page {key}>'
+
+        acache = AsyncCache(maxsize=10)
+        results = await asyncio.gather(*(acache.get_or_compute('home', fetch) for _ in range(50)))
+        print(f'50 coroutines, {len(async_calls)} computation(s):', results[0])
+
+    asyncio.run(main())
@@ -0,0 +1,189 @@
+# ----------------------------------------------------------------------------------------------------------------------
+#                                 FastUserDict (custom mappings with C-speed reads)
+# ----------------------------------------------------------------------------------------------------------------------
+"""
+Chapter 14 explains why custom mappings should subclass UserDict and not dict: dict's C methods (__init__, update,
+setdefault, get...) ignore the overridden __setitem__ / __getitem__ of a subclass (DoppelDict, AnswerDict). UserDict
+fixes that by writing every method in Python on top of self.data - and that's exactly why it's slow:
+    d[k] on a dict              -> one C call
+    d[k] on a UserDict          -> UserDict.__getitem__ (Python) -> key in self.data -> self.data[key]
+    d[k] on StrKeyDict(UserDict)-> the same, plus __missing__ / __contains__ overrides in Python
+
+But most custom mappings (StrKeyDict, DoubleDict, UpperDict) only need custom code on two occasions:
+    * On WRITES - to normalize the key or transform the value before it is stored
+    * On MISSES - to retry the lookup with a normalized key (str(2) -> '2', 'aAa' -> 'AAA')
+
+A read that hits the stored key doesn't need any Python code at all. So FastUserDict subclasses dict (reads stay in C)
+and takes the opposite approach to UserDict: instead of rewriting the reads, it reroutes ALL the write paths of dict
+(__init__, update, setdefault, |=, fromkeys, copy) through the subclass' __setitem__, and misses through __missing__
+"""
+
+from collections import UserDict
+
+from fast_userdict import FastUserDict, StrKeyDict
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+# The existing mappings, rebuilt on FastUserDict
+
+
+class FastStrKeyDict(FastUserDict):
+    """Chapter 3's StrKeyDict: keys are stored as str, and d[2] finds '2'"""
+
+    def __missing__(self, key):
+        if isinstance(key, str):
+            raise KeyError(key)
+        return dict.__getitem__(self, str(key))
+
+    def __setitem__(self, key, value):
+        dict.__setitem__(self, str(key), value)
+
+    def __delitem__(self, key):
+        dict.__delitem__(self, str(key))
+
+
+class FastDoubleDict(FastUserDict):
+    """Chapter 14's DoubleDict: every value is stored twice"""
+
+    def __setitem__(self, key, value):
+        dict.__setitem__(self, key, [value] * 2)
+
+
+def _upper(key):
+    try:
+        return key.upper()
+    except AttributeError:
+        return key
+
+
+class FastUpperDict(FastUserDict):
+    """Chapter 14's UpperDict: string keys are stored upper-cased"""
+
+    def __missing__(self, key):
+        upper = _upper(key)
+        if upper is key or upper == key:
+            raise KeyError(key)
+        return dict.__getitem__(self, upper)
+
+    def __setitem__(self, key, value):
+        dict.__setitem__(self, _upper(key), value)
+
+    def __delitem__(self, key):
+        dict.__delitem__(self, _upper(key))
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+# The originals, copied from chapter 14 for the benchmark (chapter 3's StrKeyDict is in fast_userdict.py)
+
+
+class DoubleDict(UserDict):
+    def __setitem__(self, key, value):
+        super().__setitem__(key, [value] * 2)
+
+
+class UpperCaseMixin:
+    def __setitem__(self, key, value):
+        super().__setitem__(_upper(key), value)
+
+    def __getitem__(self, item):
+        return super().__getitem__(_upper(item))
+
+    def get(self, key, default=None):
+        return super().get(_upper(key), default)
+
+    def __contains__(self, item):
+        return super().__contains__(_upper(item))
+
+
+class UpperDict(UpperCaseMixin, UserDict):
+    pass
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+# Benchmark suite
+
+
+def benchmark(n=50_000, repeat=3):
+    import timeit
+
+    keys = [f'key{i}' for i in range(n)]
+    upper_keys = [k.upper() for k in keys]
+    int_keys = list(range(n))
+    items = list(zip(keys, range(n)))
+
+    def read_all(mapping, ks):
+        for k in ks:
+            mapping[k]
+
+    def get_all(mapping, ks):
+        get = mapping.get
+        for k in ks:
+            get(k)
+
+    def contains_all(mapping, ks):
+        for k in ks:
+            k in mapping
+
+    def best(stmt):
+        return min(timeit.repeat(stmt, number=1, repeat=repeat)) * 1e9 / n  # ns per operation
+
+    cases = [
+        # name, factory, keys that hit the stored key, keys that miss it first (None -> no such case)
+        ('dict', dict, keys, None),
+        ('UserDict', UserDict, keys, None),
+        ('StrKeyDict(UserDict)', StrKeyDict, keys, None),
+        ('FastStrKeyDict', FastStrKeyDict, keys, None),
+        ('DoubleDict(UserDict)', DoubleDict, keys, None),
+        ('FastDoubleDict', FastDoubleDict, keys, None),
+        ('UpperDict(UserDict)', UpperDict, upper_keys, keys),
+        ('FastUpperDict', FastUpperDict, upper_keys, keys),
+    ]
+    print(f'{"ns / op":<22}{"build":>9}{"d[k] hit":>10}{"get hit":>9}{"in hit":>8}{"d[k] miss":>11}')
+    for name, factory, hit_keys, miss_keys in cases:
+        build = best(lambda: factory(items))
+        m = factory(items)
+        row = [build, best(lambda: read_all(m, hit_keys)), best(lambda: get_all(m, hit_keys)),
+               best(lambda: contains_all(m, hit_keys))]
+        row.append(best(lambda: read_all(m, miss_keys)) if miss_keys else float('nan'))
+        print(f'{name:<22}' + ''.join(f'{v:>{w}.0f}' for v, w in zip(row, (9, 10, 9, 8, 11))))
+
+    # Int keys that have to be converted with str() on every read - the miss path
+    sk, fsk = StrKeyDict(items), FastStrKeyDict(items)
+    sk.update(zip(int_keys, range(n)))
+    fsk.update(zip(int_keys, range(n)))
+    print(f'StrKeyDict  d[int] -> {best(lambda: read_all(sk, int_keys)):.0f} ns,  '
+          f'FastStrKeyDict d[int] -> {best(lambda: read_all(fsk, int_keys)):.0f} ns')
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+if __name__ == '__main__':
+    d = FastStrKeyDict([('2', 'two'), ('3', 'three'), ('4', 'four')])
+    print(d, d['2'], d[2], d.get(4), d.get(1), 2 in d, 1 in d)
+    d.update({5: 'five'})
+    d.setdefault(6, 'six')
+    d |= {7: 'seven'}
+    print(d, d.pop(7), type(d.copy()).__name__)
+
+    dd = FastDoubleDict(one=1)  # Unlike DoppelDict(dict), __init__ and update go through __setitem__
+    dd['two'] = 2
+    dd.update(three=3)
+    print(dd)
+    import copy
+    import pickle
+    for clone in (copy.copy(dd), copy.deepcopy(dd), pickle.loads(pickle.dumps(dd)), dd.copy()):
+        assert type(clone) is FastDoubleDict and clone == dd == DoubleDict(one=1, two=2, three=3)  # Doubled once
+
+    class Slotted(FastUpperDict):  # Settings in __slots__: copied too
+        __slots__ = ('unit',)
+
+    sd = Slotted(km=1)
+    sd.unit = 'm'
+    assert all(c.unit == 'm' and c == {'KM': 1} for c in (sd.copy(), copy.copy(sd), pickle.loads(pickle.dumps(sd))))
+
+    ud = FastUpperDict([('aAa', 'letters A'), (2, 'digit two')])
+    print(ud, ud['aAa'], 'aAa' in ud, 'AAA' in ud, ud.get('bbb'))
+
+    benchmark()
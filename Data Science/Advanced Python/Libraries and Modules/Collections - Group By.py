@@ -0,0 +1,296 @@
+# ----------------------------------------------------------------------------------------------------------------------
+#                                      Group-by engine (defaultdict, scaled up)
+# ----------------------------------------------------------------------------------------------------------------------
+"""
+Collections.py groups the storage pairs with two tiny loops:
+
+    dfd = defaultdict(list)                   dfd = defaultdict(int)
+    for k, v in storage:                      for k, v in storage:
+        dfd[k].append(v)                          dfd[k] += v
+
+Those two loops are really "group by key, aggregate with list" and "group by key, aggregate with sum". This file
+generalizes them:
+    * Input - (key, value) pairs, or records plus a key function (and optionally a value function)
+    * Aggregations - list, sum, count, min, max, mean
+    * Input is consumed in chunks, so it can be a generator of any size
+    * Chunks are pre-aggregated in worker processes, and the partial results are merged in the parent
+    * If the number of groups grows past a memory budget, the partial results are spilled to disk, partitioned by key
+      hash, and every partition is merged on its own at the end
+"""
+
+import functools
+import itertools
+import numbers
+import os
+import pickle
+import tempfile
+import zlib
+from collections import defaultdict, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from operator import itemgetter, xor
+
+from batching import bounded_map, chunked
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+# Aggregations
+
+# Every aggregation must be mergeable: the worker that saw chunk 1 and the worker that saw chunk 2 both produce a
+# partial state for a key, and the parent must be able to combine them. That's why "mean" keeps [sum, count] and not
+# the mean itself - the mean of two means is wrong unless both halves have the same size
+#   init(value)         -> state for the first value of a group
+#   add(state, value)   -> state after one more value
+#   merge(state, state) -> state of both halves
+#   finalize(state)     -> result
+
+Aggregation = namedtuple('Aggregation', ['init', 'add', 'merge', 'finalize'])
+
+
+def _append(state, value):
+    state.append(value)
+    return state
+
+
+def _extend(state, other):
+    state.extend(other)
+    return state
+
+
+def _mean_add(state, value):
+    state[0] += value
+    state[1] += 1
+    return state
+
+
+def _mean_merge(state, other):
+    state[0] += other[0]
+    state[1] += other[1]
+    return state
+
+
+def _identity(state):
+    return state
+
+
+AGGREGATIONS = {
+    'list': Aggregation(lambda v: [v], _append, _extend, _identity),
+    'sum': Aggregation(_identity, lambda s, v: s + v, lambda s, o: s + o, _identity),
+    'count': Aggregation(lambda v: 1, lambda s, v: s + 1, lambda s, o: s + o, _identity),
+    'min': Aggregation(_identity, min, min, _identity),
+    'max': Aggregation(_identity, max, max, _identity),
+    'mean': Aggregation(lambda v: [v, 1], _mean_add, _mean_merge, lambda s: s[0] / s[1]),
+}
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+# Partial aggregation of one chunk (runs inside a worker)
+
+# Only the aggregation NAME travels to the worker: lambdas can't be pickled, the names can
+
+
+def aggregate_chunk(chunk, agg_name, key=None, value=None):
+    agg = AGGREGATIONS[agg_name]
+    if key is not None:  # Records + key function -> pairs
+        chunk = ((key(rec), value(rec) if value is not None else rec) for rec in chunk)
+
+    # The two fast paths are literally the loops from Collections.py
+    if agg_name == 'list':
+        states = defaultdict(list)
+        for k, v in chunk:
+            states[k].append(v)
+        return dict(states)
+    if agg_name in ('sum', 'count'):
+        states = defaultdict(int)
+        if agg_name == 'sum':
+            for k, v in chunk:
+                states[k] += v
+        else:
+            for k, _ in chunk:
+                states[k] += 1
+        return dict(states)
+
+    states = {}
+    init, add = agg.init, agg.add
+    for k, v in chunk:
+        if k in states:
+            states[k] = add(states[k], v)
+        else:
+            states[k] = init(v)
+    return states
+
+
+def merge_states(target, partial, agg):
+    merge = agg.merge
+    for k, state in partial.items():
+        if k in target:
+            target[k] = merge(target[k], state)
+        else:
+            target[k] = state
+    return target
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+# Spilling to disk
+
+# Groups are split into N partitions by a stable hash of the key (hash() of str changes between interpreters, crc32
+# doesn't). A key always lands in the same partition, so each partition can be merged independently later - and only
+# one partition has to be in memory at a time
+# "The same key" means equal, as in a dict: 1, 1.0 and True are one group. Their pickles differ, so numbers are hashed
+# with hash() - equal numbers hash alike, and PYTHONHASHSEED only changes the hashes of str and bytes
+
+
+def stable_hash(key):
+    """A hash that is the same in every process, and the same for keys that are equal"""
+    if isinstance(key, str):
+        return zlib.crc32(key.encode('utf-8', 'surrogatepass'))
+    if isinstance(key, (bytes, bytearray)):
+        return zlib.crc32(key)
+    if isinstance(key, numbers.Number):
+        return hash(key) & 0xFFFFFFFF
+    if isinstance(key, tuple):
+        return zlib.crc32(repr([stable_hash(item) for item in key]).encode())
+    if isinstance(key, frozenset):
+        return functools.reduce(xor, map(stable_hash, key), 0x5F5E0F)  # Any order of the items
+    return zlib.crc32(pickle.dumps(key))  # Anything else: equal keys must pickle alike - dates, enums, named tuples do
+
+
+class SpillStore:
+    def __init__(self, partitions=16, directory=None):
+        self.partitions = partitions
+        self._tmp = tempfile.TemporaryDirectory(prefix='groupby-', dir=directory)
+        self.paths = [os.path.join(self._tmp.name, f'part-{i:04d}.pkl') for i in range(partitions)]
+        self.spills = 0
+
+    def partition_of(self, key):
+        return stable_hash(key) % self.partitions
+
+    def spill(self, states):
+        buckets = [[] for _ in range(self.partitions)]
+        for k, state in states.items():
+            buckets[self.partition_of(k)].append((k, state))
+        for path, bucket in zip(self.paths, buckets):
+            if bucket:
+                with open(path, 'ab') as fp:
+                    pickle.dump(bucket, fp, protocol=pickle.HIGHEST_PROTOCOL)
+        self.spills += 1
+
+    def load(self, index):
+        path = self.paths[index]
+        if not os.path.exists(path):
+            return
+        with open(path, 'rb') as fp:
+            while True:
+                try:
+                    yield from pickle.load(fp)
+                except EOFError:
+                    return
+
+    def cleanup(self):
+        self._tmp.cleanup()
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+# The engine
+
+
+class GroupBy:
+    """Group (key, value) pairs - or records with a key function - and aggregate every group"""
+
+    def __init__(self, agg='list', key=None, value=None, chunk_size=100_000, max_groups=1_000_000,
+                 workers=None, partitions=16, spill_dir=None):
+        if agg not in AGGREGATIONS:
+            raise ValueError(f'Unknown aggregation {agg!r}, choose one of {sorted(AGGREGATIONS)}')
+        self.agg_name = agg
+        self.agg = AGGREGATIONS[agg]
+        self.key = key  # key/value functions must be picklable (module level functions, itemgetter, attrgetter)
+        self.value = value
+        self.chunk_size = chunk_size
+        self.max_groups = max_groups  # The memory budget, counted in groups held by the parent
+        self.workers = workers  # 0 -> no process pool, everything runs in this process
+        self.partitions = partitions
+        self.spill_dir = spill_dir
+
+    def _partials(self, iterable):
+        chunks = chunked(iterable, self.chunk_size)
+        args = (itertools.repeat(self.agg_name), itertools.repeat(self.key), itertools.repeat(self.value))
+        if self.workers == 0:
+            yield from map(aggregate_chunk, chunks, *args)
+            return
+        with ProcessPoolExecutor(self.workers) as executor:
+            prefetch = 2 * (self.workers or os.cpu_count())
+            yield from bounded_map(executor, aggregate_chunk, chunks, *args, prefetch=prefetch)
+
+    def __call__(self, iterable):
+        """Yield (key, result) pairs. Keys come out in no particular order once anything was spilled"""
+        states = {}
+        store = None
+        try:
+            for partial in self._partials(iterable):
+                merge_states(states, partial, self.agg)
+                if len(states) > self.max_groups:
+                    if store is None:
+                        store = SpillStore(self.partitions, self.spill_dir)
+                    store.spill(states)
+                    states = {}
+
+            finalize = self.agg.finalize
+            if store is None:
+                for k, state in states.items():
+                    yield k, finalize(state)
+                return
+
+            store.spill(states)
+            del states
+            for i in range(store.partitions):
+                merged = {}
+                for k, state in store.load(i):
+                    if k in merged:
+                        merged[k] = self.agg.merge(merged[k], state)
+                    else:
+                        merged[k] = state
+                for k, state in merged.items():
+                    yield k, finalize(state)
+        finally:
+            if store is not None:
+                store.cleanup()
+
+    def to_dict(self, iterable):
+        return dict(self(iterable))
+
+
+def group_by(iterable, agg='list', key=None, value=None, **kwargs):
+    return GroupBy(agg, key, value, **kwargs).to_dict(iterable)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+if __name__ == '__main__':
+    storage = [('yellow', 1), ('blue', 2), ('yellow', 3), ('blue', 4), ('red', 1)]
+
+    # The same results as the defaultdict loops in Collections.py
+    print(group_by(storage, 'list', workers=0))
+    print(group_by(storage, 'sum', workers=0))
+    print(group_by(storage, 'mean', workers=0))
+
+    # Records + key function
+    EmployeeRecord = namedtuple('EmployeeRecord', 'name, age, department')
+    staff = [EmployeeRecord('Stas', 20, 'UNE'), EmployeeRecord('Katya', 18, 'UNE'), EmployeeRecord('John', 40, 'HR')]
+    print(group_by(staff, 'max', key=itemgetter(2), value=itemgetter(1), workers=0))
+
+    # A bigger stream: 500k pairs over 50 000 groups, with a budget of 10 000 groups -> it has to spill
+    import random
+    import time
+
+    rnd = random.Random(7)
+    pairs = ((rnd.randrange(50_000), rnd.random()) for _ in range(500_000))
+    t0 = time.perf_counter()
+    engine = GroupBy('mean', chunk_size=50_000, max_groups=10_000)
+    result = engine.to_dict(pairs)
+    print(f'{len(result)} groups in {time.perf_counter() - t0:.2f}s, mean of group 0 = {result[0]:.3f}')
+
+    # Equal keys of different types are one group, spilled or not
+    mixed = [(1, 1), (1.0, 2), (True, 3), (('a', 2), 4), (('a', 2.0), 5), (frozenset('xy'), 6), (frozenset('yx'), 7)]
+    spilled = GroupBy('sum', chunk_size=1, max_groups=1, partitions=64, workers=0).to_dict(mixed)
+    assert spilled == group_by(mixed, 'sum', workers=0) == {1: 6, ('a', 2): 9, frozenset('xy'): 13}, spilled
@@ -0,0 +1,270 @@
+# ----------------------------------------------------------------------------------------------------------------------
+#                                   Ring buffer (a typed deque(maxlen=...) window)
+# ----------------------------------------------------------------------------------------------------------------------
+"""
+Collections.py and "2 - An Array of Sequences.py" use deque(range(1, 11), maxlen=10) as a sliding window. It works,
+but:
+    * dq[i] walks the deque's linked blocks - O(n) in the middle ("For fast random access, use lists instead")
+    * Every element is a boxed Python object, so the window can't be handed to NumPy (or anything that wants a buffer)
+    * sum(dq) / max(dq) re-scan the whole window every time
+
+A ring buffer is a preallocated array plus a "start" index. When it's full, a new value overwrites the oldest one and
+start moves one step right. So:
+    * append and indexing are O(1)
+    * The memory never moves - the contents are always at most two contiguous segments: buf[start:] and buf[:start]
+    * Running aggregates can be updated with just (new value, overwritten value)
+"""
+
+import math
+from array import array
+from collections import deque
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+#          start
+#            v
+# buf:  [ 7  8 | 3  4  5  6 ]    ->   logical order: 3 4 5 6 7 8
+#         newer     older              segments(): (buf[2:6], buf[0:2])
+
+
+class RingBuffer:
+    """A fixed-capacity window over a preallocated typed array"""
+
+    RESUM_EVERY = 16  # Float running sums drift; they are recomputed exactly every RESUM_EVERY * capacity writes
+
+    def __init__(self, capacity, typecode='d', iterable=()):
+        if capacity <= 0:
+            raise ValueError('capacity must be positive')
+        self.capacity = capacity
+        self._buf = array(typecode, bytes(array(typecode).itemsize * capacity))
+        self._view = memoryview(self._buf)  # The array is never resized, so keeping a view alive is safe
+        self._start = 0
+        self._len = 0
+        self._seq = 0  # How many values were ever written - gives every value a unique position for the min/max deques
+        self._sum = 0
+        self._writes_since_resum = 0
+        self._mins = deque()  # Monotonic deques of (seq, value): the front is the min (max) of the current window
+        self._maxs = deque()
+        self._extrema_dirty = False
+        self.extend(iterable)
+
+    @property
+    def typecode(self):
+        return self._buf.typecode
+
+    def __len__(self):
+        return self._len
+
+    def full(self):
+        return self._len == self.capacity
+
+    # Writing
+
+    def append(self, value):
+        cap = self.capacity
+        if self._len == cap:
+            idx = self._start
+            self._sum -= self._buf[idx]
+            self._start = (idx + 1) % cap
+        else:
+            idx = (self._start + self._len) % cap
+            self._len += 1
+        self._buf[idx] = value
+        value = self._buf[idx]  # Read back: the array may have converted it (int -> float, float -> float32...)
+        self._sum += value
+        self._seq += 1
+        self._track_extrema(self._seq, value)
+        self._count_writes(1)
+
+    def _track_extrema(self, seq, value):
+        if self._extrema_dirty:
+            return  # Will be rebuilt on the next min()/max() call anyway
+        oldest = seq - self._len  # Values with seq <= oldest have been overwritten
+        mins, maxs = self._mins, self._maxs
+        while mins and mins[-1][1] >= value:
+            mins.pop()
+        mins.append((seq, value))
+        while mins[0][0] <= oldest:
+            mins.popleft()
+        while maxs and maxs[-1][1] <= value:
+            maxs.pop()
+        maxs.append((seq, value))
+        while maxs[0][0] <= oldest:
+            maxs.popleft()
+
+    def extend(self, values):
+        """Append many values. Buffers (array, memoryview, bytes-like) are copied segment by segment, no Python loop"""
+        try:
+            src = memoryview(values)
+        except TypeError:
+            for v in values:
+                self.append(v)
+            return
+        if src.format != self._view.format:
+            src = memoryview(array(self.typecode, src.tolist()))  # Different element type -> one conversion pass
+        n = len(src)
+        if not n:
+            return
+        cap = self.capacity
+        if n >= cap:  # Only the last `capacity` values survive anyway
+            src = src[n - cap:]
+            self._view[:] = src
+            self._start, self._len = 0, cap
+            self._sum = self._exact_sum()
+            self._writes_since_resum = 0
+        else:
+            # Values that will be overwritten leave the running sum first
+            overflow = max(0, self._len + n - cap)
+            if overflow:
+                self._sum -= sum(self._logical_slice(0, overflow))
+            end = (self._start + self._len) % cap
+            first = min(n, cap - end)
+            self._view[end:end + first] = src[:first]
+            if first < n:
+                self._view[:n - first] = src[first:]
+            self._sum += sum(src)
+            self._start = (self._start + overflow) % cap
+            self._len = min(cap, self._len + n)
+            self._count_writes(n)
+        self._seq += n
+        self._extrema_dirty = True
+
+    def _count_writes(self, n):
+        if self.typecode in 'fd':
+            self._writes_since_resum += n
+            if self._writes_since_resum >= self.RESUM_EVERY * self.capacity:
+                self._sum = self._exact_sum()
+                self._writes_since_resum = 0
+
+    def clear(self):
+        self._start = self._len = self._sum = self._writes_since_resum = 0
+        self._mins.clear()
+        self._maxs.clear()
+        self._extrema_dirty = False
+
+    # Reading
+
+    def segments(self):
+        """Zero-copy views of the contents, oldest first: (older segment, newer segment)"""
+        end = self._start + self._len
+        if end <= self.capacity:
+            return self._view[self._start:end], self._view[0:0]
+        return self._view[self._start:], self._view[:end - self.capacity]
+
+    def _logical_slice(self, start, stop):
+        first, second = self.segments()
+        if stop <= len(first):
+            return first[start:stop]
+        if start >= len(first):
+            return second[start - len(first):stop - len(first)]
+        return array(self.typecode, first[start:]) + array(self.typecode, second[:stop - len(first)])
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return array(self.typecode, (self[i] for i in range(*index.indices(self._len))))
+        n = self._len
+        if index < 0:
+            index += n
+        if not 0 <= index < n:
+            raise IndexError('RingBuffer index out of range')
+        return self._buf[(self._start + index) % self.capacity]
+
+    def __setitem__(self, index, value):
+        old = self[index]  # Validates the index
+        if index < 0:
+            index += self._len
+        self._buf[(self._start + index) % self.capacity] = value
+        self._sum += self._buf[(self._start + index) % self.capacity] - old
+        self._extrema_dirty = True
+
+    def __iter__(self):
+        for segment in self.segments():
+            yield from segment
+
+    def tolist(self):
+        first, second = self.segments()
+        return first.tolist() + second.tolist()
+
+    def toarray(self):
+        """A contiguous copy, oldest first (np.frombuffer(rb.toarray()) or np.concatenate of the segments)"""
+        first, second = self.segments()
+        out = array(self.typecode, first)
+        out.frombytes(second)
+        return out
+
+    def __repr__(self):
+        return f'RingBuffer({self.capacity}, {self.typecode!r}, {self.tolist()!r})'
+
+    # Window aggregates
+
+    def _exact_sum(self):
+        first, second = self.segments()
+        if self.typecode in 'fd':
+            return math.fsum(first) + math.fsum(second)
+        return sum(first) + sum(second)
+
+    def sum(self):
+        return self._sum
+
+    def mean(self):
+        if not self._len:
+            raise ValueError('mean of an empty RingBuffer')
+        return self._sum / self._len
+
+    def _rebuild_extrema(self):
+        self._mins.clear()
+        self._maxs.clear()
+        self._extrema_dirty = False
+        seq = self._seq - self._len
+        for value in self:
+            seq += 1
+            self._track_extrema(seq, value)
+
+    def min(self):
+        if not self._len:
+            raise ValueError('min of an empty RingBuffer')
+        if self._extrema_dirty:
+            self._rebuild_extrema()
+        return self._mins[0][1]
+
+    def max(self):
+        if not self._len:
+            raise ValueError('max of an empty RingBuffer')
+        if self._extrema_dirty:
+            self._rebuild_extrema()
+        return self._maxs[0][1]
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+if __name__ == '__main__':
+    dq = deque(range(1, 11), maxlen=10)
+    rb = RingBuffer(10, 'q', range(1, 11))
+    dq.append(11)
+    rb.append(11)
+    print(list(dq))
+    print(rb.tolist(), rb[0], rb[-1], rb.sum(), rb.mean(), rb.min(), rb.max())
+
+    rb.extend(array('q', [20, 30, 40]))  # A bulk copy: at most 2 slice assignments
+    print(rb.tolist(), rb.sum(), rb.min(), rb.max())
+    older, newer = rb.segments()
+    print(older.tolist(), newer.tolist())
+
+    # Sliding window of the last 5 prices, with the aggregates kept up to date on every append
+    prices = RingBuffer(5)
+    for p in [10.0, 12.5, 9.0, 11.0, 15.0, 8.0, 13.0]:
+        prices.append(p)
+        print(f'{p:5.1f} -> window {prices.tolist()} mean={prices.mean():.2f} min={prices.min()} max={prices.max()}')
+
+    # With NumPy: np.concatenate([np.frombuffer(s, dtype='f8') for s in prices.segments()])
+
+    import random
+    import timeit
+
+    values = [random.random() for _ in range(200_000)]
+    window_dq = deque(values, maxlen=100_000)
+    window_rb = RingBuffer(100_000, 'd', values)
+    print('deque[50_000] x 100k:     ', timeit.timeit(lambda: window_dq[50_000], number=100_000))
+    print('RingBuffer[50_000] x 100k:', timeit.timeit(lambda: window_rb[50_000], number=100_000))
+    print('sum(deque) x 100:         ', timeit.timeit(lambda: sum(window_dq), number=100))
+    print('RingBuffer.sum() x 100:   ', timeit.timeit(window_rb.sum, number=100))
@@ -0,0 +1,233 @@
+# ----------------------------------------------------------------------------------------------------------------------
+#                                     Sharded Counter (multi-process counting)
+# ----------------------------------------------------------------------------------------------------------------------
+"""
+Collections.py shows Counter(...).most_common(3), subtract and total on tiny lists. When we have to count billions of
+tokens, a single Counter in a single process is too slow and, sometimes, too big. The idea here is:
+
+    * Split the input stream into chunks
+    * Count each chunk with a plain Counter inside a worker process (Counter.update is implemented in C)
+    * Merge the partial Counters tree-wise, as they arrive: (c1 + c2), (c3 + c4), ... -> ((c1 + c2) + (c3 + c4)) -> ...
+    * Take the top k with a heap (heapq.nlargest) instead of sorting everything
+
+And when even the merged Counter doesn't fit in memory - switch to an approximate mode: a Count-Min Sketch plus a
+bounded set of heavy hitters
+"""
+
+import hashlib
+import heapq
+import itertools
+import os
+from array import array
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+from batching import bounded_map, chunked
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+# Exact mode
+
+
+def count_chunk(chunk):
+    return Counter(chunk)
+
+
+def merge_pair(pair):
+    # Counter.update adds counts in place, so no third Counter is created (unlike c1 + c2)
+    # And unlike +, update keeps zero and negative counts - which is what we want for partial results
+    left, right = pair
+    if len(left) < len(right):
+        left, right = right, left  # Always fold the smaller Counter into the bigger one
+    left.update(right)
+    return left
+
+
+def tree_merge(partials, merge=merge_pair, empty=Counter):
+    """Merge partial results pairwise as they arrive, level by level, until one is left"""
+    # It works like a binary counter: two partials of level 0 make one of level 1, two of level 1 make one of level 2...
+    # So the merges form a balanced tree, but only O(log n) partials are alive at any moment - the stream of partials
+    # is never materialized
+    stack = []  # (level, partial)
+    for partial in partials:
+        level = 0
+        while stack and stack[-1][0] == level:
+            _, left = stack.pop()
+            partial = merge((left, partial))
+            level += 1
+        stack.append((level, partial))
+    if not stack:
+        return empty()
+    result = stack.pop()[1]
+    while stack:
+        result = merge((stack.pop()[1], result))
+    return result
+
+
+def most_common(counter, k):
+    # Counter.most_common(k) already uses heapq.nlargest when k is given, but it's worth seeing why:
+    # a full sort is O(n log n), a heap of size k is O(n log k) - and k is usually tiny compared to n
+    return heapq.nlargest(k, counter.items(), key=lambda item: item[1])
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+# Approximate mode: Count-Min Sketch
+
+'''
+A Count-Min Sketch is a depth x width table of counters. Every item is hashed once per row and the counter in that
+cell is incremented. The estimated count of an item is the minimum over its cells:
+    * It never underestimates (collisions can only add)
+    * It overestimates by at most 2 * total / width with probability 1 - (1/2) ** depth
+    * Memory is fixed: depth * width counters - no matter how many distinct items we see
+    * Two sketches with the same width, depth and seeds can be merged by adding the tables cell by cell
+'''
+
+
+class CountMinSketch:
+    def __init__(self, width=2 ** 16, depth=4):
+        self.width = width
+        self.depth = depth
+        self.table = array('q', bytes(8 * width * depth))
+        self.total = 0
+
+    def _cells(self, item):
+        # hash() of str is randomized per interpreter (PYTHONHASHSEED), so worker processes could disagree.
+        # blake2b gives a stable 64-bit digest per row: the row number is the salt
+        key = repr(item).encode()
+        for row in range(self.depth):
+            digest = hashlib.blake2b(key, digest_size=8, salt=row.to_bytes(16, 'little')).digest()
+            yield row * self.width + int.from_bytes(digest, 'little') % self.width
+
+    def add(self, item, count=1):
+        for cell in self._cells(item):
+            self.table[cell] += count
+        self.total += count
+
+    def __getitem__(self, item):
+        return min(self.table[cell] for cell in self._cells(item))
+
+    def merge(self, other):
+        if (self.width, self.depth) != (other.width, other.depth):
+            raise ValueError('Only sketches with the same width and depth can be merged')
+        table = self.table
+        for i, value in enumerate(other.table):
+            if value:
+                table[i] += value
+        self.total += other.total
+        return self
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+# Approximate mode: Heavy hitters
+
+# The sketch answers "how many times did we see x?", but it can't list the items. So next to it we keep a bounded
+# Counter of candidates: whenever it grows past capacity we drop the items with the smallest estimated counts
+
+
+class HeavyHitters:
+    def __init__(self, capacity=1000, width=2 ** 16, depth=4):
+        self.capacity = capacity
+        self.sketch = CountMinSketch(width, depth)
+        self.candidates = Counter()
+
+    def update(self, iterable):
+        # Pre-count the chunk exactly - it's cheap and touches the sketch once per distinct item
+        for item, count in Counter(iterable).items():
+            self.sketch.add(item, count)
+            self.candidates[item] = self.sketch[item]
+        self._trim()
+
+    def _trim(self):
+        if len(self.candidates) > 2 * self.capacity:  # Trimming on every insert would cost O(n log k) each time
+            self.candidates = Counter(dict(most_common(self.candidates, self.capacity)))
+
+    def merge(self, other):
+        self.sketch.merge(other.sketch)
+        for item in self.candidates.keys() | other.candidates.keys():
+            self.candidates[item] = self.sketch[item]  # Re-estimate with the merged table
+        self._trim()
+        return self
+
+    def most_common(self, k):
+        return most_common(self.candidates, k)
+
+
+def sketch_chunk(chunk, capacity, width, depth):
+    hh = HeavyHitters(capacity, width, depth)
+    hh.update(chunk)
+    return hh
+
+
+def merge_sketch_pair(pair):
+    left, right = pair
+    return left.merge(right)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+# Putting it together
+
+
+class ShardedCounter:
+    """Count a (possibly huge) stream in a process pool and merge the partial results tree-wise"""
+
+    def __init__(self, workers=None, chunk_size=100_000, approximate=False,
+                 capacity=1000, width=2 ** 16, depth=4):
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.approximate = approximate
+        self.capacity = capacity
+        self.width = width
+        self.depth = depth
+        self.result = None
+
+    def count(self, stream):
+        chunks = chunked(stream, self.chunk_size)
+        prefetch = 2 * (self.workers or os.cpu_count())
+        with ProcessPoolExecutor(self.workers) as executor:
+            if self.approximate:
+                partials = bounded_map(executor, sketch_chunk, chunks,
+                                       itertools.repeat(self.capacity), itertools.repeat(self.width),
+                                       itertools.repeat(self.depth), prefetch=prefetch)
+                self.result = tree_merge(partials, merge_sketch_pair,
+                                         lambda: HeavyHitters(self.capacity, self.width, self.depth))
+            else:
+                partials = bounded_map(executor, count_chunk, chunks, prefetch=prefetch)
+                self.result = tree_merge(partials)
+        return self.result
+
+    def most_common(self, k):
+        if self.result is None:
+            raise ValueError('Nothing has been counted yet, call count() first')
+        return most_common(self.result, k) if not self.approximate else self.result.most_common(k)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+if __name__ == '__main__':  # A process pool re-imports this module on spawn-based platforms, so the demo is guarded
+    import random
+    import time
+
+    words = 'red blue green yellow black white orange purple pink brown'.split()
+    weights = [2 ** -i for i in range(len(words))]
+    stream = random.Random(42).choices(words, weights, k=1_000_000)
+
+    t0 = time.perf_counter()
+    expected = Counter(stream).most_common(3)
+    t1 = time.perf_counter()
+    print(f'Single Counter:     {expected}  {t1 - t0:.3f}s')
+
+    exact = ShardedCounter(chunk_size=100_000)
+    exact.count(iter(stream))
+    t2 = time.perf_counter()
+    print(f'Sharded (exact):    {exact.most_common(3)}  {t2 - t1:.3f}s')
+
+    approx = ShardedCounter(chunk_size=100_000, approximate=True, capacity=5, width=1024)
+    approx.count(iter(stream))
+    t3 = time.perf_counter()
+    print(f'Sharded (approx):   {approx.most_common(3)}  {t3 - t2:.3f}s')
+
+    # The approximate counts can only be greater or equal to the real ones
+    print(all(approx.result.sketch[word] >= count for word, count in expected))
@@ -0,0 +1,337 @@
+# ----------------------------------------------------------------------------------------------------------------------
+#                              String pool (dictionary-encoded UserString values)
+# ----------------------------------------------------------------------------------------------------------------------
+"""
+UserString("Hello, world!") wraps one str per object. That's fine for one string, but think of a table with millions
+of EmployeeRecord rows where "department" and "title" take only a few thousand distinct values. Every row pays for
+a pointer - and often for its own copy of the str object - ~50+ bytes for "Engineering" repeated a million times.
+
+Dictionary encoding (what Parquet, Arrow and pandas' Categorical do):
+    * Each distinct string is stored ONCE in a pool and gets a small integer code: 'HR' -> 0, 'Engineering' -> 1...
+    * A column stores only the codes, in an array('B' / 'H' / 'I') -> 1, 2 or 4 bytes per row
+    * Equality of two pooled values is an int comparison - no character-by-character compare
+    * The pool can be written to a file once and memory-mapped later: loading it doesn't decode anything up front
+"""
+
+import functools
+import mmap
+import struct
+import sys
+from array import array
+from collections import UserString
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+# The pool
+
+
+class StringPool:
+    """Maps distinct strings to dense integer codes and back"""
+
+    def __init__(self, strings=()):
+        self._strings = []  # code -> str
+        self._codes = {}  # str -> code
+        for s in strings:
+            self.encode(s)
+
+    def encode(self, s):
+        code = self._codes.get(s)
+        if code is None:
+            code = self._codes[s] = len(self._strings)
+            self._strings.append(sys.intern(s))
+        return code
+
+    def encode_many(self, strings):
+        codes_get, encode = self._codes.get, self.encode
+        return [c if (c := codes_get(s)) is not None else encode(s) for s in strings]
+
+    def decode(self, code):
+        return self._strings[code]
+
+    def __len__(self):
+        return len(self._strings)
+
+    def __contains__(self, s):
+        return s in self._codes
+
+    def __iter__(self):
+        return iter(self._strings)
+
+    def __repr__(self):
+        return f'{type(self).__name__}({len(self)} strings)'
+
+    # Persistence
+
+    '''
+    File layout (little-endian):
+        magic     8 bytes   b'STRPOOL1'
+        count     uint64    number of strings
+        offsets   uint64 x (count + 1)   start of every string inside the blob; the last one is the blob's length
+        blob      utf-8 bytes of all the strings, back to back
+    Offsets make the file random-access: string i is blob[offsets[i]:offsets[i + 1]], nothing else has to be read
+    '''
+
+    MAGIC = b'STRPOOL1'
+    HEADER = struct.Struct('<8sQ')
+
+    def save(self, path):
+        encoded = [s.encode('utf-8') for s in self._strings]
+        offsets = array('Q', [0])
+        for b in encoded:
+            offsets.append(offsets[-1] + len(b))
+        if sys.byteorder != 'little':
+            offsets.byteswap()
+        with open(path, 'wb') as fp:
+            fp.write(self.HEADER.pack(self.MAGIC, len(encoded)))
+            fp.write(offsets.tobytes())
+            for b in encoded:
+                fp.write(b)
+
+    @staticmethod
+    def load(path):
+        return MappedStringPool(path)
+
+
+class MappedStringPool(StringPool):
+    """A StringPool read from a file through mmap. Strings are decoded on first access only"""
+
+    def __init__(self, path):
+        with open(path, 'rb') as fp:
+            self._mm = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, count = self.HEADER.unpack_from(self._mm, 0)
+        if magic != self.MAGIC:
+            raise ValueError(f'{path!r} is not a string pool file')
+        if sys.byteorder != 'little':
+            raise NotImplementedError('Mapped pools can be read on little-endian machines only')
+        start = self.HEADER.size
+        self._offsets = memoryview(self._mm)[start:start + 8 * (count + 1)].cast('Q')
+        self._blob_start = start + 8 * (count + 1)
+        self._count = count
+        self._decoded = [None] * count
+        self._codes = None  # str -> code is built only when somebody encodes something
+        self._extra = []  # Strings encoded after loading: their codes start at count
+
+    def decode(self, code):
+        if code >= self._count:  # Codes past the mapped part belong to strings added after loading
+            return self._extra[code - self._count]
+        s = self._decoded[code]
+        if s is None:
+            lo, hi = self._offsets[code], self._offsets[code + 1]
+            s = self._decoded[code] = sys.intern(
+                str(self._mm[self._blob_start + lo:self._blob_start + hi], 'utf-8'))
+        return s
+
+    @property
+    def _strings(self):
+        return [self.decode(i) for i in range(len(self))]
+
+    def _ensure_codes(self):
+        if self._codes is None:
+            self._codes = {self.decode(i): i for i in range(self._count)}
+
+    def encode(self, s):
+        self._ensure_codes()
+        code = self._codes.get(s)
+        if code is None:  # New strings live in memory only, until the pool is saved again
+            code = self._codes[s] = self._count + len(self._extra)
+            self._extra.append(sys.intern(s))
+        return code
+
+    def encode_many(self, strings):
+        return [self.encode(s) for s in strings]
+
+    def __len__(self):
+        return self._count + len(self._extra)
+
+    def __contains__(self, s):
+        self._ensure_codes()
+        return s in self._codes
+
+    def __iter__(self):
+        return (self.decode(i) for i in range(len(self)))
+
+    def close(self):
+        self._offsets.release()
+        self._mm.close()
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+# A pooled string value
+
+
+class PooledString(UserString):
+    """A UserString whose text lives in a StringPool - the instance holds only (pool, code)"""
+
+    __slots__ = ('pool', 'code')  # UserString has no __slots__, so instances still get a __dict__, but it stays empty
+
+    def __init__(self, seq, pool=None):
+        if isinstance(seq, PooledString):
+            self.pool, self.code = seq.pool, seq.code
+        else:
+            self.pool = pool if pool is not None else StringPool()
+            self.code = self.pool.encode(str(seq))
+
+    @classmethod
+    def from_code(cls, pool, code):
+        obj = cls.__new__(cls)
+        obj.pool, obj.code = pool, code
+        return obj
+
+    # Every UserString method reads self.data, so a property is all we need to stay compatible
+    @property
+    def data(self):
+        return self.pool.decode(self.code)
+
+    @data.setter
+    def data(self, value):
+        # UserString methods build new instances with self.__class__(result) - see _in_pool below, not here. This
+        # setter only runs if some code assigns .data directly
+        self.code = self.pool.encode(value)
+
+    def __eq__(self, other):
+        if isinstance(other, PooledString) and other.pool is self.pool:
+            return self.code == other.code  # Fast path: one int comparison
+        return super().__eq__(other)
+
+    def __hash__(self):
+        return hash(self.data)  # Must match str's hash, because PooledString('HR') == 'HR'
+
+    def __repr__(self):
+        return f'{type(self).__name__}({self.data!r}, code={self.code})'
+
+    def _new(self, text):
+        """A PooledString of text, in this string's pool"""
+        return self.from_code(self.pool, self.pool.encode(text))
+
+
+# UserString creates its results with self.__class__(result): a PooledString with a new StringPool of its own, and the
+# shared pool is lost. So every such method runs on a plain UserString - same arguments, same result - and the result
+# goes into self.pool
+
+
+def _in_pool(name):
+    method = getattr(UserString, name)
+
+    @functools.wraps(method)
+    def in_pool(self, *args, **kwargs):
+        return self._new(method(UserString(self.data), *args, **kwargs).data)
+    return in_pool
+
+
+for _name in ('__getitem__', '__add__', '__radd__', '__mul__', '__rmul__', '__mod__', '__rmod__', 'capitalize',
+              'casefold', 'center', 'expandtabs', 'ljust', 'lower', 'lstrip', 'removeprefix', 'removesuffix', 'replace',
+              'rjust', 'rstrip', 'strip', 'swapcase', 'title', 'translate', 'upper', 'zfill'):
+    setattr(PooledString, _name, _in_pool(_name))
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+# A column of pooled strings
+
+
+class EncodedColumn:
+    """A sequence of strings stored as an array of pool codes"""
+
+    def __init__(self, strings=(), pool=None):
+        self.pool = pool if pool is not None else StringPool()
+        self.codes = array('B')
+        self.extend(strings)
+
+    def _widen(self):
+        # 'B' holds 256 distinct strings, 'H' 65 536, 'I' ~4 billion. Widen only when the pool outgrows the typecode
+        n = len(self.pool)
+        needed = 'B' if n <= 0x100 else 'H' if n <= 0x10000 else 'I'
+        if needed != self.codes.typecode and array(needed).itemsize > self.codes.itemsize:
+            self.codes = array(needed, self.codes)
+
+    def append(self, s):
+        code = self.pool.encode(s)
+        self._widen()
+        self.codes.append(code)
+
+    def extend(self, strings):
+        codes = self.pool.encode_many(strings)
+        self._widen()
+        self.codes.extend(codes)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            column = EncodedColumn(pool=self.pool)
+            column.codes = self.codes[index]
+            return column
+        return PooledString.from_code(self.pool, self.codes[index])
+
+    def __iter__(self):
+        decode = self.pool.decode
+        return (decode(c) for c in self.codes)
+
+    def count(self, s):
+        return self.codes.count(self.pool.encode(s)) if s in self.pool else 0
+
+    def where(self, s):
+        """Row numbers equal to s - compares integer codes, never strings"""
+        if s not in self.pool:
+            return []
+        target = self.pool.encode(s)
+        return [i for i, c in enumerate(self.codes) if c == target]
+
+    def nbytes(self):
+        return len(self.codes) * self.codes.itemsize
+
+    def save(self, pool_path, codes_path):
+        self.pool.save(pool_path)
+        with open(codes_path, 'wb') as fp:
+            fp.write(self.codes.typecode.encode())
+            self.codes.tofile(fp)
+
+    @classmethod
+    def load(cls, pool_path, codes_path):
+        column = cls(pool=StringPool.load(pool_path))
+        with open(codes_path, 'rb') as fp:
+            column.codes = array(fp.read(1).decode())
+            column.codes.frombytes(fp.read())
+        return column
+
+    def __repr__(self):
+        return f'EncodedColumn({len(self)} rows, {len(self.pool)} distinct, {self.codes.typecode!r} codes)'
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+if __name__ == '__main__':
+    import os
+    import random
+    import tempfile
+
+    pool = StringPool()
+    a = PooledString('Hello, world!', pool)
+    b = PooledString('Hello, world!', pool)
+    print(a, a.data, a.code, b.code, a == b, a == 'Hello, world!')
+    print(a.upper(), a[:5], a + '!!', a.split(', '), len(a), 'world' in a)  # The UserString API keeps working
+    results = [a.upper(), a.replace('world', 'pool'), a.strip('!'), a * 2, '<' + a, a.center(20, '*'), a[0]]
+    assert all(type(r) is PooledString and r.pool is pool for r in results), results
+
+    departments = ['HR', 'Engineering', 'Sales', 'Marketing', 'Finance', 'Legal', 'Support']
+    rnd = random.Random(1)
+    rows = [rnd.choice(departments) for _ in range(1_000_000)]
+    rows_as_copies = [d.encode().decode() for d in rows]  # What we get after parsing a CSV: a new str per row
+
+    column = EncodedColumn(rows)
+    list_bytes = sys.getsizeof(rows_as_copies) + sum(map(sys.getsizeof, rows_as_copies))
+    print(column, column[3], column.count('HR'))
+    print(f'list of str: {list_bytes / 1e6:.1f} MB  ->  codes: {column.nbytes() / 1e6:.1f} MB')
+
+    with tempfile.TemporaryDirectory() as tmp:
+        pool_path, codes_path = os.path.join(tmp, 'dept.pool'), os.path.join(tmp, 'dept.codes')
+        column.save(pool_path, codes_path)
+        loaded = EncodedColumn.load(pool_path, codes_path)
+        print(loaded, loaded[3], list(loaded[:5]) == rows[:5])
+        try:
+            loaded.pool.decode(len(loaded.pool))  # A code past the end, before any encode()
+        except IndexError as error:
+            print('IndexError:', error)
+        loaded.pool.close()
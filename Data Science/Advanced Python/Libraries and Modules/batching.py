@@ -0,0 +1,26 @@
+# Chunked streams and a bounded executor.map, shared by "Collections - Sharded Counter", "Collections - Group By",
+# "2 - Lazy Pipeline" and "4 - Encoding Detection" - their file names can't be imported, this one can
+
+import itertools
+from collections import deque
+
+
+def chunked(iterable, size):
+    """Tuples of `size` items, the last one shorter. itertools.batched in 3.12"""
+    # We never call list(iterable) - only `size` items live in memory at a time
+    it = iter(iterable)
+    while chunk := tuple(itertools.islice(it, size)):
+        yield chunk
+
+
+def bounded_map(executor, fn, iterable, *args, prefetch=8):
+    """executor.map(fn, iterable, *args), with at most `prefetch` calls in flight. Results come out in order"""
+    # executor.map submits the WHOLE input before yielding anything - for an endless stream that means holding every
+    # chunk in memory, or in the pool's queue
+    pending = deque()
+    for call_args in zip(iterable, *args):
+        pending.append(executor.submit(fn, *call_args))
+        if len(pending) >= prefetch:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
@@ -0,0 +1,166 @@
+# FastUserDict - the base class explained in "Collections - Fast UserDict" - and chapter 3's StrKeyDict(UserDict), which
+# it is measured against. "3 - Normalizing Dict" uses both. Those two file names can't be imported, this one can
+
+from collections import UserDict
+
+_MISSING = object()
+
+
+class FastUserDict(dict):
+    """Base class for custom mappings: override __setitem__ (writes), __missing__ (misses), __delitem__ (deletes)"""
+
+    # __init_subclass__ runs once per subclass, at class creation time. It looks at which hooks the subclass actually
+    # overrides and only then installs the slower Python versions of the methods that have to honour them. A subclass
+    # that overrides nothing behaves (and performs) exactly like dict
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        has_missing = getattr(cls, '__missing__', None) is not None
+        cls._custom_setitem = cls.__setitem__ is not dict.__setitem__
+        cls._custom_delitem = cls.__delitem__ is not dict.__delitem__
+        if has_missing:
+            # dict.get and dict.__contains__ never call __missing__ - only d[k] does
+            if 'get' not in cls.__dict__ and cls.get is dict.get:
+                cls.get = FastUserDict._get_with_missing
+            if '__contains__' not in cls.__dict__ and cls.__contains__ is dict.__contains__:
+                cls.__contains__ = FastUserDict._contains_with_missing
+        if cls._custom_delitem and cls.pop is dict.pop:
+            cls.pop = FastUserDict._pop_with_delitem
+
+    _custom_setitem = False
+    _custom_delitem = False
+
+    # Write paths
+
+    def __init__(self, other=(), /, **kwargs):
+        super().__init__()
+        self.update(other, **kwargs)
+
+    def update(self, other=(), /, **kwargs):
+        if not self._custom_setitem:
+            return dict.update(self, other, **kwargs)
+        setitem = self.__setitem__
+        if hasattr(other, 'keys'):
+            for key in other.keys():
+                setitem(key, other[key])
+        else:
+            for key, value in other:
+                setitem(key, value)
+        for key, value in kwargs.items():
+            setitem(key, value)
+
+    def setdefault(self, key, default=None):
+        try:
+            return self[key]  # Goes through __missing__, so '2' and 2 are the same key for StrKeyDict
+        except KeyError:
+            self[key] = default
+            return self[key]
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+    def __or__(self, other):
+        if not isinstance(other, dict):
+            return NotImplemented
+        new = self.copy()
+        new.update(other)
+        return new
+
+    def __ror__(self, other):
+        if not isinstance(other, dict):
+            return NotImplemented
+        new = self._empty_like()
+        new.update(other)
+        dict.update(new, self)  # Already stored once: through __setitem__ again, a DoubleDict would double them twice
+        return new
+
+    def copy(self):
+        # The stored items are already normalized, so they are copied raw - no need to run __setitem__ again
+        new = self._empty_like()
+        dict.update(new, self)
+        return new
+
+    def _empty_like(self):
+        """An empty instance with the same instance attributes (the settings of a subclass) as self"""
+        return _restore(self.__class__, (), self._settings())
+
+    def _settings(self):
+        # The instance attributes, from __dict__ and from the __slots__ of every class up the MRO
+        settings = dict(getattr(self, '__dict__', ()))
+        for cls in type(self).__mro__:
+            slots = cls.__dict__.get('__slots__', ())
+            for name in (slots,) if isinstance(slots, str) else slots:
+                if name not in ('__dict__', '__weakref__') and hasattr(self, name):
+                    settings[name] = getattr(self, name)
+        return settings
+
+    def __reduce__(self):
+        # copy.copy, copy.deepcopy and pickle: dict's own reduce hands the items back one d[k] = v at a time, which would
+        # run __setitem__ over values it already transformed. _restore stores them raw, like copy()
+        return _restore, (self.__class__, dict(self), self._settings())
+
+    @classmethod
+    def fromkeys(cls, iterable, value=None):
+        new = cls()
+        for key in iterable:
+            new[key] = value
+        return new
+
+    # Installed by __init_subclass__ only when the subclass needs them
+
+    def _get_with_missing(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def _contains_with_missing(self, key):
+        if dict.__contains__(self, key):
+            return True
+        try:
+            self.__missing__(key)
+        except KeyError:
+            return False
+        return True
+
+    def _pop_with_delitem(self, key, default=_MISSING):
+        try:
+            value = self[key]
+        except KeyError:
+            if default is _MISSING:
+                raise
+            return default
+        del self[key]
+        return value
+
+    def __repr__(self):
+        return f'{type(self).__name__}({dict.__repr__(self)})'
+
+
+def _restore(cls, items, settings):
+    new = cls.__new__(cls)
+    for name, value in settings.items():
+        object.__setattr__(new, name, value)
+    dict.update(new, items)
+    return new
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+# The original, from chapter 3
+
+
+class StrKeyDict(UserDict):
+    def __missing__(self, key):
+        if isinstance(key, str):
+            raise KeyError(key)
+        return self[str(key)]
+
+    def __contains__(self, key):
+        # Chapter 3 has `str(key) in self.keys()` here - but UserDict's KeysView.__contains__ calls `key in self`
+        # again, which recurses forever. Fluent Python checks self.data, which is what we time
+        return str(key) in self.data
+
+    def __setitem__(self, key, value):
+        self.data[str(key)] = value